@@ -0,0 +1,56 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.database import DATABASE_URL
+
+# Async drivers for the same database the sync engine uses:
+# - PostgreSQL -> asyncpg
+# - SQLite (tests/benchmarks) -> aiosqlite
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+# Explicit pool sizing:
+# - Async requests don't hold a thread, so concurrency is limited by the
+#   pool instead of the threadpool (40 workers by default)
+# - pool_size + max_overflow must stay below Postgres max_connections
+#   summed over all app processes
+ASYNC_POOL_SIZE = 20
+ASYNC_MAX_OVERFLOW = 10
+ASYNC_POOL_TIMEOUT = 30  # Seconds a request waits for a free connection
+
+def to_async_url(url: str) -> str:
+    """
+    Swap the sync driver in a database URL for its async counterpart.
+    """
+    for sync_prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url  # Already names an async driver
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# Create the async engine
+# - Connections are used from the event loop, so a request waiting on
+#   the database yields instead of blocking a worker thread
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=ASYNC_POOL_SIZE,
+    max_overflow=ASYNC_MAX_OVERFLOW,
+    pool_timeout=ASYNC_POOL_TIMEOUT,
+    connect_args={"timeout": 30} if ASYNC_DATABASE_URL.startswith("sqlite") else {},
+)
+
+# Create an async session factory
+# - expire_on_commit=False: returned rows stay readable after commit
+#   without another (awaited) round trip
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+async def get_async_session():
+    """
+    FastAPI dependency: one AsyncSession per request, always closed.
+
+    The session only checks out a connection on its first query, so
+    requests answered by the idempotency cache never touch the pool.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
@@ -0,0 +1,239 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import Payment
+from app.service import DEBIT_WALLETS_SQL, process_payment_fast
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the batching window:
+# - A batch is flushed after MAX_WAIT_SECONDS or MAX_BATCH items, whichever comes first
+# - 2 ms adds little latency but lets one fsync cover many payments at peak
+GROUP_COMMIT_MAX_WAIT_SECONDS = 0.002
+GROUP_COMMIT_MAX_BATCH = 100
+
+# What each caller gets back (same attributes as a payments row)
+PaymentResult = namedtuple("PaymentResult", ["id", "status", "amount"])
+
+# Dialect-specific INSERT with ON CONFLICT support
+INSERT_BY_DIALECT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+class PendingPayment:
+    """
+    One queued payment and the Future its caller is waiting on.
+    """
+    __slots__ = ("user_id", "amount", "idem_key", "future")
+
+    def __init__(self, user_id, amount, idem_key):
+        self.user_id = user_id
+        self.amount = amount
+        self.idem_key = idem_key
+        self.future = Future()
+
+class GroupCommitter:
+    """
+    Applies concurrent payments in shared transactions (group commit).
+
+    How it works:
+    - submit() queues a payment and returns a Future
+    - A worker thread takes the first queued payment, then keeps
+      collecting until max_wait passes or max_batch payments are queued
+    - The batch is applied in ONE transaction:
+        1. One multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING claims
+           every new key
+        2. One SELECT fetches the payments for keys that already existed
+        3. Debits are summed per wallet and applied once per wallet
+           (in user_id order, so concurrent batches can't deadlock)
+    - Each caller's Future gets its own payment
+    - If the batch transaction fails, it is rolled back and every payment
+      is retried in its own transaction, so one bad payment only fails
+      its own caller; so is any payment the batch returned no row for
+    - Every Future is always completed (with an exception at worst), so
+      no caller waits forever and the worker thread keeps running
+
+    Why it matters:
+    - Per-request commits pay one fsync each; a batch pays one fsync for
+      all of its payments
+    """
+    def __init__(self, session_factory, max_wait=GROUP_COMMIT_MAX_WAIT_SECONDS,
+                 max_batch=GROUP_COMMIT_MAX_BATCH, workers=1):
+        self.session_factory = session_factory
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stopped = False
+
+        # Counters for monitoring
+        self.batches = 0
+        self.payments = 0
+        self.fallbacks = 0  # Batches that were retried payment by payment
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"group-commit-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, user_id: int, amount: float, idem_key: str) -> Future:
+        """
+        Queue a payment. The Future resolves to a PaymentResult, or to the
+        exception that payment raised.
+        """
+        if self._stopped:
+            raise RuntimeError("GroupCommitter is closed")
+        pending = PendingPayment(user_id, amount, idem_key)
+        self._queue.put(pending)
+        return pending.future
+
+    def close(self):
+        """
+        Apply everything already queued, then stop the workers.
+        """
+        self._stopped = True
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Let the outer loop stop after this batch
+                    break
+                batch.append(item)
+
+            self._apply(batch)
+
+    def _apply(self, batch):
+        self.batches += 1
+        self.payments += len(batch)
+        try:
+            try:
+                results = self._apply_batch(batch)
+            except Exception:
+                self.fallbacks += 1
+                self._apply_one_by_one(batch)
+                return
+
+            unresolved = []
+            for pending in batch:
+                result = results.get(pending.idem_key)
+                if result is None:
+                    unresolved.append(pending)
+                else:
+                    pending.future.set_result(result)
+            if unresolved:
+                # Committed, but no row came back for these keys: the
+                # per-payment path is idempotent, so it finds or makes it
+                self.fallbacks += 1
+                self._apply_one_by_one(unresolved)
+        except Exception as exc:
+            logger.exception("Group commit batch failed")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+
+    def _apply_batch(self, batch):
+        """
+        Apply the whole batch in one transaction.
+
+        Returns: idem_key -> PaymentResult
+        """
+        # Duplicates inside one batch: the first payment with a key wins,
+        # the rest get its result (same rule as the UNIQUE index)
+        first_by_key = {}
+        for pending in batch:
+            first_by_key.setdefault(pending.idem_key, pending)
+
+        db = self.session_factory()
+        try:
+            insert = INSERT_BY_DIALECT[db.get_bind().dialect.name]
+            now = datetime.utcnow()
+            claim = (
+                insert(Payment.__table__)
+                .values([
+                    {"user_id": p.user_id, "amount": p.amount, "idempotency_key": p.idem_key,
+                     "status": "SUCCESS", "created_at": now}
+                    for p in first_by_key.values()
+                ])
+                .on_conflict_do_nothing(index_elements=["idempotency_key"])
+                .returning(Payment.idempotency_key, Payment.id, Payment.status, Payment.amount)
+            )
+            results = {
+                row.idempotency_key: PaymentResult(row.id, row.status, row.amount)
+                for row in db.execute(claim)
+            }
+
+            # Aggregate the debits of newly claimed payments per wallet
+            debits = defaultdict(int)
+            for key in results:
+                pending = first_by_key[key]
+                debits[pending.user_id] += pending.amount
+            if debits:
+                db.execute(DEBIT_WALLETS_SQL, [
+                    {"user_id": user_id, "amount": amount} for user_id, amount in sorted(debits.items())
+                ])
+
+            # Keys that already existed: return the original payments
+            existing = [key for key in first_by_key if key not in results]
+            if existing:
+                rows = db.execute(
+                    select(Payment.idempotency_key, Payment.id, Payment.status, Payment.amount)
+                    .where(Payment.idempotency_key.in_(existing))
+                )
+                for row in rows:
+                    results[row.idempotency_key] = PaymentResult(row.id, row.status, row.amount)
+
+            db.commit()
+            return results
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _apply_one_by_one(self, batch):
+        """
+        Failure isolation: each payment gets its own transaction and
+        its own outcome.
+        """
+        for pending in batch:
+            db = self.session_factory()
+            try:
+                payment = process_payment_fast(db, pending.user_id, pending.amount, pending.idem_key)
+                pending.future.set_result(PaymentResult(payment.id, payment.status, payment.amount))
+            except Exception as exc:
+                db.rollback()
+                pending.future.set_exception(exc)
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "payments": self.payments,
+            "avg_batch_size": round(self.payments / self.batches, 2) if self.batches else 0.0,
+            "fallback_batches": self.fallbacks,
+            "queued": self._queue.qsize(),
+        }
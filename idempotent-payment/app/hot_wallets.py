@@ -0,0 +1,215 @@
+import os
+import random
+import threading
+from collections import OrderedDict
+from decimal import ROUND_DOWN, Decimal
+from sqlalchemy import text
+
+# Wallets whose balance is split across slot rows, e.g. PAYMENTS_HOT_WALLETS=42,1337
+HOT_WALLETS = {int(w) for w in os.environ.get("PAYMENTS_HOT_WALLETS", "").split(",") if w.strip()}
+
+# Slot rows per hot wallet: up to this many debits can hold a row lock at once
+HOT_WALLET_SLOTS = int(os.environ.get("PAYMENTS_HOT_WALLET_SLOTS", "16"))
+
+# Wallets tracked by the lock-wait metrics (least recently debited are dropped)
+LOCK_METRICS_MAX_WALLETS = 10_000
+
+class InsufficientFunds(Exception):
+    """
+    The wallet's total balance can't cover the payment.
+    """
+
+class HotWalletNotSplit(Exception):
+    """
+    A wallet listed in PAYMENTS_HOT_WALLETS has no slot rows, so its
+    balance is still in wallets (split_wallet was never run for it).
+    """
+
+# Take the amount from one slot that can cover it alone and isn't locked
+# by another debit (SKIP LOCKED); the search starts at a random slot so
+# concurrent debits spread out. Returns nothing if no such slot is free.
+TAKE_SLOT_SQL = """
+    UPDATE wallet_slots SET balance = balance - :amount
+    WHERE user_id = :user_id AND slot = (
+        SELECT slot FROM wallet_slots
+        WHERE user_id = :user_id AND balance >= :amount
+        ORDER BY (slot + :slots - :start) % :slots
+        LIMIT 1
+        {lock}
+    )
+    RETURNING slot
+"""
+
+# Fallback: lock every slot of the wallet (in slot order, so two
+# fallbacks can't deadlock) and read the true total
+LOCK_SLOTS_SQL = """
+    SELECT slot, balance FROM wallet_slots
+    WHERE user_id = :user_id
+    ORDER BY slot
+    {lock}
+"""
+
+DEBIT_SLOT_SQL = text("""
+    UPDATE wallet_slots SET balance = balance - :amount
+    WHERE user_id = :user_id AND slot = :slot
+""")
+
+# Row locks are Postgres syntax; SQLite (local stand-in) locks the whole
+# database for a write, so the statements are correct there without them
+ROW_LOCKS = {
+    "postgresql": (TAKE_SLOT_SQL.format(lock="FOR UPDATE SKIP LOCKED"), LOCK_SLOTS_SQL.format(lock="FOR UPDATE")),
+}
+NO_ROW_LOCKS = (TAKE_SLOT_SQL.format(lock=""), LOCK_SLOTS_SQL.format(lock=""))
+
+def _statements(db):
+    take, lock_all = ROW_LOCKS.get(db.get_bind().dialect.name, NO_ROW_LOCKS)
+    return text(take), text(lock_all)
+
+def _numeric(db, value: Decimal):
+    # sqlite3 can't bind Decimal (SQLite is only used as a local stand-in)
+    return float(value) if db.get_bind().dialect.name == "sqlite" else value
+
+def debit_hot_wallet(db, user_id: int, amount, slots: int = HOT_WALLET_SLOTS):
+    """
+    Debit a hot wallet without queueing on a single row lock.
+
+    How it works:
+    - Fast path: one UPDATE takes the whole amount from a random free slot
+      that can cover it; other debits lock other slots in parallel
+    - Fallback (every slot is busy or too small on its own): lock all
+      slots, check the real total, and take the amount from several slots
+    - Slots can't go below zero, so the wallet can't be overdrawn, and a
+      payment is only refused after the full balance was checked
+
+    Runs inside the caller's transaction; raises InsufficientFunds, or
+    HotWalletNotSplit if the wallet has no slots at all.
+    """
+    take, lock_all = _statements(db)
+    params = {"user_id": user_id, "amount": amount, "slots": slots, "start": random.randrange(slots)}
+
+    if db.execute(take, params).first() is not None:
+        return
+
+    balances = [(slot, Decimal(str(balance))) for slot, balance in db.execute(lock_all, params)]
+    if not balances:
+        # Not a balance problem: refusing with 402 would hide a missing split
+        raise HotWalletNotSplit(f"Hot wallet {user_id} has no slots; run split_wallet for it")
+    remaining = Decimal(str(amount))
+    if sum(balance for _, balance in balances) < remaining:
+        raise InsufficientFunds(f"Wallet {user_id} can't cover {amount}")
+
+    # Largest slots first, so the debit touches as few rows as possible
+    for slot, balance in sorted(balances, key=lambda item: item[1], reverse=True):
+        if remaining <= 0:
+            break
+        part = min(balance, remaining)
+        db.execute(DEBIT_SLOT_SQL, {"user_id": user_id, "slot": slot, "amount": _numeric(db, part)})
+        remaining -= part
+
+def split_wallet(db, user_id: int, slots: int = HOT_WALLET_SLOTS):
+    """
+    Move a wallet's balance into its slot rows (adds to existing slots,
+    so running it again moves later top-ups too). Commits.
+
+    After this, only debit_hot_wallet should debit the wallet.
+    """
+    dialect = db.get_bind().dialect.name
+    lock = " FOR UPDATE" if dialect == "postgresql" else ""
+    row = db.execute(text(f"SELECT balance FROM wallets WHERE user_id = :user_id{lock}"), {"user_id": user_id}).first()
+    balance = Decimal(str(row.balance)) if row is not None else Decimal(0)
+    if balance < 0:
+        raise ValueError(f"Wallet {user_id} is overdrawn ({balance}); can't split a negative balance")
+
+    share = (balance / slots).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+    parts = [share] * slots
+    parts[0] += balance - share * slots  # Rounding remainder
+
+    db.execute(text("""
+        INSERT INTO wallet_slots (user_id, slot, balance) VALUES (:user_id, :slot, :amount)
+        ON CONFLICT (user_id, slot) DO UPDATE SET balance = wallet_slots.balance + excluded.balance
+    """), [{"user_id": user_id, "slot": slot, "amount": _numeric(db, part)} for slot, part in enumerate(parts)])
+    db.execute(text("UPDATE wallets SET balance = 0 WHERE user_id = :user_id"), {"user_id": user_id})
+    db.commit()
+
+def split_hot_wallets(session_factory, wallets=HOT_WALLETS, slots: int = HOT_WALLET_SLOTS) -> list:
+    """
+    Split every listed hot wallet that has no slot rows yet (run at
+    startup, so a newly listed wallet doesn't refuse every debit).
+
+    Safe with several processes starting at once: split_wallet locks the
+    wallets row, so a second split only moves the (now zero) balance again.
+
+    Returns: the wallets that were split
+    """
+    split = []
+    for user_id in sorted(wallets):
+        db = session_factory()
+        try:
+            has_slots = db.execute(
+                text("SELECT 1 FROM wallet_slots WHERE user_id = :user_id LIMIT 1"), {"user_id": user_id}
+            ).first()
+            if has_slots is None:
+                split_wallet(db, user_id, slots)
+                split.append(user_id)
+        finally:
+            db.close()
+    return split
+
+def wallet_balance(db, user_id: int) -> Decimal:
+    """
+    Total balance: wallets.balance plus every slot.
+    """
+    row = db.execute(text("""
+        SELECT
+            (SELECT COALESCE(SUM(balance), 0) FROM wallets WHERE user_id = :user_id) +
+            (SELECT COALESCE(SUM(balance), 0) FROM wallet_slots WHERE user_id = :user_id)
+    """), {"user_id": user_id}).scalar()
+    return Decimal(str(row))
+
+class WalletLockMetrics:
+    """
+    Time each wallet debit spends in its UPDATE, per wallet.
+
+    With row-level locking nearly all of that time is waiting for the
+    lock, so the wallets at the top of this list are the hot ones.
+    """
+    def __init__(self, max_wallets=LOCK_METRICS_MAX_WALLETS):
+        self.max_wallets = max_wallets
+        self._lock = threading.Lock()
+        self._wallets = OrderedDict()  # user_id -> [debits, total seconds, max seconds]
+
+    def record(self, user_id: int, seconds: float):
+        with self._lock:
+            stats = self._wallets.get(user_id)
+            if stats is None:
+                stats = self._wallets[user_id] = [0, 0.0, 0.0]
+                if len(self._wallets) > self.max_wallets:
+                    self._wallets.popitem(last=False)
+            else:
+                self._wallets.move_to_end(user_id)
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def top(self, limit: int = 20) -> list:
+        """Wallets with the most total debit wait, highest first."""
+        with self._lock:
+            items = list(self._wallets.items())
+        items.sort(key=lambda item: item[1][1], reverse=True)
+        return [
+            {
+                "user_id": user_id,
+                "debits": debits,
+                "wait_ms_total": round(total * 1000, 2),
+                "wait_ms_avg": round(total * 1000 / debits, 3),
+                "wait_ms_max": round(peak * 1000, 2),
+                "hot": user_id in HOT_WALLETS,
+            }
+            for user_id, (debits, total, peak) in items[:limit]
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._wallets.clear()
+
+lock_metrics = WalletLockMetrics()
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Entry states stored under each Idempotency-Key
+IN_FLIGHT = "in_flight"  # First request is still being processed
+DONE = "done"            # Finished response is stored
+OWNER = "owner"          # Returned to the request that claimed the key
+
+# How often async duplicates re-check an in-flight key
+ASYNC_POLL_INTERVAL = 0.002
+
+# Database round trips a retry costs without the cache
+# (fast path: claim + select + commit)
+DB_ROUND_TRIPS_PER_RETRY = 3
+
+class IdempotencyConflict(Exception):
+    """
+    The key was already used with a different request body.
+    """
+
+class IdempotencyInFlight(Exception):
+    """
+    The first request with this key did not finish in time.
+    """
+
+def request_fingerprint(body: dict) -> str:
+    """
+    Stable hash of a request body.
+
+    Keys are sorted so the same body always gives the same fingerprint,
+    whatever order the client sent the fields in.
+    """
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class InProcessBackend:
+    """
+    Bounded LRU store with a TTL, local to this process.
+
+    - max_entries bounds memory; the least recently used key is evicted
+    - A Condition wakes waiting duplicates as soon as the first request
+      stores its response (no polling)
+    """
+    blocking = False  # In-memory: safe to call from the event loop
+
+    def __init__(self, max_entries=100_000, ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, entry)
+        self._changed = threading.Condition()
+        self.evictions = 0
+
+    def _get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, entry, ttl):
+        self._entries[key] = (time.monotonic() + ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._changed.notify_all()
+
+    def get(self, key):
+        with self._changed:
+            return self._get(key)
+
+    def add(self, key, entry, ttl):
+        """Store entry only if key is absent. Returns True if stored."""
+        with self._changed:
+            if self._get(key) is not None:
+                return False
+            self._put(key, entry, ttl)
+            return True
+
+    def set(self, key, entry):
+        with self._changed:
+            self._put(key, entry, self.ttl_seconds)
+
+    def delete(self, key):
+        with self._changed:
+            self._entries.pop(key, None)
+            self._changed.notify_all()
+
+    def wait(self, key, timeout):
+        """
+        Block until key is no longer in flight or timeout seconds pass.
+
+        The entry is re-checked while holding the Condition, so a response
+        stored between the caller's last get() and this call is not missed.
+        """
+        def settled():
+            entry = self._get(key)
+            return entry is None or entry["state"] != IN_FLIGHT
+
+        with self._changed:
+            self._changed.wait_for(settled, timeout)
+
+class SharedBackend:
+    """
+    Store in a shared key-value service (e.g. Redis), so retries that land
+    on a different app process are still answered from the cache.
+
+    client: any object with get(key), set(key, value, ex=seconds, nx=bool)
+            and delete(key), such as redis.Redis
+    """
+    blocking = True  # Network round trips: async callers run these in a thread
+
+    def __init__(self, client, ttl_seconds=24 * 3600, prefix="idem:", poll_interval=0.005):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+
+    def get(self, key):
+        raw = self.client.get(f"{self.prefix}{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def add(self, key, entry, ttl):
+        # SET NX is atomic in the store, so only one process claims the key
+        return bool(self.client.set(f"{self.prefix}{key}", json.dumps(entry), ex=max(int(ttl), 1), nx=True))
+
+    def set(self, key, entry):
+        self.client.set(f"{self.prefix}{key}", json.dumps(entry), ex=max(int(self.ttl_seconds), 1))
+
+    def delete(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+    def wait(self, key, timeout):
+        # No change notifications across processes: poll
+        time.sleep(min(self.poll_interval, max(timeout, 0)))
+
+class IdempotencyCache:
+    """
+    Response cache keyed by Idempotency-Key, in front of the payments table.
+
+    How it works:
+    - Finished key with the same fingerprint: return the stored response
+      (no database access at all)
+    - Key in flight: wait for the first request instead of racing it
+    - Key reused with a different body: IdempotencyConflict
+    - New key: claim it with an in-flight marker, run the payment, store
+      the response; if the payment fails the marker is removed so the
+      client can retry
+
+    The payments table's UNIQUE key is still the source of truth: an
+    evicted or expired entry just falls through to the database.
+
+    Limit: the fingerprint lives only in the cache. Once an entry is
+    evicted or expired, a key reused with a different body is not
+    rejected; the database returns the original payment for it.
+    """
+    def __init__(self, backend, in_flight_ttl=30.0, wait_timeout=10.0):
+        """
+        in_flight_ttl: how long a marker survives if its request dies
+                       without cleaning up (e.g. the process crashes)
+        wait_timeout: how long a duplicate waits for the first request
+        """
+        self.backend = backend
+        self.in_flight_ttl = in_flight_ttl
+        self.wait_timeout = wait_timeout
+
+        # Counters; += on ints is good enough for monitoring
+        self.hits = 0       # Answered from a stored response
+        self.misses = 0     # Went to the database
+        self.coalesced = 0  # Duplicates that waited for the first request
+        self.conflicts = 0  # Key reused with a different body
+
+    def _claim(self, key: str, fingerprint: str):
+        """
+        One step of the claim loop.
+
+        Returns: (OWNER, None) if this request now owns the key,
+                 (DONE, response) if a finished response is stored,
+                 (IN_FLIGHT, None) if another request is processing it
+        """
+        while True:
+            entry = self.backend.get(key)
+            if entry is None:
+                marker = {"state": IN_FLIGHT, "fingerprint": fingerprint}
+                if self.backend.add(key, marker, self.in_flight_ttl):
+                    self.misses += 1
+                    return OWNER, None
+                continue  # Lost the race: read the winner's marker
+
+            if entry["fingerprint"] != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict(f"Idempotency-Key {key!r} was used with a different request body")
+            if entry["state"] == DONE:
+                return DONE, entry["response"]
+            return IN_FLIGHT, None
+
+    def _answered(self, waited: bool):
+        if waited:
+            self.coalesced += 1
+        else:
+            self.hits += 1
+
+    def _in_flight_error(self, key):
+        return IdempotencyInFlight(f"Idempotency-Key {key!r} is still being processed")
+
+    def execute(self, key: str, fingerprint: str, fn):
+        """
+        Return the response for key, calling fn() only if no request with
+        this key has finished (or is running) yet.
+
+        fn must return a JSON-serializable response.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+
+        while True:
+            state, response = self._claim(key, fingerprint)
+            if state == DONE:
+                self._answered(waited)
+                return response
+            if state == OWNER:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._in_flight_error(key)
+            waited = True
+            self.backend.wait(key, remaining)
+
+        try:
+            response = fn()
+        except BaseException:
+            self.backend.delete(key)
+            raise
+        self.backend.set(key, {"state": DONE, "fingerprint": fingerprint, "response": response})
+        return response
+
+    async def _backend_call(self, method, *args):
+        """Run a backend call; in a worker thread if the backend does network I/O."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def execute_async(self, key: str, fingerprint: str, fn):
+        """
+        execute() for async endpoints: fn is an async function, and
+        duplicates wait with asyncio.sleep so the event loop never blocks.
+        Calls to a blocking backend (SharedBackend) run in a worker thread,
+        so one slow store round trip doesn't stall every request.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+
+        while True:
+            state, response = await self._backend_call(self._claim, key, fingerprint)
+            if state == DONE:
+                self._answered(waited)
+                return response
+            if state == OWNER:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._in_flight_error(key)
+            waited = True
+            await asyncio.sleep(min(ASYNC_POLL_INTERVAL, remaining))
+
+        try:
+            response = await fn()
+        except BaseException:
+            await self._backend_call(self.backend.delete, key)
+            raise
+        await self._backend_call(self.backend.set, key, {"state": DONE, "fingerprint": fingerprint, "response": response})
+        return response
+
+    def stats(self) -> dict:
+        answered = self.hits + self.coalesced
+        requests = answered + self.misses
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "conflicts": self.conflicts,
+            "hit_ratio": round(answered / requests, 4) if requests else 0.0,
+            "db_round_trips_saved": answered * DB_ROUND_TRIPS_PER_RETRY,
+            "evictions": getattr(self.backend, "evictions", None),
+        }
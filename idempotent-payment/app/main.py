@@ -1,46 +1,211 @@
-from fastapi import FastAPI, Header, HTTPException
-from app.database import SessionLocal
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException
+from app.database import SessionLocal, engine
+from app.group_commit import GroupCommitter
+from app.hot_wallets import HOT_WALLETS, InsufficientFunds, lock_metrics, split_hot_wallets
+from app.idempotency_cache import (
+    IdempotencyCache,
+    IdempotencyConflict,
+    IdempotencyInFlight,
+    InProcessBackend,
+    request_fingerprint,
+)
 from app.schemas import PaymentRequest
-from app.service import process_payment
+from app.partitions import PartitionMaintainer
+from app.service import PAYMENT_MODE, process_payment
+
+# Which /payments implementation to serve:
+# - "sync":  def endpoint, runs in the threadpool with the sync engine
+# - "async": async def endpoint with an AsyncSession (asyncpg / aiosqlite)
+API_MODE = os.environ.get("PAYMENTS_API_MODE", "sync")
+
+# Opt-in group commit: concurrent payments share one transaction
+# (see app/group_commit.py for the batching window)
+GROUP_COMMIT = os.environ.get("PAYMENTS_GROUP_COMMIT") == "1"
+
+# Partitioned payments are only implemented on the sync per-request path
+# (group commit and the async path rely on ON CONFLICT (idempotency_key))
+if PAYMENT_MODE == "partitioned" and (GROUP_COMMIT or API_MODE == "async"):
+    raise RuntimeError("PAYMENT_MODE=partitioned requires PAYMENTS_API_MODE=sync without group commit")
+
+# Same for hot wallets (their balance lives in wallet_slots)
+if HOT_WALLETS and (GROUP_COMMIT or API_MODE == "async"):
+    raise RuntimeError("PAYMENTS_HOT_WALLETS requires PAYMENTS_API_MODE=sync without group commit")
+
+# The ORM path debits wallets.balance, which split_hot_wallets zeroes at startup
+if HOT_WALLETS and PAYMENT_MODE == "orm":
+    raise RuntimeError("PAYMENTS_HOT_WALLETS requires PAYMENT_MODE=fast or partitioned")
+
+# Group commit always applies payments with its own fast-path batch,
+# so any other PAYMENT_MODE would be silently ignored
+if GROUP_COMMIT and PAYMENT_MODE != "fast":
+    raise RuntimeError("PAYMENTS_GROUP_COMMIT=1 requires PAYMENT_MODE=fast")
+
+# Same for the async endpoint: it only has a fast-path implementation
+if API_MODE == "async" and PAYMENT_MODE != "fast":
+    raise RuntimeError("PAYMENTS_API_MODE=async requires PAYMENT_MODE=fast")
+
+if API_MODE == "async":
+    # Imported only in async mode so the sync service doesn't need an async driver
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.async_database import async_engine, get_async_session
+    from app.service import process_payment_async
+
+@asynccontextmanager
+async def lifespan(app):
+    if HOT_WALLETS:
+        # A listed wallet without slot rows would refuse every debit
+        split_hot_wallets(SessionLocal)
+    maintainer = None
+    if PAYMENT_MODE == "partitioned":
+        # Creates upcoming daily partitions and archives expired ones
+        maintainer = PartitionMaintainer(engine)
+        maintainer.start()
+    yield
+    if maintainer is not None:
+        maintainer.stop()
+    if group_committer is not None:
+        # Flush payments still queued before the process exits
+        group_committer.close()
+    if API_MODE == "async":
+        # Close pooled connections cleanly on shutdown
+        await async_engine.dispose()
 
 # Initialize FastAPI application
-app = FastAPI()
-
-@app.post("/payments")
-def pay(
-    payload: PaymentRequest,
-    idempotency_key: str = Header(...)
-):
-    """
-    Payment API endpoint.
-
-    Key ideas:
-    - Accepts a payment request body (user_id, amount)
-    - Requires an Idempotency-Key header
-    - Safely handles retries without double-charging
-    """
-
-    # Create a new database session for this request
-    db = SessionLocal()
-
-    try:
-        # Process the payment using idempotent business logic
-        payment = process_payment(
-            db,
-            payload.user_id,
-            payload.amount,
-            idempotency_key
-        )
-
-        # Return a consistent response
-        # Even on retries, the same payment result is returned
-        return {
-            "payment_id": payment.id,
-            "status": payment.status,
-            "amount": payment.amount
-        }
-
-    finally:
-        # Always close the DB session
-        # Prevents connection leaks under high traffic
-        db.close()
+app = FastAPI(lifespan=lifespan)
+
+# Finished responses by Idempotency-Key, so retries skip the database
+# For several app processes, use SharedBackend(redis.Redis(...)) instead
+idempotency_cache = IdempotencyCache(InProcessBackend())
+
+group_committer = GroupCommitter(SessionLocal) if GROUP_COMMIT else None
+
+def payment_response(payment):
+    # Return a consistent response
+    # Even on retries, the same payment result is returned
+    return {
+        "payment_id": payment.id,
+        "status": payment.status,
+        "amount": float(payment.amount)
+    }
+
+def payment_fingerprint(payload: PaymentRequest) -> str:
+    return request_fingerprint({"user_id": payload.user_id, "amount": payload.amount})
+
+if API_MODE == "async":
+
+    @app.post("/payments")
+    async def pay_async(
+        payload: PaymentRequest,
+        idempotency_key: str = Header(...),
+        db: AsyncSession = Depends(get_async_session)
+    ):
+        """
+        Async payment API endpoint.
+
+        Same contract as the sync endpoint, but waiting on the database
+        yields to the event loop, so concurrency is bounded by the
+        connection pool rather than the threadpool.
+        """
+        async def charge():
+            if group_committer is not None:
+                payment = await asyncio.wrap_future(
+                    group_committer.submit(payload.user_id, payload.amount, idempotency_key)
+                )
+                return payment_response(payment)
+
+            payment = await process_payment_async(
+                db,
+                payload.user_id,
+                payload.amount,
+                idempotency_key
+            )
+            return payment_response(payment)
+
+        try:
+            return await idempotency_cache.execute_async(idempotency_key, payment_fingerprint(payload), charge)
+        except (IdempotencyConflict, IdempotencyInFlight) as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+else:
+
+    @app.post("/payments")
+    def pay(
+        payload: PaymentRequest,
+        idempotency_key: str = Header(...)
+    ):
+        """
+        Payment API endpoint.
+
+        Key ideas:
+        - Accepts a payment request body (user_id, amount)
+        - Requires an Idempotency-Key header
+        - Safely handles retries without double-charging
+        - Retries are answered from the idempotency cache when possible
+        """
+
+        def charge():
+            if group_committer is not None:
+                # Wait for the batch containing this payment to commit
+                payment = group_committer.submit(payload.user_id, payload.amount, idempotency_key).result()
+                return payment_response(payment)
+
+            # Create a new database session for this request
+            db = SessionLocal()
+
+            try:
+                # Process the payment using idempotent business logic
+                payment = process_payment(
+                    db,
+                    payload.user_id,
+                    payload.amount,
+                    idempotency_key
+                )
+                return payment_response(payment)
+
+            finally:
+                # Always close the DB session
+                # Prevents connection leaks under high traffic
+                db.close()
+
+        try:
+            return idempotency_cache.execute(idempotency_key, payment_fingerprint(payload), charge)
+        except IdempotencyConflict as exc:
+            # Same key, different payment: refuse instead of returning someone else's result
+            raise HTTPException(status_code=409, detail=str(exc))
+        except IdempotencyInFlight as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        except InsufficientFunds as exc:
+            # Nothing was charged (the transaction rolled back), so a retry may succeed later
+            raise HTTPException(status_code=402, detail=str(exc))
+
+@app.get("/idempotency/stats")
+def idempotency_stats():
+    """
+    Hit ratio and database round trips saved by the idempotency cache.
+    """
+    return idempotency_cache.stats()
+
+@app.get("/group-commit/stats")
+def group_commit_stats():
+    """
+    Batch counts and average batch size (empty when group commit is off).
+    """
+    return group_committer.stats() if group_committer is not None else {}
+
+@app.get("/wallets/lock-waits")
+def wallet_lock_waits(limit: int = 20):
+    """
+    Wallets whose debits waited longest on row locks (candidates for
+    PAYMENTS_HOT_WALLETS).
+    """
+    return lock_metrics.top(limit)
+
+@app.get("/health")
+def health():
+    """
+    Liveness check (used by the load test to wait for startup).
+    """
+    return {"status": "ok", "api_mode": API_MODE}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Numeric, String, DateTime
+from sqlalchemy import CheckConstraint, Column, Integer, Numeric, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -46,3 +46,18 @@ class Payment(Base):
     # Timestamp for when the payment record was created
     # - Uses UTC to avoid timezone inconsistencies
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class WalletSlot(Base):
+    # Name of the database table
+    __tablename__ = "wallet_slots"
+
+    # Part of a hot wallet's balance, split across several rows so
+    # concurrent debits lock different rows (see app/hot_wallets.py)
+    # A wallet's balance is wallets.balance + the sum of its slots
+    user_id = Column(Integer, primary_key=True)
+    slot = Column(Integer, primary_key=True)
+
+    # A slot can never go below zero, so the wallet can't either
+    balance = Column(Numeric, nullable=False, default=0)
+
+    __table_args__ = (CheckConstraint("balance >= 0", name="wallet_slots_balance_non_negative"),)
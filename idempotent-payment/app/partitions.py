@@ -0,0 +1,214 @@
+import gzip
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Idempotency keys are guaranteed unique for this long after a payment.
+# A retry arriving later than this is treated as a new payment.
+IDEMPOTENCY_RETENTION_DAYS = 7
+
+# Partitions older than the window are kept this much longer before
+# archival, so a lookup at the window's edge never races the archiver
+ARCHIVE_GRACE_DAYS = 1
+
+# Daily partitions created in advance (inserts fail if today's partition is missing)
+PARTITIONS_AHEAD_DAYS = 3
+
+# Where archived partitions are written (one gzip'd CSV per day)
+ARCHIVE_DIR = os.environ.get("PAYMENTS_ARCHIVE_DIR", "archive")
+
+MAINTENANCE_INTERVAL_SECONDS = 3600
+
+# Session-level advisory lock held for a whole maintenance pass, so only
+# one process (uvicorn worker or cron run) archives at a time
+MAINTENANCE_LOCK_SQL = text("SELECT pg_try_advisory_lock(hashtextextended('payments_partition_maintenance', 0))")
+MAINTENANCE_UNLOCK_SQL = text("SELECT pg_advisory_unlock(hashtextextended('payments_partition_maintenance', 0))")
+
+PARTITION_NAME = re.compile(r"^payments_p(\d{8})$")
+
+def partition_name(day: date) -> str:
+    return f"payments_p{day:%Y%m%d}"
+
+def partition_day(name: str):
+    """Day covered by a partition table name, or None if it isn't one."""
+    match = PARTITION_NAME.match(name)
+    return datetime.strptime(match.group(1), "%Y%m%d").date() if match else None
+
+def retention_window_start(now: datetime = None) -> datetime:
+    """
+    Oldest created_at an idempotency lookup has to check.
+
+    Used as a `created_at >= :window_start` filter, so Postgres prunes
+    every partition outside the window from the lookup.
+    """
+    return (now or datetime.utcnow()) - timedelta(days=IDEMPOTENCY_RETENTION_DAYS)
+
+def archivable(day: date, today: date) -> bool:
+    """
+    True once every row in the day's partition is older than the
+    retention window plus the grace period.
+    """
+    return day + timedelta(days=1) <= today - timedelta(days=IDEMPOTENCY_RETENTION_DAYS + ARCHIVE_GRACE_DAYS)
+
+def list_partitions(conn):
+    """
+    Payment partition tables: [(name, day, attached)].
+
+    Detached-but-not-dropped tables (left by an interrupted archive run)
+    are included with attached=False so they get archived too.
+    """
+    rows = conn.execute(text("""
+        SELECT relname, relispartition FROM pg_class
+        WHERE relkind = 'r' AND relname ~ '^payments_p[0-9]{8}$'
+        ORDER BY relname
+    """))
+    return [(name, partition_day(name), attached) for name, attached in rows]
+
+def create_partitions(conn, start: date, end: date):
+    """
+    Create daily partitions for every day in [start, end] (idempotent).
+    """
+    day = start
+    while day <= end:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF payments "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        ))
+        day += timedelta(days=1)
+
+def ensure_partitions(engine, today: date = None):
+    """
+    Make sure today's and the next PARTITIONS_AHEAD_DAYS partitions exist.
+    """
+    today = today or datetime.utcnow().date()
+    with engine.begin() as conn:
+        create_partitions(conn, today, today + timedelta(days=PARTITIONS_AHEAD_DAYS))
+
+def archive_partition(engine, name: str, attached: bool, archive_dir: str = ARCHIVE_DIR) -> str:
+    """
+    Detach a partition, stream it to a gzip'd CSV file and drop it.
+
+    - DETACH ... CONCURRENTLY doesn't block inserts into other partitions
+      (it can't run inside a transaction, hence AUTOCOMMIT)
+    - COPY ... TO STDOUT streams rows straight into the gzip file, so
+      memory use doesn't depend on the partition size
+    - The file is written under a temporary name (unique to this
+      process) and renamed when complete; the table is only dropped
+      after that
+
+    Every step can be re-run: a crash leaves either an attached
+    partition, a detached table, or a finished archive.
+
+    Returns: path of the archive file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+
+    if attached:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"ALTER TABLE payments DETACH PARTITION {name} CONCURRENTLY"))
+
+    if not os.path.exists(path):
+        partial = f"{path}.{os.getpid()}.partial"
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            with open(partial, "wb") as file:
+                with gzip.GzipFile(fileobj=file, mode="wb") as archive:
+                    cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+                # gzip trailer is written on close; make it durable before the rename
+                file.flush()
+                os.fsync(file.fileno())
+            cursor.close()
+            raw.commit()
+        finally:
+            raw.close()
+        os.replace(partial, path)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    return path
+
+@contextmanager
+def maintenance_lock(engine):
+    """
+    Yields True if this process got the maintenance lock, False if another
+    one holds it.
+
+    The lock is session-level, on a connection kept open for the whole
+    pass: every uvicorn worker starts its own PartitionMaintainer, and
+    two of them archiving the same partition would both drop it.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        acquired = conn.execute(MAINTENANCE_LOCK_SQL).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(MAINTENANCE_UNLOCK_SQL)
+
+def run_maintenance(engine, today: date = None, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    One maintenance pass: create upcoming partitions, archive expired ones.
+
+    Skipped (skipped=True) when another process is already running one.
+    """
+    with maintenance_lock(engine) as acquired:
+        if not acquired:
+            logger.info("Partition maintenance already running in another process; skipping")
+            return {"archived": [], "skipped": True}
+        return _run_maintenance(engine, today, archive_dir)
+
+def _run_maintenance(engine, today: date, archive_dir: str) -> dict:
+    today = today or datetime.utcnow().date()
+    ensure_partitions(engine, today)
+
+    with engine.connect() as conn:
+        expired = [(name, attached) for name, day, attached in list_partitions(conn) if archivable(day, today)]
+
+    archived = []
+    for name, attached in expired:
+        archived.append(archive_partition(engine, name, attached, archive_dir))
+        logger.info("Archived partition %s", name)
+    return {"archived": archived, "skipped": False}
+
+class PartitionMaintainer:
+    """
+    Runs run_maintenance() every MAINTENANCE_INTERVAL_SECONDS in a
+    daemon thread (and once right away at start).
+    """
+    def __init__(self, engine, interval: float = MAINTENANCE_INTERVAL_SECONDS, archive_dir: str = ARCHIVE_DIR):
+        self.engine = engine
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                run_maintenance(self.engine, archive_dir=self.archive_dir)
+            except Exception:
+                # Try again next interval; partitions are created days ahead
+                logger.exception("Partition maintenance failed")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """Start maintenance in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="partition-maintainer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,7 +1,181 @@
+import os
+import time
+from datetime import datetime
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
+from app.hot_wallets import HOT_WALLETS, debit_hot_wallet, lock_metrics
 from app.models import Payment, Wallet
+from app.partitions import retention_window_start
 
-def process_payment(db, user_id: int, amount: float, idem_key: str):
+# Which implementation process_payment uses:
+# - "fast": INSERT ... ON CONFLICT + atomic wallet debit (one transaction, two statements)
+# - "orm":  original ORM flow (add, SELECT wallet, Python-side debit, IntegrityError retry)
+# - "partitioned": for sql/partitioned_schema.sql (keys unique within the retention window)
+PAYMENT_MODE = os.environ.get("PAYMENT_MODE", "fast")
+
+# Claim the idempotency key; returns the new row, or nothing if the key already exists
+CLAIM_KEY_SQL = text("""
+    INSERT INTO payments (user_id, amount, idempotency_key, status, created_at)
+    VALUES (:user_id, :amount, :idem_key, 'SUCCESS', :created_at)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id, status, amount
+""")
+
+# Debit the wallet inside the database (creating it at 0 - amount if missing),
+# so concurrent payments can't overwrite each other's balance
+DEBIT_WALLET = """
+    INSERT INTO wallets (user_id, balance)
+    VALUES (:user_id, -:amount)
+    ON CONFLICT (user_id) DO UPDATE SET balance = wallets.balance - :amount
+"""
+DEBIT_WALLET_SQL = text(DEBIT_WALLET + "RETURNING balance")
+
+# Same debit for executemany (not every driver can return rows from executemany)
+DEBIT_WALLETS_SQL = text(DEBIT_WALLET)
+
+# Look up the payment that already owns a key
+EXISTING_PAYMENT_SQL = text("""
+    SELECT id, status, amount FROM payments WHERE idempotency_key = :idem_key
+""")
+
+# Partitioned table: no global UNIQUE index on idempotency_key, so payments
+# with the same key are serialized with a transaction-scoped advisory lock
+# (a separate statement, so the claim's snapshot sees a committed twin)
+LOCK_KEY_SQL = text("SELECT pg_advisory_xact_lock(hashtextextended(:idem_key, 0))")
+
+# Claim the key unless a payment inside the retention window already has it;
+# created_at >= :window_start prunes the lookup to the window's partitions
+CLAIM_KEY_IN_WINDOW_SQL = text("""
+    INSERT INTO payments (user_id, amount, idempotency_key, status, created_at)
+    SELECT :user_id, :amount, :idem_key, 'SUCCESS', :created_at
+    WHERE NOT EXISTS (
+        SELECT 1 FROM payments
+        WHERE idempotency_key = :idem_key AND created_at >= :window_start
+    )
+    RETURNING id, status, amount
+""")
+
+EXISTING_PAYMENT_IN_WINDOW_SQL = text("""
+    SELECT id, status, amount FROM payments
+    WHERE idempotency_key = :idem_key AND created_at >= :window_start
+""")
+
+def debit_wallet(db, user_id: int, amount: float):
+    """
+    Debit a wallet inside the current transaction and record how long
+    the debit waited (lock_metrics).
+
+    Hot wallets (HOT_WALLETS) are debited across their slot rows, with a
+    sufficient-balance check (raises InsufficientFunds); other wallets use
+    the single-row atomic debit.
+    """
+    started = time.perf_counter()
+    if user_id in HOT_WALLETS:
+        debit_hot_wallet(db, user_id, amount)
+    else:
+        db.execute(DEBIT_WALLET_SQL, {"user_id": user_id, "amount": amount})
+    lock_metrics.record(user_id, time.perf_counter() - started)
+
+def process_payment(db, user_id: int, amount: float, idem_key: str, mode: str = None):
+    """
+    Idempotent payment entry point.
+
+    Dispatches to the fast path or the original ORM path depending on
+    `mode` (default: PAYMENT_MODE). Both return an object with
+    id, status and amount attributes.
+    """
+    mode = mode or PAYMENT_MODE
+    if mode == "fast":
+        return process_payment_fast(db, user_id, amount, idem_key)
+    if mode == "orm":
+        return process_payment_orm(db, user_id, amount, idem_key)
+    if mode == "partitioned":
+        return process_payment_partitioned(db, user_id, amount, idem_key)
+    raise ValueError(f"Unknown payment mode: {mode!r}")
+
+def process_payment_fast(db, user_id: int, amount: float, idem_key: str):
+    """
+    Idempotent payment in one transaction and at most two statements.
+
+    Strategy:
+    - INSERT ... ON CONFLICT DO NOTHING RETURNING claims the key
+      (no exception, no rollback when the key is already taken)
+    - First time: debit the wallet with balance = balance - :amount
+      computed by the database, so parallel payments can't lose updates
+    - Retry: the claim returns nothing, so fetch the original payment
+
+    Round trips: claim + debit (first time) or claim + select (retry),
+    plus the commit.
+    """
+    params = {"user_id": user_id, "amount": amount, "idem_key": idem_key}
+
+    payment = db.execute(CLAIM_KEY_SQL, {**params, "created_at": datetime.utcnow()}).first()
+
+    if payment is not None:
+        # We own this key: apply the debit in the same transaction
+        debit_wallet(db, user_id, amount)
+    else:
+        # Duplicate key: the original payment is already committed
+        # (ON CONFLICT waits for a concurrent inserter to finish first)
+        payment = db.execute(EXISTING_PAYMENT_SQL, params).first()
+
+    db.commit()
+    return payment
+
+def process_payment_partitioned(db, user_id: int, amount: float, idem_key: str):
+    """
+    Idempotent payment on the partitioned payments table.
+
+    Strategy:
+    - Take an advisory lock on the key, so concurrent retries queue up
+      instead of both passing the existence check
+    - Insert only if no payment in the retention window has the key
+      (only the window's partitions are searched)
+    - First time: atomic wallet debit; retry: return the original payment
+
+    One statement more than the fast path (the lock), but each insert
+    only touches today's partition and its small index.
+    """
+    now = datetime.utcnow()
+    params = {
+        "user_id": user_id,
+        "amount": amount,
+        "idem_key": idem_key,
+        "window_start": retention_window_start(now),
+    }
+
+    db.execute(LOCK_KEY_SQL, params)
+    payment = db.execute(CLAIM_KEY_IN_WINDOW_SQL, {**params, "created_at": now}).first()
+
+    if payment is not None:
+        debit_wallet(db, user_id, amount)
+    else:
+        payment = db.execute(EXISTING_PAYMENT_IN_WINDOW_SQL, params).first()
+
+    db.commit()  # Also releases the advisory lock
+    return payment
+
+async def process_payment_async(db, user_id: int, amount: float, idem_key: str):
+    """
+    process_payment_fast for an AsyncSession (same statements, awaited).
+
+    The debit's wait is recorded in lock_metrics, like debit_wallet does.
+    """
+    params = {"user_id": user_id, "amount": amount, "idem_key": idem_key}
+
+    payment = (await db.execute(CLAIM_KEY_SQL, {**params, "created_at": datetime.utcnow()})).first()
+
+    if payment is not None:
+        started = time.perf_counter()
+        await db.execute(DEBIT_WALLET_SQL, params)
+        lock_metrics.record(user_id, time.perf_counter() - started)
+    else:
+        payment = (await db.execute(EXISTING_PAYMENT_SQL, params)).first()
+
+    await db.commit()
+    return payment
+
+def process_payment_orm(db, user_id: int, amount: float, idem_key: str):
     """
     Core idempotent payment logic.
 
@@ -13,6 +187,9 @@ def process_payment(db, user_id: int, amount: float, idem_key: str):
     - Attempt to insert a payment using a UNIQUE idempotency key
     - If the key already exists, the database raises an IntegrityError
     - On conflict, return the existing payment instead of charging again
+
+    Note: the Python-side `balance -= amount` can lose updates when
+    payments for the same wallet run concurrently; the fast path doesn't.
     """
 
     try:
@@ -0,0 +1,25 @@
+# -------------------------------------------
+# Run one partition maintenance pass (e.g. from cron instead of the
+# in-app PartitionMaintainer thread)
+# -------------------------------------------
+
+import argparse
+from app.database import engine
+from app.partitions import ARCHIVE_DIR, run_maintenance
+
+def main():
+    parser = argparse.ArgumentParser(description="Create upcoming payment partitions and archive expired ones")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    result = run_maintenance(engine, archive_dir=args.archive_dir)
+    if result["skipped"]:
+        print("Another process is running partition maintenance; nothing done")
+        return
+    for path in result["archived"]:
+        print(f"Archived {path}")
+    if not result["archived"]:
+        print("Nothing to archive")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -------------------------------------------
+# Benchmark per-request commits vs group commit at several batch sizes
+# -------------------------------------------
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import sessionmaker
+from app.group_commit import GroupCommitter
+from app.service import process_payment_fast
+from scripts.payment_benchmark import (
+    BENCH_DATABASE_URL,
+    CLIENTS,
+    check_double_spend,
+    make_engine,
+    make_requests,
+    reset,
+)
+
+BATCH_SIZES = (8, 32, 128)
+MAX_WAIT_SECONDS = 0.002
+
+def run_per_request(engine, requests):
+    """
+    Baseline: every payment commits its own transaction.
+    """
+    Session = sessionmaker(bind=engine)
+
+    def send(request):
+        key, user_id, amount = request
+        db = Session()
+        try:
+            process_payment_fast(db, user_id, amount, key)
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as clients:
+        list(clients.map(send, requests))
+    return time.perf_counter() - start, None
+
+def run_group_commit(engine, requests, max_batch):
+    """
+    Same traffic, but each client thread hands its payment to the
+    GroupCommitter and waits for its own result.
+    """
+    committer = GroupCommitter(sessionmaker(bind=engine), max_wait=MAX_WAIT_SECONDS, max_batch=max_batch)
+
+    def send(request):
+        key, user_id, amount = request
+        committer.submit(user_id, amount, key).result()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as clients:
+        list(clients.map(send, requests))
+    elapsed = time.perf_counter() - start
+    committer.close()
+    return elapsed, committer.stats()
+
+def check_failure_isolation(engine):
+    """
+    One payment the driver can't store, submitted in the same batch as
+    good ones: only that caller should get an error.
+    """
+    reset(engine)
+    committer = GroupCommitter(sessionmaker(bind=engine), max_wait=0.05, max_batch=50)
+    futures = [committer.submit(i % 5, 10, f"ok-{i}") for i in range(49)]
+    futures.append(committer.submit(1, {"not": "a number"}, "bad-1"))
+    outcomes = [f.exception() is None for f in futures]
+    committer.close()
+
+    print(
+        f"\nFailure isolation: {sum(outcomes)}/{len(outcomes)} payments succeeded, "
+        f"bad payment failed alone: {not outcomes[-1] and all(outcomes[:-1])} "
+        f"(fallback batches: {committer.fallbacks})"
+    )
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as directory:
+        url = BENCH_DATABASE_URL or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = make_engine(url)
+        payments, requests = make_requests()
+
+        print(f"{len(requests):,} requests ({len(payments):,} payments with retries), "
+              f"{CLIENTS} clients on {engine.dialect.name}\n")
+
+        runs = [("per-request", lambda: run_per_request(engine, requests))]
+        runs += [(f"group x{size}", lambda size=size: run_group_commit(engine, requests, size)) for size in BATCH_SIZES]
+
+        for label, run in runs:
+            reset(engine)
+            elapsed, stats = run()
+            duplicates, missing, wrong = check_double_spend(engine, payments)
+            batches = f"   avg batch {stats['avg_batch_size']:6.1f}" if stats else ""
+            print(
+                f"{label:<12} {len(requests) / elapsed:8,.0f} requests/sec{batches}   "
+                f"duplicate charges {duplicates}   missing {missing}   wrong balances {wrong}"
+            )
+
+        check_failure_isolation(engine)
+        engine.dispose()
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,128 @@
+# -------------------------------------------
+# Contention benchmark: many threads debiting ONE wallet,
+# single row vs balance split across slot rows
+# -------------------------------------------
+
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.hot_wallets import InsufficientFunds, WalletLockMetrics, debit_hot_wallet, split_wallet, wallet_balance
+from app.models import Base, Wallet
+from app.service import CLAIM_KEY_SQL
+from scripts.payment_benchmark import BENCH_DATABASE_URL, make_engine
+
+THREADS = 64
+PAYMENTS = 4000
+HOT_USER = 1
+SLOT_COUNTS = (1, 4, 16)  # 1 slot = a single row with a balance check
+FUNDED_SHARE = 0.9        # Start with enough money for ~90% of the payments
+
+def make_payments(seed=3):
+    rng = random.Random(seed)
+    return [(f"hot-{i}", rng.randint(1, 20)) for i in range(PAYMENTS)]
+
+def reset(engine, start_balance, slots):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(Wallet(user_id=HOT_USER, balance=start_balance))
+        db.commit()
+        split_wallet(db, HOT_USER, slots)
+
+def run(engine, payments, slots):
+    """
+    Every thread pays from the same wallet; each payment is a claim plus
+    a slot debit in one transaction (like the fast path).
+
+    Returns (elapsed, charged amounts, refused amounts, lock metrics)
+    """
+    Session = sessionmaker(bind=engine)
+    metrics = WalletLockMetrics()
+    charged, refused = [], []
+
+    def pay(payment):
+        key, amount = payment
+        db = Session()
+        try:
+            db.execute(CLAIM_KEY_SQL, {"user_id": HOT_USER, "amount": amount, "idem_key": key,
+                                       "created_at": datetime.utcnow()})
+            started = time.perf_counter()
+            debit_hot_wallet(db, HOT_USER, amount, slots)
+            metrics.record(HOT_USER, time.perf_counter() - started)
+            db.commit()
+            charged.append(amount)
+        except InsufficientFunds:
+            db.rollback()
+            refused.append(amount)
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as clients:
+        list(clients.map(pay, payments))
+    return time.perf_counter() - start, charged, refused, metrics
+
+def check(engine, start_balance, charged, refused):
+    """
+    - Balance equals start minus everything charged, and is never negative
+    - No payment was refused while the wallet could still cover it
+      (the balance only goes down, so every refused amount must exceed
+      the final balance)
+    - Exactly one payments row per charged payment
+    """
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        balance = wallet_balance(db, HOT_USER)
+        rows = db.execute(text("SELECT COUNT(*) FROM payments")).scalar()
+        negative_slots = db.execute(text("SELECT COUNT(*) FROM wallet_slots WHERE balance < 0")).scalar()
+
+    ok = (
+        balance == Decimal(start_balance - sum(charged))
+        and balance >= 0
+        and negative_slots == 0
+        and all(Decimal(amount) > balance for amount in refused)
+        and rows == len(charged)
+    )
+    return ok, balance
+
+def run_benchmark():
+    payments = make_payments()
+    start_balance = int(sum(amount for _, amount in payments) * FUNDED_SHARE)
+    # Divisible by every slot count, so slot shares are whole numbers
+    # (SQLite stores fractional NUMERIC values as floats)
+    start_balance -= start_balance % max(SLOT_COUNTS)
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = BENCH_DATABASE_URL or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = make_engine(url)
+        print(f"{PAYMENTS:,} payments from {THREADS} threads into ONE wallet on {engine.dialect.name} "
+              f"(funded for ~{FUNDED_SHARE:.0%} of them)\n")
+
+        all_ok = True
+        for slots in SLOT_COUNTS:
+            reset(engine, start_balance, slots)
+            elapsed, charged, refused, metrics = run(engine, payments, slots)
+            ok, balance = check(engine, start_balance, charged, refused)
+            all_ok &= ok
+            wallet = metrics.top(1)[0]
+            label = "single row" if slots == 1 else f"{slots} slots"
+            print(
+                f"{label:<11} {PAYMENTS / elapsed:7,.0f} payments/sec   "
+                f"debit wait avg {wallet['wait_ms_avg']:7.2f} ms  max {wallet['wait_ms_max']:8.2f} ms   "
+                f"charged {len(charged):,} refused {len(refused):,}   balance {balance}   "
+                f"{'OK' if ok else 'BALANCE CHECK FAILED'}"
+            )
+
+        engine.dispose()
+        if not all_ok:
+            raise SystemExit("Hot wallet overdrawn, lost a debit or refused a payment it could cover")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,115 @@
+# -------------------------------------------
+# Benchmark retry-heavy payment traffic with and without the idempotency cache
+# -------------------------------------------
+
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from app.idempotency_cache import (
+    IdempotencyCache,
+    IdempotencyConflict,
+    InProcessBackend,
+    request_fingerprint,
+)
+from app.service import process_payment
+from scripts.payment_benchmark import CLIENTS, check_double_spend, make_engine, reset
+
+PAYMENTS = 2000
+RETRY_SHARE = 0.6  # Share of traffic that is a retry of an earlier request
+
+def make_traffic(seed=7):
+    """
+    Payments plus retries: each retry re-sends a random earlier (or
+    concurrent) request with the same key and body.
+    """
+    rng = random.Random(seed)
+    payments = [(f"pay-{i}", rng.randrange(20), rng.randint(1, 100)) for i in range(PAYMENTS)]
+    retries = int(PAYMENTS * RETRY_SHARE / (1 - RETRY_SHARE))
+
+    traffic = list(payments)
+    for _ in range(retries):
+        # Retries trail the original by a few hundred requests, like a
+        # client timing out and trying again
+        position = rng.randrange(len(traffic))
+        traffic.insert(min(position + rng.randint(1, 300), len(traffic)), traffic[position])
+    return payments, traffic
+
+def count_statements(engine):
+    """
+    Count SQL statements sent to the database (commits and rollbacks
+    are round trips too).
+    """
+    counter = {"statements": 0}
+
+    def on_statement(*args):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_statement)
+    event.listen(engine, "commit", on_statement)
+    event.listen(engine, "rollback", on_statement)
+    return counter
+
+def run(engine, traffic, cache=None):
+    """
+    Send the traffic from CLIENTS threads, like the API would.
+    """
+    Session = sessionmaker(bind=engine)
+
+    def charge(user_id, amount, key):
+        db = Session()
+        try:
+            payment = process_payment(db, user_id, amount, key)
+            return {"payment_id": payment.id, "status": payment.status, "amount": float(payment.amount)}
+        finally:
+            db.close()
+
+    def handle(request):
+        key, user_id, amount = request
+        if cache is None:
+            return charge(user_id, amount, key)
+        fingerprint = request_fingerprint({"user_id": user_id, "amount": amount})
+        return cache.execute(key, fingerprint, lambda: charge(user_id, amount, key))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as clients:
+        list(clients.map(handle, traffic))
+    return time.perf_counter() - start
+
+def run_benchmark():
+    payments, traffic = make_traffic()
+    print(f"{len(traffic):,} requests ({PAYMENTS:,} payments, {len(traffic) - PAYMENTS:,} retries)\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        counter = count_statements(engine)
+
+        for label, cache in (("no cache", None), ("cache", IdempotencyCache(InProcessBackend()))):
+            reset(engine)
+            counter["statements"] = 0
+            elapsed = run(engine, traffic, cache)
+            duplicates, missing, wrong = check_double_spend(engine, payments)
+            print(
+                f"{label:<9} {len(traffic) / elapsed:8,.0f} requests/sec   "
+                f"{counter['statements']:6,} DB round trips   "
+                f"duplicate charges {duplicates}   missing {missing}   wrong balances {wrong}"
+            )
+            if cache is not None:
+                print(f"          {cache.stats()}")
+
+        # Reusing a key for a different payment must be refused
+        cache = IdempotencyCache(InProcessBackend())
+        cache.execute("pay-x", request_fingerprint({"user_id": 1, "amount": 10}), lambda: {"payment_id": 1})
+        try:
+            cache.execute("pay-x", request_fingerprint({"user_id": 1, "amount": 99}), lambda: {"payment_id": 2})
+            print("\nKey reuse with a different body: NOT detected")
+        except IdempotencyConflict:
+            print("\nKey reuse with a different body: rejected (409 Conflict in the API)")
+
+        engine.dispose()
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,117 @@
+# -------------------------------------------
+# Insert latency as payments grows to 100M rows: plain vs partitioned table
+# (Postgres only)
+# -------------------------------------------
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.partitions import create_partitions, partition_name, PARTITIONS_AHEAD_DAYS
+from app.service import process_payment
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql")
+LAYOUTS = {
+    # layout -> (schema file, payment mode)
+    "plain": ("schema.sql", "fast"),
+    "partitioned": ("partitioned_schema.sql", "partitioned"),
+}
+
+CHECKPOINTS = (1_000_000, 10_000_000, 30_000_000, 100_000_000)
+FILL_CHUNK_ROWS = 1_000_000  # Rows per bulk INSERT ... SELECT
+SAMPLES = 2000               # Timed single payments per checkpoint
+HISTORY_DAYS = 365           # Bulk rows are spread over this many past days
+
+def create_schema(engine, layout):
+    """
+    Drop both tables and create the layout's schema (plus a year of
+    daily partitions for the partitioned layout).
+    """
+    schema_file, _ = LAYOUTS[layout]
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS payments CASCADE"))
+        conn.execute(text("DROP TABLE IF EXISTS wallets CASCADE"))
+        conn.execute(text(open(os.path.join(SQL_DIR, "schema.sql")).read()))
+        if layout == "partitioned":
+            # Keep the wallets table, swap payments for the partitioned one
+            conn.execute(text("DROP TABLE payments"))
+            conn.execute(text(open(os.path.join(SQL_DIR, schema_file)).read()))
+            today = datetime.utcnow().date()
+            create_partitions(conn, today - timedelta(days=HISTORY_DAYS), today + timedelta(days=PARTITIONS_AHEAD_DAYS))
+        conn.execute(text("INSERT INTO wallets (user_id, balance) SELECT g, 1000000000 FROM generate_series(0, 999) g"))
+
+def grow(engine, start, stop):
+    """
+    Bulk-insert rows start..stop-1 with created_at spread over the past
+    HISTORY_DAYS (excluding today, like real history).
+    """
+    for lo in range(start, stop, FILL_CHUNK_ROWS):
+        hi = min(lo + FILL_CHUNK_ROWS, stop)
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO payments (user_id, amount, idempotency_key, status, created_at)
+                SELECT g % 1000, 1, 'bulk-' || g, 'SUCCESS',
+                       date_trunc('day', now()) - random() * (:days - 1) * interval '1 day' - interval '1 second'
+                FROM generate_series(:lo, :hi - 1) g
+            """), {"lo": lo, "hi": hi, "days": HISTORY_DAYS})
+        print(f"  ... {hi:,} rows", end="\r", flush=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE payments"))
+
+def sample_inserts(engine, layout, checkpoint):
+    """
+    Time SAMPLES new payments (each is claim + debit + commit).
+    Returns latencies in milliseconds.
+    """
+    _, mode = LAYOUTS[layout]
+    Session = sessionmaker(bind=engine)
+    latencies = []
+    with Session() as db:
+        for i in range(SAMPLES):
+            start = time.perf_counter()
+            process_payment(db, i % 1000, 1, f"sample-{checkpoint}-{i}", mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return sorted(latencies)
+
+def index_size(engine, layout):
+    """
+    Size of the indexes a new payment has to update: the whole table's
+    for plain, today's partition's for partitioned.
+    """
+    table = "payments" if layout == "plain" else partition_name(datetime.utcnow().date())
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT pg_size_pretty(pg_indexes_size('{table}'))")).scalar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Insert latency as payments grows: plain vs partitioned table (Postgres only)")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="Postgres URL of a scratch database (tables are dropped!)")
+    parser.add_argument("--rows", type=int, default=CHECKPOINTS[-1])
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS))
+    args = parser.parse_args()
+    if not args.database_url or not args.database_url.startswith("postgresql"):
+        raise SystemExit("Needs a Postgres scratch database: --database-url or BENCH_DATABASE_URL")
+
+    engine = create_engine(args.database_url)
+    checkpoints = [c for c in CHECKPOINTS if c < args.rows] + [args.rows]
+
+    print(f"{'layout':<12} {'rows':>12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'index touched':>14}")
+    for layout in args.layouts:
+        create_schema(engine, layout)
+        rows = 0
+        for checkpoint in checkpoints:
+            grow(engine, rows, checkpoint)
+            rows = checkpoint
+            latencies = sample_inserts(engine, layout, checkpoint)
+            print(
+                f"{layout:<12} {rows:>12,} {latencies[len(latencies) // 2]:>8.2f} "
+                f"{latencies[int(len(latencies) * 0.99)]:>8.2f} {statistics.mean(latencies):>8.2f} "
+                f"{index_size(engine, layout):>14}"
+            )
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
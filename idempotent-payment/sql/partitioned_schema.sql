@@ -0,0 +1,32 @@
+-- =========================
+-- Partitioned payments table (alternative to the payments table in schema.sql)
+-- Use with PAYMENT_MODE=partitioned.
+--
+-- Payments are range-partitioned by day on created_at:
+-- - Each insert only touches today's partition and its small indexes
+-- - Old days are detached and archived as whole partitions (no DELETE, no bloat)
+--
+-- Idempotency keys are only guaranteed unique inside the retention window
+-- (IDEMPOTENCY_RETENTION_DAYS in app/partitions.py). A retry older than the
+-- window is treated as a new payment.
+-- =========================
+CREATE TABLE IF NOT EXISTS payments (
+    id BIGSERIAL,                           -- Unique payment record ID
+    user_id INTEGER NOT NULL,               -- User making the payment
+    amount NUMERIC NOT NULL,                -- Amount of money involved in the payment
+    idempotency_key TEXT NOT NULL,          -- Unique within the retention window (see above)
+    status TEXT NOT NULL,                   -- Payment state (e.g. 'pending', 'success', 'failed')
+    created_at TIMESTAMP NOT NULL DEFAULT now(), -- Partition key
+    PRIMARY KEY (id, created_at)            -- Postgres requires the partition key in every unique index
+) PARTITION BY RANGE (created_at);
+
+-- Postgres can't enforce a UNIQUE index on idempotency_key alone across
+-- partitions. Each partition gets a plain index instead, and the service
+-- serializes payments per key with pg_advisory_xact_lock before it
+-- checks the partitions inside the retention window.
+CREATE INDEX IF NOT EXISTS payments_idempotency_key_idx ON payments (idempotency_key, created_at);
+
+-- Daily partitions are created ahead of time by the maintenance job
+-- (app/partitions.py), e.g.:
+--   CREATE TABLE payments_p20240101 PARTITION OF payments
+--       FOR VALUES FROM ('2024-01-01') TO ('2024-01-02');
@@ -23,3 +23,16 @@ CREATE TABLE IF NOT EXISTS payments (
     status TEXT NOT NULL,                 -- Payment state (e.g. 'pending', 'success', 'failed')
     created_at TIMESTAMP DEFAULT now()    -- Timestamp for auditing and debugging
 );
+
+-- =========================
+-- Wallet slots (hot-wallet mode)
+-- A hot wallet's balance is split across several rows, so concurrent
+-- debits lock different rows instead of queueing on one.
+-- A wallet's balance is wallets.balance + the sum of its slots.
+-- =========================
+CREATE TABLE IF NOT EXISTS wallet_slots (
+    user_id INTEGER NOT NULL,                          -- Wallet owner
+    slot INTEGER NOT NULL,                             -- 0 .. HOT_WALLET_SLOTS - 1
+    balance NUMERIC NOT NULL DEFAULT 0 CHECK (balance >= 0), -- Never negative, so the wallet can't be either
+    PRIMARY KEY (user_id, slot)
+);
@@ -1,26 +1,168 @@
+import importlib.util
+import os
+import time
 import httpx
+from app.timing import record_phase
 
 # Base URL of the external service we depend on
 # In real systems, this would usually come from an environment variable
-EXTERNAL_BASE_URL = "http://localhost:8001"
+EXTERNAL_BASE_URL = os.environ.get("EXTERNAL_BASE_URL", "http://localhost:8001")
 
-async def fetch_external_profile(user_id: int):
+# Total request timeout: if the external service does not respond in time,
+# httpx raises a timeout exception and the caller falls back
+REQUEST_TIMEOUT_SECONDS = 1.0
+
+# Connection pool settings for the shared client:
+# - MAX_CONNECTIONS caps concurrent connections to the dependency
+#   (requests beyond it wait for a free connection)
+# - MAX_KEEPALIVE_CONNECTIONS idle connections are kept open for reuse
+# - Idle connections are closed after KEEPALIVE_EXPIRY_SECONDS
+MAX_CONNECTIONS = int(os.environ.get("EXTERNAL_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("EXTERNAL_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("EXTERNAL_KEEPALIVE_EXPIRY", "30"))
+
+# HTTP/2 multiplexes many requests over one connection (needs `pip install "httpx[http2]"`
+# and a TLS endpoint that negotiates h2; plain http:// stays on HTTP/1.1)
+HTTP2 = os.environ.get("EXTERNAL_HTTP2") == "1"
+
+class ClientMetrics:
+    """
+    Counters for the shared client's pool and per-request timings.
+
+    How it works:
+    - In-flight requests are counted around every call, so utilization
+      is in_flight / MAX_CONNECTIONS (and the peak since startup)
+    - httpcore's trace hook reports when a request had to open a new
+      connection (TCP connect + TLS) and how long that took; the rest
+      of the request is time spent sending and waiting for the response
+    """
+    def __init__(self, max_connections=MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.connections_opened = 0
+        self.connect_failures = 0
+        self.connect_seconds = 0.0
+        self.request_seconds = 0.0  # Total minus connect time
+
+    def started(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, total_seconds, timer):
+        self.in_flight -= 1
+        self.requests += 1
+        self.request_seconds += total_seconds - timer.connect_seconds
+        if timer.attempted:
+            self.connect_seconds += timer.connect_seconds
+            if timer.failed:
+                self.connect_failures += 1
+            else:
+                self.connections_opened += 1
+
+    def snapshot(self) -> dict:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "pool_utilization": round(self.in_flight / self.max_connections, 3),
+            "peak_pool_utilization": round(self.peak_in_flight / self.max_connections, 3),
+            "connections_opened": self.connections_opened,
+            "connect_failures": self.connect_failures,
+            "connection_reuse_ratio": round(1 - (self.connections_opened + self.connect_failures) / requests, 4) if self.requests else 0.0,
+            "avg_connect_ms": round(self.connect_seconds * 1000 / max(self.connections_opened + self.connect_failures, 1), 3),
+            "avg_request_ms": round(self.request_seconds * 1000 / requests, 3),
+            "http2": HTTP2,
+        }
+
+class ConnectTimer:
+    """
+    httpcore trace callback for one request: measures time spent opening
+    a connection (zero when a pooled connection was reused).
+    """
+    __slots__ = ("connect_seconds", "attempted", "failed", "_started")
+
+    def __init__(self):
+        self.connect_seconds = 0.0
+        self.attempted = False
+        self.failed = False
+        self._started = None
+
+    async def __call__(self, event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            self.attempted = True
+            self._started = time.perf_counter()
+        elif self._started is not None and event_name in (
+            "connection.connect_tcp.complete", "connection.start_tls.complete",
+            "connection.connect_tcp.failed", "connection.start_tls.failed",
+        ):
+            self.connect_seconds = time.perf_counter() - self._started
+            self.failed = event_name.endswith(".failed")
+
+metrics = ClientMetrics()
+
+# The shared client, created at app startup and closed at shutdown (see main.lifespan)
+_client = None
+
+def create_client(base_url: str = None) -> httpx.AsyncClient:
+    """
+    Build the pooled client: keep-alive connections are reused across
+    requests, so only the first request per connection pays for TCP/TLS.
+    """
+    if HTTP2 and importlib.util.find_spec("h2") is None:
+        raise RuntimeError('EXTERNAL_HTTP2=1 needs the h2 package: pip install "httpx[http2]"')
+
+    return httpx.AsyncClient(
+        base_url=base_url or EXTERNAL_BASE_URL,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=HTTP2,
+    )
+
+async def start_client(base_url: str = None):
+    """Create the shared client (app startup)."""
+    global _client
+    if _client is None:
+        _client = create_client(base_url)
+
+async def close_client():
+    """Close pooled connections (app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client not started; call start_client() (done by the app lifespan)")
+    return _client
+
+async def fetch_external_profile(user_id: int, timeout: float = None):
     """
     Fetch a user profile from an external service with a strict timeout.
     This protects our service from hanging if the dependency is slow.
-    """
 
-    # Define a total request timeout of 1 second
-    # If the external service does not respond in time,
-    # httpx will raise a timeout exception
-    timeout = httpx.Timeout(1.0)
+    Uses the shared pooled client, so repeated calls reuse open connections
+    instead of paying for connection setup every time.
 
-    # Create an async HTTP client with the configured timeout
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    timeout: seconds for this call (default: REQUEST_TIMEOUT_SECONDS)
+    """
+    client = get_client()
+    timer = ConnectTimer()
+    metrics.started()
+    start = time.perf_counter()
 
+    try:
         # Make a GET request to the external service
         response = await client.get(
-            f"{EXTERNAL_BASE_URL}/external/profile/{user_id}"
+            f"/external/profile/{user_id}",
+            timeout=httpx.Timeout(timeout) if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            extensions={"trace": timer}
         )
 
         # Raise an exception for non-2xx HTTP responses
@@ -29,3 +171,8 @@ async def fetch_external_profile(user_id: int):
 
         # Parse and return the JSON response body
         return response.json()
+
+    finally:
+        metrics.finished(time.perf_counter() - start, timer)
+        if timer.attempted:
+            record_phase("connect", timer.connect_seconds)
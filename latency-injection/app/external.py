@@ -1,24 +1,28 @@
-import random
-import time
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from app.injection import InjectedError, InjectionEngine, LatencyProfile
 
 # Initialize FastAPI application
 app = FastAPI()
 
+# Decides how slow (or broken) each route is; profiles can change at runtime
+engine = InjectionEngine()
+
 @app.get("/external/profile/{user_id}")
-def external_profile(user_id: int):
+async def external_profile(user_id: int):
     """
     Simulates an external dependency (e.g., a third-party API)
     that responds with unpredictable latency.
     This is useful for testing timeouts, retries, and latency handling.
     """
 
-    # Generate a random delay between 0.5 and 2.0 seconds
-    # to mimic real-world network or service slowness
-    delay = random.uniform(0.5, 2.0)
-
-    # Block the request for `delay` seconds to simulate slow response
-    time.sleep(delay)
+    # Wait according to the route's latency profile
+    # (uniform 0.5 to 2.0 seconds by default). asyncio.sleep holds no
+    # thread, so thousands of slow responses can be in flight at once
+    try:
+        delay = await engine.inject("profile")
+    except InjectedError as exc:
+        # Injected failure: answer like a dependency that's having a bad day
+        raise HTTPException(status_code=503, detail=str(exc))
 
     # Return mock profile data along with the simulated latency
     return {
@@ -26,3 +30,27 @@ def external_profile(user_id: int):
         "source": "external-service",
         "delay_seconds": round(delay, 2)
     }
+
+@app.get("/admin/injection")
+async def injection_settings():
+    """
+    Current profiles and per-route counters (requests, errors, timeouts, in flight).
+    """
+    return engine.stats()
+
+@app.put("/admin/injection/{route}")
+async def set_injection_profile(route: str, profile: LatencyProfile):
+    """
+    Replace a route's latency profile; the next call uses it.
+    Route "profile" is /external/profile/{user_id}.
+    """
+    engine.set_profile(route, profile)
+    return {"route": route, "profile": profile.model_dump()}
+
+@app.delete("/admin/injection/{route}")
+async def reset_injection_profile(route: str):
+    """
+    Put a route back on the default profile.
+    """
+    engine.reset(route)
+    return {"route": route, "profile": engine.profile_for(route).model_dump()}
@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+
+# Simulated delay range in seconds for the default uniform profile
+DELAY_MIN_SECONDS = float(os.environ.get("EXTERNAL_DELAY_MIN", "0.5"))
+DELAY_MAX_SECONDS = float(os.environ.get("EXTERNAL_DELAY_MAX", "2.0"))
+
+# Full default profile as JSON (overrides the two settings above), e.g.
+# EXTERNAL_LATENCY_PROFILE='{"distribution": "lognormal", "median_seconds": 0.2, "sigma": 1.0}'
+DEFAULT_PROFILE_JSON = os.environ.get("EXTERNAL_LATENCY_PROFILE")
+
+# Seed for reproducible delays and faults (unset: different on every run)
+SEED = os.environ.get("EXTERNAL_SEED")
+
+class HistogramBucket(BaseModel):
+    """One bucket of a recorded latency histogram: `count` calls took up to `upper_seconds`."""
+    upper_seconds: float = Field(gt=0)
+    count: int = Field(ge=0)
+
+class LatencyProfile(BaseModel):
+    """
+    How one route of the stub behaves.
+
+    Distributions:
+    - uniform:   between min_seconds and max_seconds
+    - lognormal: median_seconds, spread sigma (most calls near the median,
+                 a long right tail)
+    - pareto:    at least scale_seconds; smaller alpha = heavier tail
+    - histogram: replays a recorded histogram (buckets sorted by upper bound,
+                 uniform within a bucket)
+
+    Every delay is capped at cap_seconds. On top of the delay:
+    - error_rate:   share of calls answered with HTTP 503
+    - timeout_rate: share of calls that hang for hang_seconds (long enough
+                    for any client timeout to fire)
+    """
+    distribution: Literal["uniform", "lognormal", "pareto", "histogram"] = "uniform"
+    min_seconds: float = Field(DELAY_MIN_SECONDS, ge=0)
+    max_seconds: float = Field(DELAY_MAX_SECONDS, ge=0)
+    median_seconds: float = Field(0.2, gt=0)
+    sigma: float = Field(0.5, ge=0)
+    scale_seconds: float = Field(0.1, gt=0)
+    alpha: float = Field(2.0, gt=0)
+    histogram: Optional[List[HistogramBucket]] = None
+    cap_seconds: float = Field(30.0, ge=0)
+    error_rate: float = Field(0.0, ge=0, le=1)
+    timeout_rate: float = Field(0.0, ge=0, le=1)
+    hang_seconds: float = Field(30.0, ge=0)
+
+    @model_validator(mode="after")
+    def check(self):
+        if self.distribution == "uniform" and self.min_seconds > self.max_seconds:
+            raise ValueError("min_seconds must not exceed max_seconds")
+        if self.distribution == "histogram":
+            buckets = self.histogram or []
+            if not any(bucket.count for bucket in buckets):
+                raise ValueError("histogram needs at least one bucket with a count")
+            if [b.upper_seconds for b in buckets] != sorted(b.upper_seconds for b in buckets):
+                raise ValueError("histogram buckets must be sorted by upper_seconds")
+        if self.error_rate + self.timeout_rate > 1:
+            raise ValueError("error_rate + timeout_rate must not exceed 1")
+        return self
+
+class InjectedError(Exception):
+    """The profile decided this call fails (the route answers 503)."""
+
+class InjectionEngine:
+    """
+    Picks the delay and fault for every stub call, per route.
+
+    How it works:
+    - Each route ("profile", ...) has a LatencyProfile; routes without one
+      use the default profile
+    - Profiles can be replaced at runtime (admin endpoint), and the next
+      call uses the new one
+    - The delay is an asyncio.sleep, so a slow call holds no thread: one
+      process can keep thousands of slow responses in flight
+
+    Why it matters:
+    - A thread-per-call stub (time.sleep in a sync handler) tops out at
+      the threadpool size (~40), far below production concurrency
+    - Real dependencies have long tails and failures, not a flat 0.5-2 s
+    """
+    def __init__(self, default: LatencyProfile = None, seed=SEED):
+        self.default = default or default_profile()
+        self.routes = {}
+        self.rng = random.Random(seed)
+
+        # Counters per route for monitoring
+        self.counters = {}
+
+    def profile_for(self, route: str) -> LatencyProfile:
+        return self.routes.get(route, self.default)
+
+    def set_profile(self, route: str, profile: LatencyProfile):
+        self.routes[route] = profile
+
+    def reset(self, route: str):
+        """Back to the default profile."""
+        self.routes.pop(route, None)
+
+    def sample_delay(self, profile: LatencyProfile) -> float:
+        rng = self.rng
+        if profile.distribution == "uniform":
+            delay = rng.uniform(profile.min_seconds, profile.max_seconds)
+        elif profile.distribution == "lognormal":
+            delay = rng.lognormvariate(math.log(profile.median_seconds), profile.sigma)
+        elif profile.distribution == "pareto":
+            delay = profile.scale_seconds * rng.paretovariate(profile.alpha)
+        else:
+            delay = self._sample_histogram(profile)
+        return min(delay, profile.cap_seconds)
+
+    def _sample_histogram(self, profile: LatencyProfile) -> float:
+        # Pick a bucket weighted by its count, then a delay inside it
+        buckets = profile.histogram
+        counts = list(itertools.accumulate(bucket.count for bucket in buckets))
+        index = bisect.bisect_right(counts, self.rng.randrange(counts[-1]))
+        lower = buckets[index - 1].upper_seconds if index > 0 else 0.0
+        return self.rng.uniform(lower, buckets[index].upper_seconds)
+
+    async def inject(self, route: str) -> float:
+        """
+        Wait like the dependency would for this route.
+
+        Returns: the delay in seconds
+        Raises: InjectedError for an injected failure
+        """
+        profile = self.profile_for(route)
+        stats = self.counters.setdefault(route, {"requests": 0, "errors": 0, "timeouts": 0, "in_flight": 0, "peak_in_flight": 0})
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+        try:
+            roll = self.rng.random()
+            if roll < profile.timeout_rate:
+                stats["timeouts"] += 1
+                await asyncio.sleep(profile.hang_seconds)
+                return profile.hang_seconds
+
+            delay = self.sample_delay(profile)
+            await asyncio.sleep(delay)
+            if roll < profile.timeout_rate + profile.error_rate:
+                stats["errors"] += 1
+                raise InjectedError(f"Injected failure after {delay:.3f}s")
+            return delay
+        finally:
+            stats["in_flight"] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default.model_dump(),
+            "routes": {route: profile.model_dump() for route, profile in self.routes.items()},
+            "counters": self.counters,
+        }
+
+def default_profile() -> LatencyProfile:
+    if DEFAULT_PROFILE_JSON:
+        return LatencyProfile(**json.loads(DEFAULT_PROFILE_JSON))
+    return LatencyProfile()
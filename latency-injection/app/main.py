@@ -1,11 +1,76 @@
-from fastapi import FastAPI
-from app.client import fetch_external_profile
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app.client import close_client, metrics, start_client
 from app.fallback import fallback_profile
+from app.profile_cache import PREWARM_USER_IDS, ProfileCache
+from app.tail_latency import TailLatencyController
+from app.timing import TimingMiddleware, handler_finished, handler_started, record_phase, timing_metrics
 from app.utils import now_ms
 import httpx
 
+@asynccontextmanager
+async def lifespan(app):
+    # One pooled HTTP client for the whole process:
+    # created at startup, connections closed at shutdown
+    await start_client()
+    if PREWARM_USER_IDS:
+        await profile_cache.prewarm(PREWARM_USER_IDS)
+    yield
+    await close_client()
+
 # Initialize the FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Per-request phase timings: Server-Timing header + /metrics histograms
+app.add_middleware(TimingMiddleware)
+
+# Adaptive timeouts and hedged requests for the external call
+# (EXTERNAL_CALL_MODE=fixed|adaptive|hedged)
+tail_controller = TailLatencyController()
+
+# Recently fetched profiles, served when the dependency is slow or down
+profile_cache = ProfileCache(tail_controller.call)
+
+# POST /profiles limits:
+# - at most BATCH_MAX_USERS ids per request
+# - at most BATCH_CONCURRENCY external calls in flight per batch
+# - users not done after BATCH_DEADLINE_SECONDS get cached or fallback data
+BATCH_MAX_USERS = int(os.environ.get("PROFILES_BATCH_MAX_USERS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("PROFILES_BATCH_CONCURRENCY", "10"))
+BATCH_DEADLINE_SECONDS = float(os.environ.get("PROFILES_BATCH_DEADLINE", "2.5"))
+
+async def load_profile(user_id: int):
+    """
+    Profile from the cache or the external dependency, with the static
+    fallback for users we've never fetched.
+
+    Returns: (data, source_used, winning attempt)
+    """
+    started = time.perf_counter()
+    try:
+        # Serve from the cache, or fetch from the external dependency
+        # (this call may be slow or time out)
+        # source: cache-fresh, cache-stale or external
+        result = await profile_cache.get(user_id)
+
+    except httpx.HTTPError:
+        # Handle network errors, timeouts and error responses gracefully
+        # Only users we've never fetched get here: return fallback data
+        result = None
+    record_phase("external", time.perf_counter() - started)
+    if result is not None:
+        return result
+
+    started = time.perf_counter()
+    data = fallback_profile(user_id)
+    record_phase("fallback", time.perf_counter() - started)
+    return data, "fallback", None
 
 @app.get("/profile/{user_id}")
 async def get_profile(user_id: int):
@@ -17,26 +82,137 @@ async def get_profile(user_id: int):
 
     # Record request start time for latency measurement
     start = now_ms()
+    handler_started()
 
-    try:
-        # Attempt to fetch data from an external dependency
-        # This call may be slow or time out
-        external_data = await fetch_external_profile(user_id)
-        source = "external"  # Track where the data came from
-
-    except httpx.RequestError:
-        # Handle network errors or timeouts gracefully
-        # Instead of failing the request, return fallback data
-        external_data = fallback_profile(user_id)
-        source = "fallback"
+    # Cache or external dependency; falls back instead of failing
+    external_data, source, attempt = await load_profile(user_id)
 
     # Calculate total request duration in milliseconds
     duration = round(now_ms() - start, 2)
+    handler_finished()
 
     # Return response with observability-friendly metadata
     return {
         "user_id": user_id,                # Requested user
         "data": external_data,             # Profile data (external or fallback)
         "source_used": source,              # Indicates which path was taken
+        "winning_attempt": attempt,         # 1 = first call, 2 = hedge, None = cache or fallback
         "total_latency_ms": duration        # End-to-end request latency
     }
+
+@app.post("/profiles")
+async def get_profiles(user_ids: List[int] = Body(...)):
+    """
+    Batch version of /profile/{user_id} for aggregator pages.
+
+    How it works:
+    - All users are fetched concurrently, at most BATCH_CONCURRENCY at a time
+    - Each result is streamed as one NDJSON line as soon as it's ready,
+      so the client doesn't wait for the slowest user
+    - At BATCH_DEADLINE_SECONDS the remaining fetches are cancelled and
+      those users get cached data if we have any, else the fallback
+    - An unexpected error for one user becomes an error line for that
+      user; the rest of the stream carries on
+    """
+    if not user_ids:
+        raise HTTPException(status_code=422, detail="user_ids must not be empty")
+    if len(user_ids) > BATCH_MAX_USERS:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_USERS} user_ids per batch")
+
+    start = now_ms()
+    handler_started()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def load(user_id):
+        async with semaphore:
+            return user_id, await load_profile(user_id)
+
+    def line(user_id, data, source, attempt, error=None):
+        item = {
+            "user_id": user_id,
+            "data": data,
+            "source_used": source,
+            "winning_attempt": attempt,
+            "latency_ms": round(now_ms() - start, 2),  # Since the batch started
+        }
+        if error is not None:
+            item["error"] = error
+        return json.dumps(item) + "\n"
+
+    async def stream():
+        tasks = {asyncio.create_task(load(user_id)): user_id for user_id in user_ids}
+        deadline = asyncio.get_running_loop().time() + BATCH_DEADLINE_SECONDS
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - asyncio.get_running_loop().time(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    break  # Deadline reached
+                for task in done:
+                    try:
+                        user_id, (data, source, attempt) = task.result()
+                    except Exception as exc:
+                        # Headers are already sent: report it in this user's line
+                        yield line(tasks[task], None, "error", None, error=str(exc) or type(exc).__name__)
+                        continue
+                    yield line(user_id, data, source, attempt)
+
+            # Past the deadline: answer from the cache (any age) or the fallback
+            for task in pending:
+                task.cancel()
+                user_id = tasks[task]
+                cached = profile_cache.peek(user_id)
+                if cached is not None:
+                    data, source = cached
+                    yield line(user_id, data, source, None)
+                else:
+                    yield line(user_id, fallback_profile(user_id), "fallback", None)
+        finally:
+            # Client went away mid-stream: stop the remaining fetches
+            for task in pending:
+                task.cancel()
+
+    # Headers go out before the first profile: per-item timings are in each line
+    handler_finished()
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/client/stats")
+async def client_stats():
+    """
+    Pool utilization and connect vs request time of the shared HTTP client.
+    """
+    return metrics.snapshot()
+
+@app.get("/tail/stats")
+async def tail_stats():
+    """
+    Dependency latency percentiles, current timeout and hedging counters.
+    """
+    return tail_controller.stats()
+
+@app.get("/profile-cache/stats")
+async def profile_cache_stats():
+    """
+    Hit ratio, refreshes and evictions of the profile cache.
+    """
+    return profile_cache.stats()
+
+@app.post("/profile-cache/prewarm")
+async def prewarm_profile_cache(user_ids: List[int] = Body(...)):
+    """
+    Load the given users' profiles into the cache, e.g. before a traffic peak.
+    """
+    loaded = await profile_cache.prewarm(user_ids)
+    return {"requested": len(user_ids), "loaded": loaded}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Request phase histograms (queue, connect, wait, fallback, serialize,
+    total) per route, in Prometheus text format.
+    """
+    return PlainTextResponse(timing_metrics.render(), media_type="text/plain; version=0.0.4")
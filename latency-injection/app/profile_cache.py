@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+import httpx
+
+# Entries younger than this are served without calling the dependency
+FRESH_TTL_SECONDS = float(os.environ.get("PROFILE_CACHE_TTL", "30"))
+
+# Entries up to this old are served immediately and refreshed in the background;
+# older ones make the request wait for a refresh (and are still served if it fails)
+STALE_TTL_SECONDS = float(os.environ.get("PROFILE_CACHE_STALE_TTL", "300"))
+
+# Bounded memory: least recently used profiles are evicted past this size
+MAX_ENTRIES = int(os.environ.get("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+
+# Users to load at startup, e.g. PROFILE_CACHE_PREWARM=1,2,3
+PREWARM_USER_IDS = [int(u) for u in os.environ.get("PROFILE_CACHE_PREWARM", "").split(",") if u.strip()]
+PREWARM_CONCURRENCY = 10
+
+def _discard_result(task):
+    # Background refreshes have no awaiter; failures are already counted
+    if not task.cancelled():
+        task.exception()
+
+class ProfileCache:
+    """
+    Stale-while-revalidate cache in front of the external profile call.
+
+    How it works:
+    - Fresh hit (< FRESH_TTL_SECONDS): returned, no external call
+    - Stale hit (< STALE_TTL_SECONDS): returned immediately, refreshed
+      by a background task
+    - Miss (or older entry): the request waits for a refresh
+    - One refresh per user at a time: concurrent requests for the same
+      user await the same task instead of each calling the dependency
+    - If the refresh fails, any cached entry (however old) beats the
+      static fallback; only users never fetched get the fallback
+
+    Why it matters:
+    - A dependency timeout no longer throws away data we had seconds ago
+    - A burst of requests for one user becomes one external call
+    """
+    def __init__(self, fetch, fresh_ttl=FRESH_TTL_SECONDS, stale_ttl=STALE_TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.fetch = fetch  # async user_id -> (data, winning attempt)
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (data, fetched_at)
+        self._refreshing = {}          # user_id -> refresh task
+
+        # Counters for monitoring
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _store(self, user_id, data):
+        self._entries[user_id] = (data, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _refresh(self, user_id):
+        self.refreshes += 1
+        try:
+            data, attempt = await self.fetch(user_id)
+        except httpx.HTTPError:
+            self.refresh_failures += 1
+            raise
+        finally:
+            self._refreshing.pop(user_id, None)
+        self._store(user_id, data)
+        return data, attempt
+
+    def _refresh_task(self, user_id):
+        """The user's in-flight refresh, or a new one."""
+        task = self._refreshing.get(user_id)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = self._refreshing[user_id] = asyncio.create_task(self._refresh(user_id))
+        return task
+
+    async def get(self, user_id: int):
+        """
+        Returns: (data, source_used, winning attempt)
+        source_used: "cache-fresh", "cache-stale", "external" or "fallback"
+        Raises: httpx.HTTPError only for a cold miss whose fetch failed
+                (the caller returns the static fallback)
+        """
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            data, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            self._entries.move_to_end(user_id)
+            if age < self.fresh_ttl:
+                self.fresh_hits += 1
+                return data, "cache-fresh", None
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_task(user_id).add_done_callback(_discard_result)
+                return data, "cache-stale", None
+
+        self.misses += 1
+        try:
+            # shield: a cancelled request must not cancel the refresh other requests share
+            data, attempt = await asyncio.shield(self._refresh_task(user_id))
+            return data, "external", attempt
+        except httpx.HTTPError:
+            if entry is None:
+                self.fallbacks += 1
+                raise
+            return entry[0], "cache-stale", None
+
+    def peek(self, user_id: int):
+        """
+        Cached data at any age as (data, "cache-fresh" or "cache-stale"),
+        or None; never calls the dependency.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        data, fetched_at = entry
+        return data, "cache-fresh" if time.monotonic() - fetched_at < self.fresh_ttl else "cache-stale"
+
+    async def prewarm(self, user_ids, concurrency=PREWARM_CONCURRENCY) -> int:
+        """
+        Load profiles before traffic needs them. Returns how many loaded.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(user_id):
+            async with semaphore:
+                try:
+                    await self._refresh_task(user_id)
+                    return True
+                except httpx.HTTPError:
+                    return False
+
+        return sum(await asyncio.gather(*(load(user_id) for user_id in user_ids)))
+
+    def stats(self) -> dict:
+        served = self.fresh_hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "fresh_ttl_seconds": self.fresh_ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.fresh_hits + self.stale_hits) / served, 4) if served else 0.0,
+            "fallbacks": self.fallbacks,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "coalesced_requests": self.coalesced,
+            "refreshing": len(self._refreshing),
+            "evictions": self.evictions,
+        }
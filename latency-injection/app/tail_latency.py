@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+from collections import deque
+import httpx
+from app.client import REQUEST_TIMEOUT_SECONDS, fetch_external_profile
+
+# How external calls are timed out:
+# - "fixed":    one attempt, REQUEST_TIMEOUT_SECONDS
+# - "adaptive": one attempt, timeout derived from recent latencies
+# - "hedged":   adaptive timeout plus a second attempt when the first is slow
+CALL_MODE = os.environ.get("EXTERNAL_CALL_MODE", "hedged")
+
+# Adaptive timeout = this percentile of recent latencies, within [MIN, MAX]
+TIMEOUT_PERCENTILE = 0.99
+MIN_TIMEOUT_SECONDS = 0.1
+MAX_TIMEOUT_SECONDS = 3.0
+
+# Send a hedge once the first attempt is slower than this percentile
+HEDGE_PERCENTILE = 0.95
+
+# Rolling window of dependency latencies
+WINDOW_SIZE = 1000
+MIN_SAMPLES = 50       # Until then: MAX_TIMEOUT_SECONDS and no hedging
+RECOMPUTE_EVERY = 20   # Re-sort the window every N samples, not on every call
+
+# A timed-out attempt is recorded as this multiple of the timeout it hit
+# (its real latency is unknown but larger), so if too many calls time out
+# the percentile - and with it the timeout - moves up
+TIMEOUT_PENALTY = 1.5
+
+# Hedges may add at most ~10% extra load (plus a small burst allowance)
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MAX_TOKENS = 10.0
+
+class LatencyWindow:
+    """
+    Rolling window of the last WINDOW_SIZE latencies with cached percentiles.
+    """
+    def __init__(self, size=WINDOW_SIZE):
+        self._samples = deque(maxlen=size)
+        self._sorted = []
+        self._since_sort = 0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_sort += 1
+        if self._since_sort >= RECOMPUTE_EVERY or len(self._samples) <= MIN_SAMPLES:
+            self._sorted = sorted(self._samples)
+            self._since_sort = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float):
+        if not self._sorted:
+            return None
+        return self._sorted[min(int(len(self._sorted) * q), len(self._sorted) - 1)]
+
+class RetryBudget:
+    """
+    Token bucket that caps extra load from hedges.
+
+    Every primary request deposits RETRY_BUDGET_RATIO tokens (up to
+    RETRY_BUDGET_MAX_TOKENS); every hedge spends one. When the dependency
+    is slow for everyone, the budget runs out instead of doubling its load.
+    """
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, max_tokens=RETRY_BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.denied = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.denied += 1
+        return False
+
+def _discard_result(task):
+    if not task.cancelled():
+        task.exception()
+
+class TailLatencyController:
+    """
+    Timeouts and hedging for the external profile call.
+
+    How it works:
+    - Every finished attempt's latency goes into a rolling window
+    - Timeout: TIMEOUT_PERCENTILE of the window (fixed mode: 1 s)
+    - Hedge: if the first attempt passes HEDGE_PERCENTILE and the retry
+      budget allows, a second attempt starts; the first success wins and
+      the other is cancelled
+    - Both attempts share one deadline (the timeout from the first send)
+
+    Why it matters:
+    - A fixed timeout below the dependency's normal tail sends a big
+      share of calls to the fallback; one far above it makes every
+      slow call slow
+    - A hedge turns "one unlucky slow call" into "the faster of two"
+    """
+    def __init__(self, mode=CALL_MODE, fetch=fetch_external_profile):
+        if mode not in ("fixed", "adaptive", "hedged"):
+            raise ValueError(f"Unknown call mode: {mode!r}")
+        self.mode = mode
+        self.fetch = fetch
+        self.window = LatencyWindow()
+        self.budget = RetryBudget()
+
+        # Counters for monitoring
+        self.calls = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.timeouts = 0  # Calls that ran out of time
+        self.errors = 0    # Calls that failed in time (error status, connect error, ...)
+
+    def timeout(self) -> float:
+        """Timeout for the next call, in seconds."""
+        if self.mode == "fixed":
+            return REQUEST_TIMEOUT_SECONDS
+        if len(self.window) < MIN_SAMPLES:
+            return MAX_TIMEOUT_SECONDS  # Not enough data: don't censor the samples we're collecting
+        return min(max(self.window.percentile(TIMEOUT_PERCENTILE), MIN_TIMEOUT_SECONDS), MAX_TIMEOUT_SECONDS)
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None if hedging is off."""
+        if self.mode != "hedged" or len(self.window) < MIN_SAMPLES:
+            return None
+        return self.window.percentile(HEDGE_PERCENTILE)
+
+    async def _attempt(self, user_id, timeout, number):
+        """One call with its own timeout; records its latency."""
+        start = time.monotonic()
+        try:
+            # httpx enforces the timeout per phase (connect, read, ...);
+            # call() enforces the overall deadline and cancels what's left
+            data = await self.fetch(user_id, timeout)
+        except httpx.TimeoutException:
+            # A hedge only gets what's left of the deadline, so its timeout
+            # says nothing about the dependency's latency
+            if number == 1:
+                self.window.record(timeout * TIMEOUT_PENALTY)
+            raise httpx.ReadTimeout(f"Attempt {number} timed out after {timeout:.3f}s")
+        self.window.record(time.monotonic() - start)
+        return data, number
+
+    async def call(self, user_id: int):
+        """
+        Fetch a profile within the current timeout.
+
+        Returns: (data, winning attempt number: 1 = first, 2 = hedge)
+        Raises: httpx.HTTPError if no attempt succeeds in time (timeout,
+                network error or error status; the caller falls back)
+        """
+        self.calls += 1
+        self.budget.deposit()
+        timeout = self.timeout()
+        deadline = time.monotonic() + timeout
+        tasks = {asyncio.create_task(self._attempt(user_id, timeout, 1))}
+
+        try:
+            hedge_after = self.hedge_delay()
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done and self.budget.try_spend():
+                    self.hedges_sent += 1
+                    remaining = deadline - time.monotonic()
+                    tasks.add(asyncio.create_task(self._attempt(user_id, remaining, 2)))
+
+            error = None
+            timed_out = False
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    timed_out = True
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        data, number = task.result()
+                        if number == 2:
+                            self.hedges_won += 1
+                        return data, number
+                    error = task.exception()
+
+            if timed_out or isinstance(error, httpx.TimeoutException):
+                self.timeouts += 1
+            else:
+                self.errors += 1
+            raise error or httpx.ReadTimeout(f"No attempt finished within {timeout:.3f}s")
+        finally:
+            # Losers and attempts past the deadline: cancel them, and retrieve
+            # their result so one that just finished doesn't log a warning
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(_discard_result)
+
+    def stats(self) -> dict:
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "mode": self.mode,
+            "calls": self.calls,
+            "samples": len(self.window),
+            "p50_ms": ms(self.window.percentile(0.50)),
+            "p95_ms": ms(self.window.percentile(0.95)),
+            "p99_ms": ms(self.window.percentile(0.99)),
+            "timeout_ms": ms(self.timeout()),
+            "hedge_after_ms": ms(self.hedge_delay()),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "hedges_denied_by_budget": self.budget.denied,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
@@ -0,0 +1,181 @@
+import bisect
+import contextvars
+import os
+import time
+
+# Prometheus histogram bucket bounds (seconds), from 100 µs to 10 s
+BUCKET_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_BUCKET_LABELS = tuple(repr(bound) for bound in BUCKET_BOUNDS) + ("+Inf",)
+_bucket_index = bisect.bisect_left
+
+# Phases, in the order they appear in the Server-Timing header:
+# - queue:     request received -> handler started (routing, body parsing, validation)
+# - connect:   opening connections to the external service (0 when reused)
+# - wait:      waiting for the external service / profile cache, minus connect
+# - fallback:  building fallback data
+# - serialize: handler returned -> response headers sent (JSON encoding)
+# - total:     request received -> response headers sent
+PHASES = ("queue", "connect", "wait", "fallback", "serialize", "total")
+
+# Set SERVER_TIMING_HEADER=0 to skip the header (the /metrics histograms stay):
+# e.g. when nothing reads it, or to keep timings from reaching clients
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1") != "0"
+
+# One preformatted bytes template per phase: a single %-format per phase,
+# no f-string + str.join + encode on every request
+_HEADER_TEMPLATES = {phase: f"{phase};dur=%.3f".encode() for phase in PHASES}
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+class RequestTimings:
+    """
+    Phase durations (seconds) for one request; the handler and the HTTP
+    client add to it through record_phase() and the handler_* marks.
+    """
+    __slots__ = ("started", "handler_started", "handler_finished", "phases")
+
+    def __init__(self, started):
+        self.started = started
+        self.handler_started = None
+        self.handler_finished = None
+        self.phases = {}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+def record_phase(phase: str, seconds: float):
+    """Add time to a phase of the current request (no-op outside a request)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+def handler_started():
+    timings = _current.get()
+    if timings is not None:
+        timings.handler_started = time.perf_counter()
+
+def handler_finished():
+    timings = _current.get()
+    if timings is not None:
+        timings.handler_finished = time.perf_counter()
+
+class PhaseHistogram:
+    """
+    Cumulative-bucket histogram for one (route, phase), Prometheus style.
+
+    Only touched from the event loop thread (no awaits between reads and
+    writes), so updates need no lock. The observation count is the sum of
+    the buckets, computed when rendering rather than kept per request.
+    """
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # Last one: above every bound (+Inf)
+        self.sum = 0.0
+
+class TimingMetrics:
+    """
+    Phase histograms for every route, rendered as Prometheus text.
+    """
+    def __init__(self):
+        self.histograms = {}  # route -> {phase: PhaseHistogram}
+
+    def record(self, route: str, phases: list):
+        # Hot path (every request): the histogram update is inlined
+        routes = self.histograms.get(route)
+        if routes is None:
+            routes = self.histograms[route] = {}
+        for phase, seconds in phases:
+            histogram = routes.get(phase)
+            if histogram is None:
+                histogram = routes[phase] = PhaseHistogram()
+            histogram.counts[_bucket_index(BUCKET_BOUNDS, seconds)] += 1
+            histogram.sum += seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP request_phase_seconds Time spent per request phase",
+            "# TYPE request_phase_seconds histogram",
+        ]
+        for route, phase, histogram in sorted(
+            (route, phase, histogram) for route, phases in self.histograms.items() for phase, histogram in phases.items()
+        ):
+            labels = f'route="{route}",phase="{phase}"'
+            cumulative = 0
+            for label, count in zip(_BUCKET_LABELS, histogram.counts):
+                cumulative += count
+                lines.append(f'request_phase_seconds_bucket{{{labels},le="{label}"}} {cumulative}')
+            lines.append(f"request_phase_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"request_phase_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+timing_metrics = TimingMetrics()
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware: per-request phase timings in a Server-Timing
+    header, aggregated into timing_metrics.
+
+    How it works:
+    - A RequestTimings object is put in a context variable for the request;
+      the handler marks its start/end, the HTTP client adds connect time
+    - When the response headers go out, queue / serialize / total are
+      derived from those marks and the Server-Timing header is appended
+    - The phases are recorded in the histograms under the route template
+      (/profile/{user_id}, not /profile/42), so label count stays bounded
+
+    Why it matters:
+    - One total_latency_ms can't tell "the dependency was slow" from
+      "we were slow"; browsers' dev tools and most APMs show Server-Timing
+    - Pure ASGI instead of BaseHTTPMiddleware: no extra task or response
+      wrapping per request, so the overhead stays in microseconds
+    """
+    def __init__(self, app, metrics: TimingMetrics = None, header: bool = SERVER_TIMING_HEADER):
+        self.app = app
+        self.metrics = metrics or timing_metrics
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings(time.perf_counter())
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                phases = _finish(timings, time.perf_counter())
+                if self.header:
+                    header = b", ".join([_HEADER_TEMPLATES[phase] % (seconds * 1000) for phase, seconds in phases])
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", header)]
+                route = scope.get("route")
+                self.metrics.record(route.path if route is not None else "unmatched", phases)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+def _finish(timings: RequestTimings, now: float) -> list:
+    """[(phase, seconds), ...] for every phase the request went through, in PHASES order."""
+    phases = []
+    if timings.handler_started is not None:
+        phases.append(("queue", timings.handler_started - timings.started))
+    recorded = timings.phases
+    if recorded:
+        connect = recorded.get("connect")
+        if connect is not None:
+            phases.append(("connect", connect))
+        external = recorded.get("external")
+        if external is not None:
+            # Connection setup happens inside the external call; report it once
+            phases.append(("wait", max(external - (connect or 0.0), 0.0)))
+        fallback = recorded.get("fallback")
+        if fallback is not None:
+            phases.append(("fallback", fallback))
+    if timings.handler_finished is not None:
+        phases.append(("serialize", now - timings.handler_finished))
+    phases.append(("total", now - timings.started))
+    return phases
@@ -2,13 +2,17 @@ import time  # Provides access to system time utilities
 
 def now_ms() -> float:
     """
-    Return the current time in milliseconds.
+    Return a monotonic timestamp in milliseconds.
 
     Useful for:
     - Measuring latency
     - Benchmarking performance
-    - Logging timestamps with higher precision than seconds
+
+    Only the difference between two readings means anything: the value
+    is not a wall-clock time and can't be used as a log timestamp.
     """
-    # time.time() returns the current time in seconds since the Unix epoch
+    # time.perf_counter() is monotonic (never jumps when NTP or an admin
+    # changes the system clock, unlike time.time()) and has the highest
+    # available resolution
     # Multiply by 1000 to convert seconds → milliseconds
-    return time.time() * 1000
+    return time.perf_counter() * 1000
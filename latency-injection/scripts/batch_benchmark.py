@@ -0,0 +1,91 @@
+# -------------------------------------------
+# Benchmark: N sequential GET /profile calls vs one POST /profiles batch
+# -------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+STUB_PORT = 8103
+APP_PORT = 8104
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+APP_URL = f"http://127.0.0.1:{APP_PORT}"
+BATCH_SIZES = (10, 50)
+
+# Shorter than the stub's default 0.5-2.0 s so the sequential runs finish quickly
+STUB_DELAY_MIN = "0.05"
+STUB_DELAY_MAX = "0.2"
+
+def start_server(module, port, env, probe):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    for _ in range(100):
+        try:
+            httpx.get(probe, timeout=5.0)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{module} did not start")
+
+def sequential(client, user_ids):
+    """The aggregator page today: one GET per user, one after another."""
+    start = time.perf_counter()
+    for user_id in user_ids:
+        client.get(f"/profile/{user_id}").raise_for_status()
+    return time.perf_counter() - start
+
+def batch(client, user_ids):
+    """
+    One POST /profiles, reading NDJSON lines as they arrive.
+    Returns (time to first profile, total time, source counts).
+    """
+    start = time.perf_counter()
+    first = None
+    sources = {}
+    with client.stream("POST", "/profiles", json=user_ids) as response:
+        response.raise_for_status()
+        for raw in response.iter_lines():
+            if not raw:
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+            source = json.loads(raw)["source_used"]
+            sources[source] = sources.get(source, 0) + 1
+    return first, time.perf_counter() - start, sources
+
+def run_benchmark():
+    stub = start_server(
+        "app.external:app", STUB_PORT,
+        {"EXTERNAL_DELAY_MIN": STUB_DELAY_MIN, "EXTERNAL_DELAY_MAX": STUB_DELAY_MAX},
+        f"{STUB_URL}/external/profile/0",
+    )
+    # Cache off, so every user really goes to the dependency
+    app = start_server(
+        "app.main:app", APP_PORT,
+        {"EXTERNAL_BASE_URL": STUB_URL, "PROFILE_CACHE_TTL": "0", "PROFILE_CACHE_STALE_TTL": "0"},
+        f"{APP_URL}/client/stats",
+    )
+    try:
+        with httpx.Client(base_url=APP_URL, timeout=30.0) as client:
+            print(f"Stub delay {STUB_DELAY_MIN}-{STUB_DELAY_MAX} s per profile\n")
+            for size in BATCH_SIZES:
+                user_ids = list(range(1, size + 1))
+                seq = sequential(client, user_ids)
+                first, total, sources = batch(client, user_ids)
+                print(f"{size} users:")
+                print(f"  sequential GETs  {seq * 1000:8.1f} ms")
+                print(f"  POST /profiles   {total * 1000:8.1f} ms total, first profile after {first * 1000:.1f} ms   {sources}")
+                print(f"  {seq / total:.1f}x faster\n")
+    finally:
+        for server in (app, stub):
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    run_benchmark()
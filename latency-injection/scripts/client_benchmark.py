@@ -0,0 +1,90 @@
+# -------------------------------------------
+# Benchmark: new httpx client per call vs one shared pooled client
+# -------------------------------------------
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from app import client as shared
+
+STUB_PORT = 8101
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+REQUESTS = 500
+CONCURRENCY = 20
+
+def start_stub():
+    """
+    Run the external.py stub with no injected delay, so the numbers
+    show client-side overhead (connection setup) rather than the stub's sleep.
+    """
+    env = {**os.environ, "EXTERNAL_DELAY_MIN": "0", "EXTERNAL_DELAY_MAX": "0"}
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.external:app", "--port", str(STUB_PORT), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{STUB_URL}/external/profile/0")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("external stub did not start")
+
+async def per_call_client(user_id):
+    """The old behavior: a brand-new client (and connection) per call."""
+    async with httpx.AsyncClient(timeout=httpx.Timeout(1.0)) as client:
+        response = await client.get(f"{STUB_URL}/external/profile/{user_id}")
+        response.raise_for_status()
+        return response.json()
+
+async def measure(fetch, concurrency):
+    """
+    REQUESTS calls with `concurrency` in flight at once.
+    Returns per-request latencies in ms.
+    """
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_id):
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(user_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    return sorted(latencies)
+
+def report(label, latencies):
+    print(f"  {label:<14} mean {statistics.mean(latencies):6.2f} ms   p50 {latencies[len(latencies) // 2]:6.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:6.2f} ms")
+    return statistics.mean(latencies)
+
+async def run_benchmark():
+    await shared.start_client(STUB_URL)
+    try:
+        for concurrency in (1, CONCURRENCY):
+            print(f"{REQUESTS} requests, {concurrency} in flight:")
+            await measure(shared.fetch_external_profile, concurrency)  # Warm up both paths
+            before = report("new client", await measure(per_call_client, concurrency))
+            after = report("shared client", await measure(shared.fetch_external_profile, concurrency))
+            print(f"  saved {before - after:.2f} ms per request\n")
+
+        stats = shared.metrics.snapshot()
+        print(f"Shared client: {stats['requests']} requests over {stats['connections_opened']} connections "
+              f"(reuse {stats['connection_reuse_ratio']:.1%}), avg connect {stats['avg_connect_ms']} ms, "
+              f"peak pool utilization {stats['peak_pool_utilization']:.0%}")
+    finally:
+        await shared.close_client()
+
+if __name__ == "__main__":
+    stub = start_stub()
+    try:
+        asyncio.run(run_benchmark())
+    finally:
+        stub.terminate()
+        stub.wait()
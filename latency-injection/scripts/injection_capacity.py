@@ -0,0 +1,53 @@
+# -------------------------------------------
+# Capacity check: how many slow responses can the stub hold in flight?
+# -------------------------------------------
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+STUB_PORT = 8105
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+IN_FLIGHT = 2000
+DELAY_SECONDS = 1.0
+OLD_THREADPOOL = 40  # Worker threads a sync handler with time.sleep had
+
+def start_stub():
+    env = {**os.environ, "EXTERNAL_DELAY_MIN": str(DELAY_SECONDS), "EXTERNAL_DELAY_MAX": str(DELAY_SECONDS)}
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.external:app", "--port", str(STUB_PORT),
+         "--log-level", "warning", "--backlog", str(IN_FLIGHT * 2)],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{STUB_URL}/admin/injection")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("external stub did not start")
+
+async def run_check():
+    limits = httpx.Limits(max_connections=IN_FLIGHT, max_keepalive_connections=IN_FLIGHT)
+    async with httpx.AsyncClient(base_url=STUB_URL, limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(f"/external/profile/{i}") for i in range(IN_FLIGHT)))
+        elapsed = time.perf_counter() - start
+        counters = (await client.get("/admin/injection")).json()["counters"]["profile"]
+
+    ok = sum(response.status_code == 200 for response in responses)
+    print(f"{IN_FLIGHT} concurrent calls, {DELAY_SECONDS:.1f} s injected delay each:")
+    print(f"  finished in {elapsed:.2f} s, {ok} OK, peak in flight {counters['peak_in_flight']}")
+    print(f"  a {OLD_THREADPOOL}-thread stub needs at least {IN_FLIGHT / OLD_THREADPOOL * DELAY_SECONDS:.0f} s for the same calls")
+
+if __name__ == "__main__":
+    stub = start_stub()
+    try:
+        asyncio.run(run_check())
+    finally:
+        stub.terminate()
+        stub.wait()
@@ -0,0 +1,205 @@
+# -------------------------------------------
+# Open-loop load generator: GET /profile/{user_id} at a fixed rate,
+# latency SLO report (HDR-style histograms) as JSON and text
+# -------------------------------------------
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import httpx
+from app.histogram import REPORT_PERCENTILES, LatencyHistogram
+
+STUB_PORT = 8106
+APP_PORT = 8107
+STARTUP_TIMEOUT_SECONDS = 30
+
+def start_server(module, port, env, probe):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}{probe}")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{module} did not start on port {port}")
+
+def schedule(rps, seconds, users, seed):
+    """
+    The whole run, decided up front: (send offset in seconds, user_id) per request.
+    The same arguments always give the same requests at the same offsets.
+    """
+    rng = random.Random(seed)
+    return [(i / rps, rng.randrange(1, users + 1)) for i in range(int(rps * seconds))]
+
+async def run_load(base_url, plan, warmup_requests):
+    """
+    Send every request at its planned time, whether or not earlier ones
+    have finished (open loop).
+
+    Two latencies per request:
+    - corrected:   from the planned send time. If the generator or the
+                   connection pool falls behind, that delay counts, as it
+                   would for a real user who clicked at the planned time
+                   (this is the coordinated-omission correction)
+    - uncorrected: from the actual send. What a closed-loop tool reports;
+                   it hides stalls because it stops sending during them
+
+    Failed requests (transport errors, non-2xx, or a body without
+    source_used) count in both histograms too: a user waited for them
+    just the same. Their corrected latency is also kept apart (error_latency),
+    so fast failures can't pass for a fast service.
+    """
+    corrected = LatencyHistogram()
+    uncorrected = LatencyHistogram()
+    error_latency = LatencyHistogram()
+    sources = {}
+    errors = 0
+    max_send_lag = 0.0
+    finished = []
+
+    limits = httpx.Limits(max_connections=10_000, max_keepalive_connections=1_000)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+
+        async def fire(i, planned, user_id):
+            nonlocal errors
+            sent = time.perf_counter()
+            try:
+                response = await client.get(f"/profile/{user_id}")
+                response.raise_for_status()
+                source = response.json()["source_used"]
+            except (httpx.HTTPError, ValueError, KeyError, TypeError):
+                # ValueError: body isn't JSON; KeyError / TypeError: no source_used in it
+                source = None
+            done = time.perf_counter()
+            if i < warmup_requests:
+                return
+            finished.append(done)
+            corrected.record(done - planned)
+            uncorrected.record(done - sent)
+            if source is None:
+                errors += 1
+                error_latency.record(done - planned)
+                return
+            sources[source] = sources.get(source, 0) + 1
+
+        tasks = []
+        start = time.perf_counter()
+        for i, (offset, user_id) in enumerate(plan):
+            planned = start + offset
+            delay = planned - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            max_send_lag = max(max_send_lag, time.perf_counter() - planned)
+            tasks.append(asyncio.create_task(fire(i, planned, user_id)))
+        await asyncio.gather(*tasks)
+
+    measured_start = start + (plan[warmup_requests][0] if warmup_requests < len(plan) else 0)
+    elapsed = max(finished) - measured_start if finished else 0.0
+    throughput = len(finished) / elapsed if elapsed else 0.0
+    return corrected, uncorrected, error_latency, sources, errors, throughput, max_send_lag
+
+def build_report(args, corrected, uncorrected, error_latency, sources, errors, throughput, max_send_lag):
+    measured = sum(sources.values()) + errors
+    return {
+        "config": {
+            "rps": args.rps,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "users": args.users,
+            "seed": args.seed,
+            "stub_profile": json.loads(args.stub_profile) if args.stub_profile else None,
+            "target": args.url or "local app + stub",
+        },
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "requests": measured,
+        "throughput_rps": round(throughput, 2),
+        "max_send_lag_ms": round(max_send_lag * 1000, 2),
+        "errors": errors,
+        "sources": sources,
+        "fallback_rate": round(sources.get("fallback", 0) / measured, 4) if measured else 0.0,
+        "latency_ms": {
+            "corrected": {**corrected.summary(), "histogram": corrected.buckets()},
+            "uncorrected": uncorrected.summary(),
+            "errors": error_latency.summary(),
+        },
+    }
+
+def format_report(report) -> str:
+    config = report["config"]
+    corrected = report["latency_ms"]["corrected"]
+    uncorrected = report["latency_ms"]["uncorrected"]
+    error_latency = report["latency_ms"]["errors"]
+    lines = [
+        f"GET /profile at {config['rps']} req/s for {config['duration_seconds']} s "
+        f"(seed {config['seed']}, {config['users']} users, target: {config['target']})",
+        f"requests {report['requests']}   throughput {report['throughput_rps']} req/s   "
+        f"errors {report['errors']}   fallback rate {report['fallback_rate']:.2%}   "
+        f"max send lag {report['max_send_lag_ms']} ms",
+        f"sources {report['sources']}",
+        "",
+        f"{'percentile':>10} {'corrected ms':>14} {'uncorrected ms':>15}",
+    ]
+    for p in REPORT_PERCENTILES:
+        key = f"p{p:g}_ms"
+        lines.append(f"{'p' + format(p, 'g'):>10} {corrected.get(key) or 0:>14.2f} {uncorrected.get(key) or 0:>15.2f}")
+    lines.append(f"{'max':>10} {corrected.get('max_ms', 0):>14.2f} {uncorrected.get('max_ms', 0):>15.2f}")
+    if error_latency["count"]:
+        lines.append(
+            f"errors (corrected ms): p50 {error_latency['p50_ms']:.2f}   "
+            f"p99 {error_latency['p99_ms']:.2f}   max {error_latency['max_ms']:.2f}"
+        )
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of GET /profile/{user_id}")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds (after warm-up)")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1, help="Same seed = same send schedule and user ids (latencies still vary run to run)")
+    parser.add_argument("--stub-profile", default=None,
+                        help='Stub latency profile as JSON, e.g. \'{"distribution": "lognormal", "median_seconds": 0.1}\'')
+    parser.add_argument("--url", default=None, help="Load an already running API instead of starting app + stub")
+    parser.add_argument("--output", default="load_report", help="Writes <output>.json and <output>.txt")
+    args = parser.parse_args()
+
+    servers = []
+    base_url = args.url
+    if base_url is None:
+        stub_env = {"EXTERNAL_SEED": str(args.seed)}
+        if args.stub_profile:
+            stub_env["EXTERNAL_LATENCY_PROFILE"] = args.stub_profile
+        servers.append(start_server("app.external:app", STUB_PORT, stub_env, "/admin/injection"))
+        servers.append(start_server("app.main:app", APP_PORT, {"EXTERNAL_BASE_URL": f"http://127.0.0.1:{STUB_PORT}"}, "/client/stats"))
+        base_url = f"http://127.0.0.1:{APP_PORT}"
+
+    try:
+        plan = schedule(args.rps, args.warmup + args.duration, args.users, args.seed)
+        results = asyncio.run(run_load(base_url, plan, int(args.rps * args.warmup)))
+    finally:
+        for server in reversed(servers):
+            server.terminate()
+            server.wait()
+
+    report = build_report(args, *results)
+    text = format_report(report)
+    with open(f"{args.output}.json", "w") as out:
+        json.dump(report, out, indent=2)
+    with open(f"{args.output}.txt", "w") as out:
+        out.write(text)
+    print(text)
+    print(f"Wrote {args.output}.json and {args.output}.txt")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# -------------------------------------------
+# Simulation: fixed timeout vs adaptive timeout vs adaptive + hedging
+# against the external.py stub, with its default uniform 0.5-2.0 s delay
+# and with a long-tailed one
+# -------------------------------------------
+
+import asyncio
+import subprocess
+import sys
+import time
+import httpx
+from app import client as shared
+from app.tail_latency import MIN_SAMPLES, TailLatencyController
+
+STUB_PORT = 8102
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+WARMUP_CALLS = MIN_SAMPLES * 2  # Fill the latency window before measuring
+CALLS = 300
+CONCURRENCY = 20
+MODES = ("fixed", "adaptive", "hedged")
+
+# Stub latency profiles (PUT /admin/injection/profile); None = stub default
+SCENARIOS = {
+    "uniform 0.5-2.0 s": None,
+    "long tail (lognormal, median 0.1 s)": {"distribution": "lognormal", "median_seconds": 0.1, "sigma": 1.0},
+}
+
+def start_stub():
+    """
+    Run the external.py stub; each scenario sets its latency profile.
+    """
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.external:app", "--port", str(STUB_PORT), "--log-level", "warning"],
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{STUB_URL}/admin/injection")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("external stub did not start")
+
+async def run_calls(controller, calls):
+    """
+    `calls` profile fetches, CONCURRENCY at a time, like get_profile does them.
+    Returns (latencies in ms, number of fallbacks).
+    """
+    latencies = []
+    fallbacks = 0
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(user_id):
+        nonlocal fallbacks
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await controller.call(user_id)
+            except httpx.HTTPError:
+                fallbacks += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return sorted(latencies), fallbacks
+
+async def run_scenario():
+    for mode in MODES:
+        controller = TailLatencyController(mode)
+        await run_calls(controller, WARMUP_CALLS)
+        warm = controller.stats()
+
+        latencies, fallbacks = await run_calls(controller, CALLS)
+        stats = controller.stats()
+        hedges = stats["hedges_sent"] - warm["hedges_sent"]
+        won = stats["hedges_won"] - warm["hedges_won"]
+        print(
+            f"  {mode:<9} fallback {fallbacks / CALLS:6.1%}   "
+            f"p50 {latencies[len(latencies) // 2]:7.1f} ms   p99 {latencies[int(len(latencies) * 0.99)]:7.1f} ms   "
+            f"timeout {stats['timeout_ms']} ms   extra attempts {hedges / CALLS:5.1%} (hedges won {won})"
+        )
+
+async def run_simulation():
+    await shared.start_client(STUB_URL)
+    try:
+        print(f"{CALLS} calls per mode, {CONCURRENCY} in flight, after {WARMUP_CALLS} warm-up calls")
+        for name, profile in SCENARIOS.items():
+            admin = shared.get_client()
+            if profile is None:
+                await admin.delete("/admin/injection/profile")
+            else:
+                (await admin.put("/admin/injection/profile", json=profile)).raise_for_status()
+            print(f"\nStub latency: {name}")
+            await run_scenario()
+    finally:
+        await shared.close_client()
+
+if __name__ == "__main__":
+    stub = start_stub()
+    try:
+        asyncio.run(run_simulation())
+    finally:
+        stub.terminate()
+        stub.wait()
@@ -0,0 +1,112 @@
+# -------------------------------------------
+# Benchmark: lazy vs joinedload vs selectinload vs Core
+# for GET /users/{user_id}/orders on the seeded 2000 x 10 x 5 dataset
+# -------------------------------------------
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+from main import LOADERS
+from models import Base, Order, OrderItem, User
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test.db")
+SAMPLE_USERS = 200  # Random users per mode (same users for every mode)
+SEED = 42
+
+def open_copy(directory, with_indexes):
+    """
+    Work on a copy of test.db, so the benchmark never changes the seeded file.
+
+    The committed test.db was created before models.py declared the
+    user_id / order_id indexes (create_all doesn't add indexes to existing
+    tables), so they're created on the copy unless asked not to.
+    """
+    path = os.path.join(directory, "bench.db")
+    shutil.copyfile(SOURCE_DB, path)
+    engine = create_engine(f"sqlite:///{path}")
+    if with_indexes:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+    return engine
+
+def count_queries(engine):
+    """A one-element list that counts every statement sent to the database."""
+    counter = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*args):
+        counter[0] += 1
+
+    return counter
+
+def check_dataset(engine):
+    with engine.connect() as conn:
+        counts = [conn.execute(select(func.count()).select_from(model)).scalar() for model in (User, Order, OrderItem)]
+    if counts[0] == 0:
+        raise SystemExit("test.db is empty: run `python create_tables.py && python seed.py` first")
+    return counts
+
+def run_mode(Session, counter, loader, user_ids):
+    """
+    One request per user (fresh session each, like the endpoint).
+    Returns (queries per request, latencies in ms, peak memory per request in KB).
+
+    Memory is measured in a second pass: tracemalloc slows Python down,
+    so it would distort the latencies.
+    """
+    latencies, peaks = [], []
+    counter[0] = 0
+    for user_id in user_ids:
+        start = time.perf_counter()
+        with Session() as db:
+            loader(db, user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    queries = counter[0] / len(user_ids)
+
+    for user_id in user_ids:
+        tracemalloc.start()
+        with Session() as db:
+            loader(db, user_id)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return queries, sorted(latencies), peaks
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ways to load a user's orders and items")
+    parser.add_argument("--without-indexes", action="store_true", help="Run on test.db exactly as committed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = open_copy(directory, with_indexes=not args.without_indexes)
+        users, orders, items = check_dataset(engine)
+        counter = count_queries(engine)
+        Session = sessionmaker(bind=engine)
+        user_ids = random.Random(SEED).sample(range(1, users + 1), min(SAMPLE_USERS, users))
+
+        print(f"{users} users, {orders} orders, {items} items; {len(user_ids)} requests per mode, "
+              f"{'without' if args.without_indexes else 'with'} foreign-key indexes\n")
+        print(f"{'mode':<9} {'queries/req':>11} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'peak KB/req':>12}")
+
+        # Warm up SQLite's page cache and SQLAlchemy's statement cache
+        with Session() as db:
+            for loader in LOADERS.values():
+                loader(db, user_ids[0])
+
+        for mode, loader in LOADERS.items():
+            queries, latencies, peaks = run_mode(Session, counter, loader, user_ids)
+            print(f"{mode:<9} {queries:>11.1f} {statistics.mean(latencies):>9.2f} "
+                  f"{latencies[len(latencies) // 2]:>8.2f} {latencies[int(len(latencies) * 0.95)]:>8.2f} "
+                  f"{statistics.mean(peaks):>12.1f}")
+
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
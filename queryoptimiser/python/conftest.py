@@ -0,0 +1,2 @@
+# Enables the max_queries fixture (query_count_plugin.py) for the tests here
+pytest_plugins = ["query_count_plugin"]
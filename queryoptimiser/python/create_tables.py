@@ -2,4 +2,11 @@ from database import engine
 from models import Base
 
 Base.metadata.create_all(bind=engine)
+
+# create_all skips tables that already exist, including their indexes:
+# add any index declared in models.py that an older database is missing
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 print("Tables created")
@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine           # Import function to create a DB engine
 from sqlalchemy.orm import sessionmaker, declarative_base  # Import ORM session maker and base class for models
+from instrumentation import instrument  # Query-count / slow-query listeners
 
 # URL for the database connection
 # "sqlite:///./test.db" means:
@@ -16,6 +17,10 @@ engine = create_engine(
     connect_args={"check_same_thread": False}
 )
 
+# Count statements per request, log slow ones with their query plan
+# and flag likely N+1 patterns (see instrumentation.py)
+instrument(engine)
+
 # Create a "SessionLocal" class
 # This is a factory for session objects that will interact with the DB
 # You use sessions to query, add, update, or delete rows
@@ -0,0 +1,187 @@
+import contextvars  # Per-request stats that follow the request into FastAPI's threadpool
+import logging
+import os
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Share of requests that are instrumented: 1.0 in development,
+# e.g. QUERY_STATS_SAMPLE_RATE=0.05 to leave it on in production
+SAMPLE_RATE = float(os.environ.get("QUERY_STATS_SAMPLE_RATE", "1.0"))
+
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "50"))
+
+# The same statement shape this many times in one request = likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Query-plan prefix per dialect (plain EXPLAIN doesn't run the statement)
+EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN "}
+
+# Columns of the EXPLAIN output that make up the plan, per dialect
+# (MySQL returns one row per table with the access path spread over several columns)
+PLAN_COLUMNS = {
+    "sqlite": ("detail",),
+    "postgresql": ("QUERY PLAN",),
+    "mysql": ("table", "type", "key", "rows", "Extra"),
+}
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+class QueryStats:
+    """
+    Statements run during one request.
+
+    - count / seconds: how many statements and how long they took
+    - shapes: statement text -> times run. SQLAlchemy sends parameterized
+      SQL ("... WHERE ? = order_items.order_id"), so the lazy load of
+      every order has the same text, whatever order id it is for
+    - slow: (ms, statement, query plan) for statements over SLOW_QUERY_MS
+    """
+    __slots__ = ("count", "seconds", "shapes", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.slow = []
+
+    def n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict:
+        """Statement shapes repeated at least `threshold` times."""
+        return {shape: times for shape, times in self.shapes.items() if times >= threshold}
+
+@contextmanager
+def track_queries():
+    """
+    Collect QueryStats for the code inside the block (the middleware does
+    this per request; also handy in scripts and tests).
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+def _plan_lines(plan_cursor, dialect):
+    names = [column[0] for column in plan_cursor.description]
+    wanted = [names.index(name) for name in PLAN_COLUMNS[dialect] if name in names]
+    lines = []
+    for row in plan_cursor.fetchall():
+        if len(wanted) == 1:
+            lines.append(str(row[wanted[0]]))
+        else:
+            lines.append(" ".join(f"{names[i]}={row[i]}" for i in wanted if row[i] is not None))
+    return lines
+
+def _explain(cursor, dialect, statement, parameters):
+    """
+    Query plan of a statement, on a separate raw cursor (so it doesn't re-enter the listeners).
+
+    The cursor shares the request's connection and transaction. Outside
+    SQLite, a failed statement there aborts the transaction (PostgreSQL),
+    so the EXPLAIN runs inside a SAVEPOINT that is rolled back on error.
+    """
+    prefix = EXPLAIN_PREFIX.get(dialect)
+    if prefix is None:
+        return None
+    savepoint = dialect != "sqlite"
+    plan_cursor = cursor.connection.cursor()
+    try:
+        if savepoint:
+            plan_cursor.execute("SAVEPOINT query_plan")
+        try:
+            plan_cursor.execute(prefix + statement, parameters)
+            lines = _plan_lines(plan_cursor, dialect)
+        except Exception:
+            if savepoint:
+                plan_cursor.execute("ROLLBACK TO SAVEPOINT query_plan")
+            raise
+        if savepoint:
+            plan_cursor.execute("RELEASE SAVEPOINT query_plan")
+        return lines
+    except Exception as exc:  # A plan is nice to have; never fail the request over it
+        return [f"EXPLAIN failed: {exc}"]
+    finally:
+        plan_cursor.close()
+
+def instrument(engine):
+    """
+    Attach the statement listeners to an engine (done once, in database.py).
+
+    How it works:
+    - Outside an instrumented request each listener returns after one
+      context-variable lookup, so unsampled requests cost almost nothing
+    - Inside one, every statement's time and text are added to the
+      request's QueryStats; slow ones also get their query plan
+    """
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - context._query_started
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.shapes[statement] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS and not executemany:
+            stats.slow.append((round(elapsed * 1000, 2), statement, _explain(cursor, dialect, statement, parameters)))
+
+    return engine
+
+class QueryStatsMiddleware:
+    """
+    Per-request query stats for a sample of requests.
+
+    How it works:
+    - SAMPLE_RATE of requests run inside track_queries(); the stats object
+      is shared with the endpoint's threadpool thread through the context
+    - Instrumented responses get X-DB-Query-Count, X-DB-Query-Time-Ms and,
+      when a statement shape repeats N_PLUS_ONE_THRESHOLD+ times,
+      X-DB-N-Plus-One (the highest repeat count)
+    - Likely N+1 patterns and slow statements (with their plan) are logged
+      as warnings
+
+    Why it matters:
+    - N+1 regressions show up in headers and logs instead of only in code review
+    """
+    def __init__(self, app, sample_rate: float = None):
+        self.app = app
+        self.sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            return await self.app(scope, receive, send)
+
+        with track_queries() as stats:
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    repeated = stats.n_plus_one()
+                    headers = [
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-query-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                    ]
+                    if repeated:
+                        headers.append((b"x-db-n-plus-one", str(max(repeated.values())).encode()))
+                    message["headers"] = [*message.get("headers", ()), *headers]
+                    _log(scope["path"], stats, repeated)
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+def _log(path, stats, repeated):
+    for shape, times in repeated.items():
+        logger.warning("Likely N+1 on %s: statement ran %d times in one request: %s", path, times, " ".join(shape.split()))
+    for ms, statement, plan in stats.slow:
+        logger.warning("Slow query on %s (%.2f ms): %s | plan: %s", path, ms, " ".join(statement.split()), "; ".join(plan or []))
@@ -1,49 +1,132 @@
 import time  # For measuring how long the query takes
-from fastapi import FastAPI  # FastAPI web framework
+from fastapi import FastAPI, HTTPException  # FastAPI web framework
 from database import SessionLocal  # SQLAlchemy session factory to interact with the DB
-from models import User  # User model (with relationships to Order and OrderItem)
-from sqlalchemy.orm import joinedload  # Used for eager loading to reduce N+1 queries
+from instrumentation import QueryStatsMiddleware  # X-DB-* headers, N+1 and slow-query logs
+from models import User, Order, OrderItem  # ORM models (User -> Order -> OrderItem)
+from sqlalchemy import select  # Core SELECT for the column-projected path
+from sqlalchemy.orm import joinedload, selectinload  # Eager loading strategies to reduce N+1 queries
 
 # Initialize the FastAPI app
 app = FastAPI()
 
-# Define a GET endpoint at /users/{user_id}/orders
-@app.get("/users/{user_id}/orders")
-def get_user_orders_slow(user_id: int):
-    # Record the start time to measure query duration
-    start = time.time()
-    
-    # Create a new SQLAlchemy session (connection to DB)
-    db = SessionLocal()
+# Query count and time per request (sampled: QUERY_STATS_SAMPLE_RATE)
+app.add_middleware(QueryStatsMiddleware)
 
-    # Fetch the user with the given user_id
-    # .options(joinedload(User.orders)) tells SQLAlchemy to eagerly load orders
-    # This reduces the N+1 query problem for the user's orders
-    user = (
-        db.query(User)
-        .options(joinedload(User.orders))
-        .filter(User.id == user_id)
-        .first()
-    )
-    # Note: If user_id doesn't exist, `user` will be None and `user.orders` will fail
-
-    # Build the response JSON
+def _orders_from_user(user):
     # For each order of the user, collect its ID and list of product names
-    result = [
+    # (touching order.items loads them if they aren't loaded yet)
+    return [
         {
             "order_id": order.id,
-            # Access order.items (relationship) and extract product_name for each item
             "items": [item.product_name for item in order.items]
         }
         for order in user.orders
     ]
 
+def load_orders_lazy(db, user_id: int):
+    """Plain ORM access, everything lazy. Returns None if the user doesn't exist."""
+    user = db.query(User).filter(User.id == user_id).first()
+    return _orders_from_user(user) if user is not None else None
+
+def load_orders_joined(db, user_id: int):
+    """
+    The original query: orders are eagerly loaded in the same query,
+    but order.items is still lazy, so each order issues its own query.
+    """
+    user = (
+        db.query(User)
+        .options(joinedload(User.orders))
+        .filter(User.id == user_id)
+        .first()
+    )
+    return _orders_from_user(user) if user is not None else None
+
+def load_orders_selectin(db, user_id: int):
+    """
+    Orders joined as before, plus selectinload for the items: SQLAlchemy
+    collects all order ids and loads every item in ONE extra query
+    (SELECT ... FROM order_items WHERE order_id IN (...)).
+    """
+    user = (
+        db.query(User)
+        .options(joinedload(User.orders).selectinload(Order.items))
+        .filter(User.id == user_id)
+        .first()
+    )
+    return _orders_from_user(user) if user is not None else None
+
+def load_orders_core(db, user_id: int):
+    """
+    No ORM objects at all: select only the columns the response needs and
+    group the rows in one pass.
+
+    - users LEFT JOIN orders LEFT JOIN order_items, so a user without orders
+      still returns one row (and a missing user returns none)
+    - Rows come sorted by order, so a new order starts whenever the id changes
+    """
+    rows = db.execute(
+        select(User.id, Order.id, OrderItem.product_name)
+        .select_from(User)
+        .outerjoin(Order, Order.user_id == User.id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .where(User.id == user_id)
+        .order_by(Order.id, OrderItem.id)
+    ).all()
+    if not rows:
+        return None
+
+    orders = []
+    current_id = None
+    for _, order_id, product_name in rows:
+        if order_id is None:
+            continue  # User without orders
+        if order_id != current_id:
+            current_id = order_id
+            items = []
+            orders.append({"order_id": order_id, "items": items})
+        if product_name is not None:
+            items.append(product_name)
+    return orders
+
+# Ways to load a user's orders and their item names, slowest to fastest:
+# - "lazy":     no eager loading: 1 query for the user, 1 for orders, 1 per order for items
+# - "joined":   joinedload(User.orders), items still lazy: 1 query + 1 per order (N+1)
+# - "selectin": orders joined, items with one extra "WHERE order_id IN (...)" query: 2 queries
+# - "core":     one SELECT of just the 3 needed columns, grouped in a single pass
+LOADERS = {
+    "lazy": load_orders_lazy,
+    "joined": load_orders_joined,
+    "selectin": load_orders_selectin,
+    "core": load_orders_core,
+}
+
+# Define a GET endpoint at /users/{user_id}/orders
+# ?mode=selectin or ?mode=core for the optimized paths (default: the original "joined")
+@app.get("/users/{user_id}/orders")
+def get_user_orders_slow(user_id: int, mode: str = "joined"):
+    if mode not in LOADERS:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(LOADERS)}")
+
+    # Record the start time to measure query duration
+    start = time.time()
+
+    # Create a new SQLAlchemy session (connection to DB)
+    db = SessionLocal()
+    try:
+        # Build the response JSON: each order's ID and list of product names
+        result = LOADERS[mode](db, user_id)
+    finally:
+        db.close()
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
     # Measure how long the query + processing took
     duration = time.time() - start
 
     # Return JSON response with query time and orders
     return {
         "query_time_seconds": duration,
+        "mode": mode,
         "orders": result
     }
-
@@ -0,0 +1,43 @@
+# pytest plugin: fail a test when an endpoint runs more queries than it should
+#
+# Enable it in a conftest.py with:  pytest_plugins = ["query_count_plugin"]
+# or on the command line with:      pytest -p query_count_plugin
+#
+# Usage:
+#     def test_orders_query_count(max_queries):
+#         client = TestClient(app)
+#         with max_queries(1):
+#             client.get("/users/1/orders?mode=core")
+
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from database import engine
+
+@pytest.fixture
+def max_queries():
+    """
+    Context manager that counts every statement on the app's engine inside
+    the block and fails the test if there are more than `limit`.
+
+    Counts on the engine (not per request), so it works with TestClient,
+    whose requests run in another thread.
+    """
+    @contextmanager
+    def assert_max_queries(limit: int):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(" ".join(statement.split()))
+
+        event.listen(engine, "after_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "after_cursor_execute", record)
+
+        if len(statements) > limit:
+            listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(statements, 1))
+            pytest.fail(f"Expected at most {limit} queries, got {len(statements)}:\n{listing}", pytrace=False)
+
+    return assert_max_queries
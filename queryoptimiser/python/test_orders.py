@@ -0,0 +1,20 @@
+# Query budgets for GET /users/{user_id}/orders, per load mode
+# (run from this folder: pytest)
+#
+# mode=joined is left out on purpose: it is the original N+1 query
+# (1 + 1 per order, 11 for user 1 in test.db)
+
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+def test_core_orders_is_one_query(max_queries):
+    with max_queries(1):
+        response = client.get("/users/1/orders?mode=core")
+    assert response.status_code == 200
+
+def test_selectin_orders_is_two_queries(max_queries):
+    with max_queries(2):
+        response = client.get("/users/1/orders?mode=selectin")
+    assert response.status_code == 200
@@ -1,7 +1,21 @@
+import os
 from fastapi import FastAPI, HTTPException
-from db import get_session, engines
+from db import engines, pool_stats, scatter_gather, session_scope, warm_up_pools
 from models import Base, User
-from shard_router import get_shard_id
+from routing_state import RoutingStateFollower
+from id_generator import NODE_BITS, SnowflakeGenerator
+from shard_health import HealthChecker
+from shard_router import (
+    ID_SHARD_BITS,
+    get_read_shard_ids,
+    get_shard_id,
+    hash_ring,
+    health_registry,
+    mark_shard_down,
+    mark_shard_up,
+    ring_version,
+)
+from user_cache import InProcessBackend, UserCache
 
 # Initialize FastAPI application
 app = FastAPI()
@@ -12,6 +26,36 @@ app = FastAPI()
 for engine in engines.values():
     Base.metadata.create_all(bind=engine)
 
+# Pre-open pooled connections on every shard so the first requests
+# after a deploy don't pay connection setup (see POOL_WARMUP_CONNECTIONS)
+warm_up_pools()
+
+# Probe every shard in the background; a shard whose circuit breaker
+# opens is spliced out of the ring, and spliced back in once it recovers
+health_checker = HealthChecker(engines, on_down=mark_shard_down, on_up=mark_shard_up)
+health_checker.start()
+
+# Follow shard registrations and rebalances published by scripts/rebalance.py
+# (routing_state.json), so every app process double-routes while rows move
+routing_follower = RoutingStateFollower(on_new_shard=health_checker.add_shard)
+routing_follower.start()
+
+# Generates user IDs; WORKER_ID must be unique for every app process
+# (e.g. set per container/replica), otherwise two processes may issue the same ID.
+# There is no default: PIDs repeat across hosts and are often 1 in containers
+if "WORKER_ID" not in os.environ:
+    raise RuntimeError(
+        f"Set WORKER_ID to a value unique to this process (0 .. {(1 << (NODE_BITS - ID_SHARD_BITS)) - 1})"
+    )
+id_generator = SnowflakeGenerator(
+    worker_id=int(os.environ["WORKER_ID"]),
+    shard_bits=ID_SHARD_BITS,
+)
+
+# Read-through cache for GET /users/{user_id}
+# Swap InProcessBackend for SharedBackend(redis_client) to share it between processes
+user_cache = UserCache(InProcessBackend(), version_fn=ring_version, read_shards_fn=get_read_shard_ids)
+
 @app.post("/users")
 def create_user(name: str, email: str):
     """
@@ -21,21 +65,29 @@ def create_user(name: str, email: str):
     (not the database) decides where data is stored.
     """
 
-    # Generate a deterministic user_id based on email
-    # This simulates ID generation for demo purposes
-    # In production, IDs usually come from a central ID service or database
-    user_id = abs(hash(email)) % 10_000
+    if ID_SHARD_BITS:
+        # Pick the shard first (spread by email over the healthy ring)
+        # and store it inside the ID, so reads route without hashing
+        shard_id = hash_ring.get_shard(email)
+        user_id = id_generator.next_id(shard_id=shard_id)
+    else:
+        # Generate a unique, time-ordered 64-bit ID (see id_generator.py)
+        # Unlike hash(email), it is stable across processes and never collides
+        user_id = id_generator.next_id()
 
-    # Determine which shard this user belongs to
-    shard_id = get_shard_id(user_id)
+        # Determine which shard this user belongs to
+        shard_id = get_shard_id(user_id)
 
     # Open a database session for the chosen shard
-    db = get_session(shard_id)
+    # The session is closed (and its connection returned) on exit
+    with session_scope(shard_id) as db:
+        # Create and persist the user on the selected shard
+        user = User(id=user_id, name=name, email=email)
+        db.add(user)
+        db.commit()
 
-    # Create and persist the user on the selected shard
-    user = User(id=user_id, name=name, email=email)
-    db.add(user)
-    db.commit()
+    # Drop any cached copy so the next read sees this write
+    user_cache.invalidate(user_id)
 
     return {
         "message": "User created successfully",
@@ -43,6 +95,44 @@ def create_user(name: str, email: str):
         "shard": shard_id
     }
 
+@app.get("/users/search")
+def search_users(name: str, limit: int = 50):
+    """
+    Search users by name across every shard.
+
+    A name is not the shard key, so the query has to be scattered to
+    all shards and the matches gathered and merged.
+    Shards that are down or too slow are skipped and reported,
+    so the caller still gets the matches from the healthy shards.
+
+    Note: declared before /users/{user_id} so "search" is not parsed as an ID.
+    """
+
+    def find_matches(db):
+        # Convert rows to dicts before the session closes
+        rows = (
+            db.query(User)
+            .filter(User.name.ilike(f"%{name}%"))
+            .order_by(User.id)
+            .limit(limit)
+            .all()
+        )
+        return [{"id": u.id, "name": u.name, "email": u.email} for u in rows]
+
+    outcome = scatter_gather(find_matches, health=health_registry)
+
+    # Merge per-shard matches into one list ordered by user ID
+    users = []
+    for shard_id, matches in outcome.results.items():
+        users.extend({**match, "shard": shard_id} for match in matches)
+    users.sort(key=lambda u: u["id"])
+
+    return {
+        "users": users[:limit],
+        "partial": outcome.partial,
+        "errors": {f"shard_{s}": reason for s, reason in outcome.errors.items()},
+    }
+
 @app.get("/users/{user_id}")
 def get_user(user_id: int):
     """
@@ -50,27 +140,45 @@ def get_user(user_id: int):
 
     Reads must be routed to the same shard that handled the write,
     otherwise the user will not be found.
-    """
-
-    # Determine shard based on user_id
-    shard_id = get_shard_id(user_id)
 
-    # Open session for the correct shard
-    db = get_session(shard_id)
+    While a rebalance is moving data, the user may be on its new or its
+    old shard, so both are tried (new owner first).
 
-    # Query the user from that shard only
-    user = db.query(User).filter(User.id == user_id).first()
+    Results are served from user_cache when possible; concurrent misses
+    for the same user share a single query.
+    """
+    user = user_cache.get_or_load(user_id, load_user)
 
-    # If the user does not exist on this shard, return 404
-    if not user:
+    # If the user does not exist on any candidate shard, return 404
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "shard": shard_id
-    }
+    return user
+
+def load_user(user_id: int):
+    """
+    Read a user from its shard(s), or None if it doesn't exist.
+    """
+    # Determine candidate shards based on user_id (usually just one)
+    for shard_id in get_read_shard_ids(user_id):
+        # Open session for this shard and query the user from that shard only
+        with session_scope(shard_id) as db:
+            user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            return {
+                "id": user.id,
+                "name": user.name,
+                "email": user.email,
+                "shard": shard_id
+            }
+    return None
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Return hit/miss counters for the user cache.
+    """
+    return user_cache.stats()
 
 @app.get("/shards/status")
 def shard_status():
@@ -78,13 +186,55 @@ def shard_status():
     Return the number of users stored in each shard.
 
     Useful for visualizing shard distribution and detecting imbalance.
+
+    All shards are counted concurrently, so latency is the slowest
+    shard rather than the sum of them. Shards that are down or time out
+    are listed under "errors" instead of failing the whole request.
     """
-    result = {}
+    # Count rows in the users table on every shard at once
+    outcome = scatter_gather(lambda db: db.query(User).count(), health=health_registry)
+
+    result = {
+        f"shard_{shard_id}": count
+        for shard_id, count in sorted(outcome.results.items())
+    }
 
-    # Count rows in the users table on each shard
-    for shard_id in engines.keys():
-        db = get_session(shard_id)
-        count = db.query(User).count()
-        result[f"shard_{shard_id}"] = count
+    if outcome.partial:
+        result["errors"] = {f"shard_{s}": reason for s, reason in outcome.errors.items()}
 
     return result
+
+@app.get("/shards/pool")
+def shard_pool_status():
+    """
+    Return connection pool metrics for each shard.
+
+    Shows checked-out and idle connections, overflow usage and how long
+    requests waited for a connection, which is where pool exhaustion
+    and cold pools show up first.
+    """
+    return {f"shard_{shard_id}": stats for shard_id, stats in sorted(pool_stats().items())}
+
+@app.get("/shards/routing")
+def shard_routing_status():
+    """
+    Return the routing state this process has applied: state generation,
+    last migration, registered shards, and the live and target rings.
+    """
+    return routing_follower.status()
+
+@app.get("/shards/health")
+def shard_health_status():
+    """
+    Return the health checker's view of each shard.
+
+    Includes circuit breaker state, probe latency EWMA and error rate.
+    Snapshots are read without locking, so this is cheap to poll.
+    """
+    return {
+        f"shard_{shard_id}": {
+            **snapshot.as_dict(),
+            "in_rotation": health_registry.is_healthy(shard_id),
+        }
+        for shard_id, snapshot in sorted(health_checker.snapshots.items())
+    }
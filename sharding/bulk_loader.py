@@ -0,0 +1,176 @@
+# bulk_loader.py
+# -------------------------------
+# Streams records into their shards in large batches
+# -------------------------------
+
+import csv
+import io
+import queue
+import threading
+import time
+from itertools import islice
+from db import engines as shard_engines
+from models import User
+from shard_router import get_shard_ids
+
+# Rows written per INSERT/COPY and per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+# Batches each shard writer may have waiting before the reader blocks
+# Keeps memory flat even when one shard is slower than the others
+WRITER_QUEUE_DEPTH = 2
+
+# Column order used for multi-row INSERT and COPY
+USER_COLUMNS = ("id", "name", "email")
+
+class LoadStats:
+    """
+    Per-shard counters for a bulk load.
+    """
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.rows = 0
+        self.batches = 0
+        self.write_seconds = 0.0  # Time spent inside INSERT/COPY + commit
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.write_seconds if self.write_seconds else 0.0
+
+def _copy_rows(conn, rows):
+    """
+    Write a batch with Postgres COPY (fastest bulk path on Postgres).
+
+    Rows are serialized to CSV in memory and streamed through the
+    driver's copy_expert, bypassing per-row statement overhead.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row[c] for c in USER_COLUMNS] for row in rows)
+    buffer.seek(0)
+
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {User.__tablename__} ({', '.join(USER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+def _write_batch(engine, rows, use_copy: bool):
+    """
+    Write one batch to a shard in a single transaction.
+
+    - Postgres with use_copy: COPY ... FROM STDIN
+    - Otherwise: one executemany INSERT (SQLAlchemy sends multi-row
+      VALUES where the driver supports it)
+    """
+    with engine.begin() as conn:
+        if use_copy and engine.dialect.name == "postgresql":
+            _copy_rows(conn, rows)
+        else:
+            conn.execute(User.__table__.insert(), rows)
+
+def _shard_writer(engine, batches, stats, use_copy, errors):
+    """
+    Drain one shard's batch queue until the None sentinel arrives.
+
+    Runs in its own thread, so all shards are written in parallel.
+    """
+    while True:
+        rows = batches.get()
+        if rows is None:
+            return
+        if errors:
+            continue  # Another writer failed; keep draining so the reader never blocks
+
+        start = time.perf_counter()
+        try:
+            _write_batch(engine, rows, use_copy)
+        except Exception as exc:
+            errors.append((stats.shard_id, exc))
+            continue
+
+        stats.write_seconds += time.perf_counter() - start
+        stats.rows += len(rows)
+        stats.batches += 1
+
+def bulk_load(records, batch_size=DEFAULT_BATCH_SIZE, engines=None,
+              route=get_shard_ids, use_copy=True):
+    """
+    Route a stream of user records to their shards and bulk-write them.
+
+    records: iterable (e.g. a generator) of dicts with id, name, email
+    batch_size: rows per INSERT/COPY and per commit
+    engines: shard_id -> Engine (default: the configured shard engines)
+    route: function mapping a list of IDs to shard IDs (batched ring lookup)
+    use_copy: use COPY on Postgres shards instead of multi-row INSERT
+
+    How it works:
+    - Read records in chunks and route each chunk with one batched ring lookup
+    - Buffer rows per shard; a full buffer becomes a batch for that shard
+    - One writer thread per shard writes its batches in parallel
+    - Writer queues are bounded, so at most a few batches per shard are
+      in memory no matter how large the input is
+
+    Returns: shard_id -> LoadStats
+    """
+    engines = engines or shard_engines
+    stats = {shard_id: LoadStats(shard_id) for shard_id in engines}
+    queues = {shard_id: queue.Queue(maxsize=WRITER_QUEUE_DEPTH) for shard_id in engines}
+    buffers = {shard_id: [] for shard_id in engines}
+    errors = []
+
+    writers = [
+        threading.Thread(
+            target=_shard_writer,
+            args=(engines[shard_id], queues[shard_id], stats[shard_id], use_copy, errors),
+            name=f"bulk-writer-{shard_id}",
+        )
+        for shard_id in engines
+    ]
+    for writer in writers:
+        writer.start()
+
+    try:
+        records = iter(records)
+        while not errors:
+            # Route a whole chunk at once instead of one ring lookup per row
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+
+            for record, shard_id in zip(chunk, route([r["id"] for r in chunk]).tolist()):
+                buffer = buffers[shard_id]
+                buffer.append(record)
+                if len(buffer) >= batch_size:
+                    queues[shard_id].put(buffer)  # Blocks if this shard is behind
+                    buffers[shard_id] = []
+
+        # Flush the partial batch left on each shard
+        for shard_id, buffer in buffers.items():
+            if buffer and not errors:
+                queues[shard_id].put(buffer)
+    finally:
+        for shard_queue in queues.values():
+            shard_queue.put(None)
+        for writer in writers:
+            writer.join()
+
+    if errors:
+        shard_id, exc = errors[0]
+        raise RuntimeError(f"Bulk load failed on shard {shard_id}") from exc
+
+    return stats
+
+def print_load_report(stats, elapsed_seconds: float):
+    """
+    Print rows and rows/sec per shard plus the overall rate.
+    """
+    total = sum(s.rows for s in stats.values())
+    for shard_id, s in sorted(stats.items()):
+        print(f"Shard {shard_id}: {s.rows:>10,} rows in {s.batches:>5} batches, "
+              f"{s.rows_per_second:>12,.0f} rows/sec")
+    print(f"Total:   {total:>10,} rows in {elapsed_seconds:.2f}s, "
+          f"{total / elapsed_seconds if elapsed_seconds else 0:>12,.0f} rows/sec")
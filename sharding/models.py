@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import BigInteger, Column, String
 from sqlalchemy.orm import declarative_base
 
 # Base class that all SQLAlchemy models will inherit from.
@@ -10,9 +10,10 @@ class User(Base):
     __tablename__ = "users"
 
     # Primary key column
-    # - Integer: data type
+    # - BigInteger: holds 64-bit Snowflake IDs (see id_generator.py)
+    # - autoincrement=False: IDs come from the app, not a per-shard sequence
     # - primary_key=True: uniquely identifies each row
-    id = Column(Integer, primary_key=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
 
     # User's name
     # - String: variable-length text
@@ -0,0 +1,305 @@
+# rebalancer.py
+# -------------------------------
+# Moves rows between shards when the ring changes
+# -------------------------------
+
+import json
+import os
+import time
+import numpy as np
+from sqlalchemy import delete, select
+import shard_router
+from models import User
+
+RING_SPACE = 2 ** 64  # Size of the 64-bit hash space
+
+users = User.__table__
+
+class MovedRange:
+    """
+    A slice of the hash space that changes owner between two rings.
+
+    Keys with start <= hash < end move from source to target.
+    When start > end the range wraps past the top of the ring.
+    """
+    def __init__(self, start: int, end: int, source: int, target: int):
+        self.start = start
+        self.end = end
+        self.source = source
+        self.target = target
+
+    @property
+    def size(self) -> int:
+        """Number of hash values covered by the range."""
+        return (self.end - self.start) % RING_SPACE or RING_SPACE
+
+    def __repr__(self):
+        return f"MovedRange({self.start:#018x}..{self.end:#018x}, {self.source} -> {self.target})"
+
+def affected_ranges(old_ring, new_ring) -> list:
+    """
+    Compute the hash ranges whose owner differs between two rings.
+
+    How it works:
+    - Every vnode point of either ring is a boundary
+    - Between two consecutive boundaries both rings have a fixed owner
+      (the owner of the next point clockwise)
+    - Keep the intervals where the owners differ, merging neighbours
+
+    Why it matters:
+    - Shows exactly which part of the keyspace (and which source shards)
+      a ring change touches, before any data is read
+    """
+    if old_ring.hash_mode != new_ring.hash_mode:
+        raise ValueError("Both rings must use the same hash_mode")
+
+    old, new = old_ring.table, new_ring.table
+    boundaries = np.union1d(old.np_points, new.np_points)
+    if len(boundaries) == 0:
+        return []
+
+    # Owner of the interval that starts at each boundary (wraps to point 0)
+    old_owner = old.np_shards[np.searchsorted(old.np_points, boundaries, side="right") % len(old.np_points)]
+    new_owner = new.np_shards[np.searchsorted(new.np_points, boundaries, side="right") % len(new.np_points)]
+
+    ranges = []
+    starts = boundaries.tolist()
+    ends = starts[1:] + starts[:1]  # The last interval wraps to the first boundary
+    for start, end, source, target in zip(starts, ends, old_owner.tolist(), new_owner.tolist()):
+        if source == target:
+            continue
+        last = ranges[-1] if ranges else None
+        if last and last.end == start and (last.source, last.target) == (source, target):
+            last.end = end
+        else:
+            ranges.append(MovedRange(start, end, source, target))
+    return ranges
+
+def moved_fraction(ranges) -> float:
+    """Fraction of the keyspace covered by the moved ranges."""
+    return sum(r.size for r in ranges) / RING_SPACE
+
+
+# -------------------------------
+# Progress, Checkpoints and Throttling
+# -------------------------------
+
+class RebalanceProgress:
+    """
+    Live counters for a running rebalance, per source shard.
+    """
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.scanned = {}   # source shard -> rows read
+        self.moved = {}     # source shard -> rows moved away
+        self.last_id = {}   # source shard -> highest ID processed (keyset cursor)
+        self.done = set()   # source shards fully processed
+        self.moved_this_run = 0  # Not checkpointed: rows moved since started_at
+
+    @property
+    def total_moved(self) -> int:
+        return sum(self.moved.values())
+
+    def rows_per_second(self) -> float:
+        """Rows moved per second by this run (rows restored from a checkpoint don't count)."""
+        elapsed = time.monotonic() - self.started_at
+        return self.moved_this_run / elapsed if elapsed else 0.0
+
+    def snapshot(self) -> dict:
+        """Plain-data view of the counters, e.g. for a metrics endpoint."""
+        return {
+            "scanned": dict(self.scanned),
+            "moved": dict(self.moved),
+            "done": sorted(self.done),
+            "rows_per_second": round(self.rows_per_second(), 1),
+        }
+
+class Checkpoint:
+    """
+    Persists progress to a JSON file so an interrupted rebalance resumes
+    where it stopped instead of rescanning every shard.
+
+    The file records the fingerprints of both rings; a checkpoint for a
+    different ring change is ignored.
+    """
+    def __init__(self, path: str, old_version: str, new_version: str):
+        self.path = path
+        self.versions = {"old": old_version, "new": new_version}
+
+    def load(self, progress: RebalanceProgress):
+        """Restore counters and cursors from disk if the file matches."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("versions") != self.versions:
+            return
+
+        progress.scanned = {int(k): v for k, v in state["scanned"].items()}
+        progress.moved = {int(k): v for k, v in state["moved"].items()}
+        progress.last_id = {int(k): v for k, v in state["last_id"].items()}
+        progress.done = set(state["done"])
+
+    def save(self, progress: RebalanceProgress):
+        """Write counters atomically (temp file + rename)."""
+        if not self.path:
+            return
+        state = {
+            "versions": self.versions,
+            "scanned": progress.scanned,
+            "moved": progress.moved,
+            "last_id": progress.last_id,
+            "done": sorted(progress.done),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Remove the checkpoint once the rebalance has completed."""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class RateLimiter:
+    """
+    Paces data movement to at most max_rows_per_second.
+
+    Why it matters:
+    - Moving rows competes with live traffic for shard I/O;
+      throttling keeps the rebalance from hurting request latency
+    """
+    def __init__(self, max_rows_per_second=None):
+        self.max_rows_per_second = max_rows_per_second
+        self.started_at = time.monotonic()
+        self.rows = 0
+
+    def throttle(self, rows: int):
+        """Record rows just moved and sleep if we are ahead of the budget."""
+        if not self.max_rows_per_second:
+            return
+        self.rows += rows
+        ahead = self.rows / self.max_rows_per_second - (time.monotonic() - self.started_at)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+# -------------------------------
+# Rebalancer
+# -------------------------------
+
+def print_progress(source, progress):
+    """Default progress callback: one line per batch."""
+    print(
+        f"[shard {source}] scanned {progress.scanned.get(source, 0):,}, "
+        f"moved {progress.moved.get(source, 0):,} | total moved {progress.total_moved:,} "
+        f"({progress.rows_per_second():,.0f} rows/sec)"
+    )
+
+class Rebalancer:
+    """
+    Moves every row whose owner changes from old_ring to new_ring.
+
+    For each source shard that loses part of the keyspace:
+    - Read ALL its rows in keyset-paginated batches (WHERE id > cursor
+      ORDER BY id): the ring hashes IDs in Python, so the database can't
+      filter by hash range and a rebalance costs one full scan of every
+      source shard (affected_ranges only decides which shards to scan)
+    - Route the batch with new_ring in one vectorized call
+    - Bulk-insert moving rows into their new owners (skipping IDs the
+      target already has, e.g. from a resumed batch or a newer write)
+    - Delete them from the source
+    - Save a checkpoint, report progress, and throttle
+
+    Routing during the move (double reads) is handled by
+    shard_router.begin_migration / finish_migration.
+
+    Not available with embedded-shard IDs (ID_SHARD_BITS > 0): routing
+    reads their shard from the ID, so a moved row could never be found.
+    """
+    def __init__(self, old_ring, new_ring, engines, batch_size=1000,
+                 max_rows_per_second=None, checkpoint_path=None, on_progress=print_progress):
+        if shard_router.ID_SHARD_BITS:
+            raise RuntimeError("Rebalancing is not supported with embedded-shard IDs (ID_SHARD_BITS > 0)")
+        self.old_ring = old_ring
+        self.new_ring = new_ring
+        self.engines = engines
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(max_rows_per_second)
+        self.on_progress = on_progress
+        self.progress = RebalanceProgress()
+        self.ranges = affected_ranges(old_ring, new_ring)
+        self.checkpoint = Checkpoint(
+            checkpoint_path,
+            old_ring.table.fingerprint(),
+            new_ring.table.fingerprint(),
+        )
+
+    def source_shards(self) -> list:
+        """Only shards that own a moved range need to be scanned."""
+        return sorted({r.source for r in self.ranges})
+
+    def run(self) -> RebalanceProgress:
+        """Move all affected rows, resuming from the checkpoint if present."""
+        self.checkpoint.load(self.progress)
+
+        for source in self.source_shards():
+            if source in self.progress.done:
+                continue
+            self._drain_shard(source)
+            self.progress.done.add(source)
+            self.checkpoint.save(self.progress)
+
+        self.checkpoint.clear()
+        return self.progress
+
+    def _drain_shard(self, source: int):
+        """Stream one source shard and move the rows that left it."""
+        progress = self.progress
+        engine = self.engines[source]
+
+        while True:
+            last_id = progress.last_id.get(source, -1)
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(users)
+                    .where(users.c.id > last_id)
+                    .order_by(users.c.id)
+                    .limit(self.batch_size)
+                ).mappings().all()
+            if not rows:
+                return
+
+            ids = [row["id"] for row in rows]
+            targets = self.new_ring.get_shards(ids).tolist()
+            moving = [(dict(row), t) for row, t in zip(rows, targets) if t != source]
+
+            if moving:
+                self._copy_to_targets(moving)
+                with engine.begin() as conn:
+                    conn.execute(delete(users).where(users.c.id.in_([r["id"] for r, _ in moving])))
+
+            progress.last_id[source] = ids[-1]
+            progress.scanned[source] = progress.scanned.get(source, 0) + len(rows)
+            progress.moved[source] = progress.moved.get(source, 0) + len(moving)
+            progress.moved_this_run += len(moving)
+            self.checkpoint.save(progress)
+
+            if self.on_progress:
+                self.on_progress(source, progress)
+            self.limiter.throttle(len(moving))
+
+    def _copy_to_targets(self, moving):
+        """Bulk-insert moving rows into each new owner in one transaction per target."""
+        by_target = {}
+        for row, target in moving:
+            by_target.setdefault(target, []).append(row)
+
+        for target, rows in by_target.items():
+            with self.engines[target].begin() as conn:
+                present = set(conn.execute(
+                    select(users.c.id).where(users.c.id.in_([r["id"] for r in rows]))
+                ).scalars())
+                missing = [r for r in rows if r["id"] not in present]
+                if missing:
+                    conn.execute(users.insert(), missing)
@@ -0,0 +1,184 @@
+# routing_state.py
+# -------------------------------
+# Routing changes shared by every app process:
+# shards registered at runtime and online rebalances
+# -------------------------------
+
+import json
+import logging
+import os
+import threading
+import db
+import shard_router
+
+logger = logging.getLogger(__name__)
+
+# JSON file every app process polls (written only by scripts/rebalance.py).
+# Must be the same file for all workers, e.g. on a shared volume
+ROUTING_STATE_PATH = os.environ.get("ROUTING_STATE_PATH", "routing_state.json")
+
+# How often each app process checks the file for changes
+ROUTING_POLL_SECONDS = float(os.environ.get("ROUTING_POLL_SECONDS", "1.0"))
+
+# How long a writer waits after a change before relying on it:
+# by then every polling process has applied it
+SETTLE_SECONDS = 3 * ROUTING_POLL_SECONDS
+
+# Migration states
+RUNNING = "running"
+FINISHED = "finished"
+ABORTED = "aborted"
+
+def read_state(path: str = ROUTING_STATE_PATH) -> dict:
+    """
+    Current shared routing state:
+    - generation: bumped on every change
+    - shards: shard_id (as a string, JSON keys) -> database URL, for shards
+      added after the app was configured
+    - migration: None, or {"id", "state", "shards"}: the last rebalance,
+      with the shard IDs of its target ring
+    """
+    if not os.path.exists(path):
+        return {"generation": 0, "shards": {}, "migration": None}
+    with open(path) as f:
+        return json.load(f)
+
+def _publish(path: str, **changes) -> dict:
+    state = read_state(path)
+    state.update(changes)
+    state["generation"] += 1
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # Readers see the old or the new file, never half of one
+    return state
+
+def announce_shard(shard_id: int, db_url: str, path: str = ROUTING_STATE_PATH):
+    """Tell every app process to register a new shard database."""
+    state = read_state(path)
+    _publish(path, shards={**state["shards"], str(shard_id): db_url})
+
+def announce_migration_start(shard_ids, path: str = ROUTING_STATE_PATH) -> int:
+    """
+    Tell every app process to start double-routing towards a ring over
+    shard_ids. Returns the migration ID.
+    """
+    previous = read_state(path)["migration"]
+    migration_id = previous["id"] + 1 if previous else 1
+    _publish(path, migration={"id": migration_id, "state": RUNNING, "shards": sorted(shard_ids)})
+    return migration_id
+
+def _end_migration(state_name: str, path: str):
+    migration = read_state(path)["migration"]
+    if migration is None or migration["state"] != RUNNING:
+        raise RuntimeError("No migration in progress")
+    _publish(path, migration={**migration, "state": state_name})
+
+def announce_migration_finish(path: str = ROUTING_STATE_PATH):
+    """Tell every app process to make the target ring live."""
+    _end_migration(FINISHED, path)
+
+def announce_migration_abort(path: str = ROUTING_STATE_PATH):
+    """Tell every app process to stop double-routing and keep its live ring."""
+    _end_migration(ABORTED, path)
+
+class RoutingStateFollower:
+    """
+    Keeps this process's routing in line with the shared state file.
+
+    How it works:
+    - apply() registers new shards (engines, sessions, health probes),
+      then replays the migration's state through shard_router:
+      begin_migration, finish_migration or abort_migration
+    - A process that starts after a rebalance finished adopts its ring
+      directly (begin + finish), so it never routes to the old layout
+    - A daemon thread re-reads the file every ROUTING_POLL_SECONDS;
+      nothing is done unless the generation changed
+
+    Why it matters:
+    - Routing state lives in each process; without this, a rebalance
+      run from a script moves rows the app then can't find
+    """
+    def __init__(self, path: str = ROUTING_STATE_PATH, interval: float = ROUTING_POLL_SECONDS, on_new_shard=None):
+        """
+        on_new_shard: called with (shard_id, engine) after a shard is
+                      registered, e.g. HealthChecker.add_shard
+        """
+        self.path = path
+        self.interval = interval
+        self.on_new_shard = on_new_shard
+        self.generation = 0
+        self.migration = None  # Last migration applied: (id, state)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def apply(self, state: dict):
+        for shard_id, db_url in state["shards"].items():
+            shard_id = int(shard_id)
+            if shard_id not in db.engines:
+                engine = db.register_shard(shard_id, db_url)
+                if self.on_new_shard is not None:
+                    self.on_new_shard(shard_id, engine)
+                logger.info("Registered shard %s", shard_id)
+
+        migration = state["migration"]
+        if migration is not None and (migration["id"], migration["state"]) != self.migration:
+            self._apply_migration(migration)
+            self.migration = (migration["id"], migration["state"])
+        self.generation = state["generation"]
+
+    def _apply_migration(self, migration: dict):
+        running_here = self.migration == (migration["id"], RUNNING)
+        state = migration["state"]
+
+        if state == RUNNING:
+            if shard_router.migration_ring is not None:
+                shard_router.abort_migration()  # Left over from a migration we never saw end
+            shard_router.begin_migration(shard_router.build_ring(migration["shards"]))
+        elif state == FINISHED:
+            if not running_here:
+                # Started (or missed the start) after the rows moved: adopt the new ring
+                if shard_router.migration_ring is not None:
+                    shard_router.abort_migration()
+                shard_router.begin_migration(shard_router.build_ring(migration["shards"]))
+            shard_router.finish_migration()
+        elif state == ABORTED and running_here:
+            shard_router.abort_migration()
+        logger.info("Migration %s: %s", migration["id"], state)
+
+    def poll(self):
+        """Apply the state file if it changed since the last call."""
+        state = read_state(self.path)
+        if state["generation"] != self.generation:
+            self.apply(state)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # Keep the current routing; try again next interval
+                logger.exception("Could not apply routing state from %s", self.path)
+
+    def start(self):
+        """Apply the current state now, then follow changes in a daemon thread."""
+        self.poll()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="routing-state", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self) -> dict:
+        migration = shard_router.migration_ring
+        return {
+            "generation": self.generation,
+            "migration": dict(zip(("id", "state"), self.migration)) if self.migration else None,
+            "shards": sorted(db.engines),
+            "live_ring_shards": sorted(shard_router.hash_ring.table.shard_ids),
+            "target_ring_shards": sorted(migration.table.shard_ids) if migration is not None else None,
+        }
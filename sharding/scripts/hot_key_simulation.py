@@ -2,7 +2,12 @@
 # Simulate hot key traffic distribution
 # -------------------------------------------
 
-from shard_router import get_shard_id  # Function to map a user ID to its shard
+from shard_router import (
+    get_shard_id,        # Function to map a user ID to its shard
+    ConsistentHashRing,  # Used to build plain and bounded-load rings side by side
+    ALL_SHARDS,
+    SHARD_WEIGHTS,
+)
 from collections import defaultdict     # For counting requests per shard
 import random                           # For simulating random traffic
 
@@ -57,6 +62,63 @@ def simulate_hot_keys(total_users=1000, total_requests=10000):
     for hk in hot_keys:
         print(f"User {hk} on Shard {get_shard_id(hk)}")
 
+def zipf_requests(total_users, total_requests, exponent=1.1, seed=42):
+    """
+    Generate Zipfian traffic: the k-th most popular user gets
+    traffic proportional to 1 / k**exponent.
+
+    A fixed seed keeps runs comparable between modes and changes.
+    """
+    rng = random.Random(seed)
+
+    # Shuffle IDs so the hottest users are not simply 0, 1, 2...
+    users = list(range(total_users))
+    rng.shuffle(users)
+
+    weights = [1 / (rank ** exponent) for rank in range(1, total_users + 1)]
+    return rng.choices(users, weights=weights, k=total_requests)
+
+def max_mean_ratio(counts):
+    """
+    Max shard load divided by mean shard load (1.0 = perfectly even).
+    """
+    mean = sum(counts.values()) / len(counts)
+    return max(counts.values()) / mean
+
+def compare_load_modes(total_users=1000, total_requests=100_000, load_factors=(1.25, 1.1)):
+    """
+    Route the same Zipfian traffic through a plain ring and
+    bounded-load rings and report the max/mean load ratio of each.
+
+    Parameters:
+    - load_factors: how far above the mean a shard may go before its
+      keys spill to the next vnode in bounded-load mode.
+    """
+    requests = zipf_requests(total_users, total_requests)
+
+    # Plain consistent hashing: every request goes to the key's home shard
+    plain = ConsistentHashRing(weights=SHARD_WEIGHTS)
+    plain.build(ALL_SHARDS)
+    plain_counts = {shard_id: 0 for shard_id in ALL_SHARDS}
+    for user_id in requests:
+        plain_counts[plain.get_shard(user_id)] += 1
+
+    print(f"\nZipfian traffic ({total_requests} requests, {total_users} users):")
+    print(f"{'mode':<22} {'max/mean':>8}   per-shard requests")
+    print(f"{'plain':<22} {max_mean_ratio(plain_counts):>8.3f}   {plain_counts}")
+
+    # Bounded loads: overloaded shards spill requests clockwise
+    for load_factor in load_factors:
+        bounded = ConsistentHashRing(weights=SHARD_WEIGHTS, load_factor=load_factor)
+        bounded.build(ALL_SHARDS)
+        for user_id in requests:
+            bounded.assign(user_id)
+        bounded_counts = {shard_id: bounded.loads.get(shard_id, 0) for shard_id in ALL_SHARDS}
+
+        label = f"bounded (c={load_factor})"
+        print(f"{label:<22} {max_mean_ratio(bounded_counts):>8.3f}   {bounded_counts}")
+
 # Run the simulation when executed as a script
 if __name__ == "__main__":
     simulate_hot_keys()
+    compare_load_modes()
@@ -0,0 +1,79 @@
+# -------------------------------------------
+# Benchmark and stress-test the Snowflake ID generator
+# -------------------------------------------
+
+import threading
+import time
+from multiprocessing import Pool
+from id_generator import SnowflakeGenerator, shard_of, timestamp_ms
+
+def throughput(next_id, count=1_000_000):
+    """
+    IDs per second from a single thread calling next_id().
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        next_id()
+    return count / (time.perf_counter() - start)
+
+def stress_threads(threads=16, per_thread=100_000):
+    """
+    Many threads share one generator; every ID must be unique and each
+    thread must see its own IDs strictly increasing.
+    """
+    generator = SnowflakeGenerator(worker_id=1)
+    results = [None] * threads
+
+    def worker(index):
+        results[index] = [generator.next_id() for _ in range(per_thread)]
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    all_ids = [i for ids in results for i in ids]
+    duplicates = len(all_ids) - len(set(all_ids))
+    non_monotonic = sum(1 for ids in results for a, b in zip(ids, ids[1:]) if b <= a)
+    print(f"Threads:   {threads} x {per_thread:,} IDs -> {duplicates} duplicates, "
+          f"{non_monotonic} out-of-order IDs within a thread")
+    return duplicates == 0 and non_monotonic == 0
+
+def generate_in_process(worker_id, count=200_000):
+    """
+    Runs in a child process with its own worker ID.
+    """
+    generator = SnowflakeGenerator(worker_id=worker_id)
+    return [generator.next_id() for _ in range(count)]
+
+def stress_processes(processes=8):
+    """
+    Separate processes with distinct worker IDs must never collide.
+    """
+    with Pool(processes) as pool:
+        results = pool.map(generate_in_process, range(processes))
+
+    all_ids = [i for ids in results for i in ids]
+    duplicates = len(all_ids) - len(set(all_ids))
+    print(f"Processes: {processes} x {len(results[0]):,} IDs -> {duplicates} duplicates")
+    return duplicates == 0
+
+def run_benchmark():
+    plain = SnowflakeGenerator(worker_id=1)
+    print(f"Single thread: {throughput(plain.next_id):,.0f} IDs/sec")
+
+    sharded = SnowflakeGenerator(worker_id=1, shard_bits=4)
+    rate = throughput(lambda: sharded.next_id(shard_id=3))
+    print(f"Single thread (embedded shard): {rate:,.0f} IDs/sec")
+
+    sample = sharded.next_id(shard_id=3)
+    print(f"Sample ID {sample}: shard {shard_of(sample, 4)}, "
+          f"created {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp_ms(sample) / 1000))} UTC\n")
+
+    ok = stress_threads() & stress_processes()
+    if not ok:
+        raise SystemExit("ID generator produced duplicate or out-of-order IDs")
+
+if __name__ == "__main__":
+    run_benchmark()
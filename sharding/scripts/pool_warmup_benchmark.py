@@ -0,0 +1,81 @@
+# -------------------------------------------
+# Load test: request latency on a cold vs warmed connection pool
+# -------------------------------------------
+
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, text
+from db import create_shard_engine, pool_stats, warm_up_pools
+
+# Simulated cost of opening a database connection (TCP + TLS + auth)
+CONNECT_LATENCY_SECONDS = 0.05
+
+CONCURRENT_CLIENTS = 10
+REQUESTS = 500
+
+def make_engine(path):
+    """
+    SQLite stand-in for a shard, with a connect hook that sleeps
+    like a real Postgres handshake would.
+    """
+    engine = create_shard_engine(0, f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def slow_connect(dbapi_connection, connection_record):
+        time.sleep(CONNECT_LATENCY_SECONDS)
+
+    return engine
+
+def one_request(engine):
+    """
+    A tiny query, timed end to end including the pool checkout.
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return (time.perf_counter() - start) * 1000
+
+def load_test(engine):
+    """
+    Fire REQUESTS queries from CONCURRENT_CLIENTS threads and return
+    the latencies in milliseconds.
+    """
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CLIENTS) as clients:
+        return list(clients.map(lambda _: one_request(engine), range(REQUESTS)))
+
+def report(label, latencies, engine):
+    """
+    Print p50/p99/max latency and the pool's wait metrics.
+    """
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    pool = pool_stats({0: engine})[0]
+    print(
+        f"{label:<10} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   max {latencies[-1]:7.2f} ms   "
+        f"pool wait max {pool['wait_ms_max']:7.2f} ms"
+    )
+
+def run_benchmark():
+    """
+    Compare a burst of traffic hitting a cold pool with the same burst
+    after warm_up_pools() pre-opened the connections.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shard.db")
+
+        cold = make_engine(path)
+        report("cold", load_test(cold), cold)
+        cold.dispose()
+
+        warm = make_engine(path)
+        warm_up_pools(CONCURRENT_CLIENTS, {0: warm})
+        warm.pool.metrics.wait_seconds_max = 0.0  # Only measure the load test itself
+        report("warmed", load_test(warm), warm)
+        warm.dispose()
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,72 @@
+# -------------------------------------------
+# Benchmark hash ring build and mutation cost
+# -------------------------------------------
+
+import bisect
+import time
+import numpy as np
+from shard_router import ConsistentHashRing
+
+SHARD_COUNT = 10  # Ring size is SHARD_COUNT * replicas virtual nodes
+
+def legacy_build(ring, shard_ids):
+    """
+    The original build loop: one bisect.insort per virtual node.
+    Kept here to show its quadratic cost next to the new build.
+    """
+    mapping = {}
+    sorted_keys = []
+    for shard_id in shard_ids:
+        for i in range(ring.replicas):
+            h = ring._hash(f"{shard_id}:{i}")
+            mapping[h] = shard_id
+            bisect.insort(sorted_keys, h)
+    return mapping, sorted_keys
+
+def elapsed_ms(fn):
+    """
+    Run fn once and return how long it took in milliseconds.
+    """
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+def same_table(a, b):
+    """
+    True when two compiled tables hold identical points and owners.
+    """
+    return np.array_equal(a.np_points, b.np_points) and np.array_equal(a.np_shards, b.np_shards)
+
+def run_benchmark(vnode_counts=(1_000, 10_000, 100_000)):
+    """
+    For each ring size, time:
+    - the legacy insort build
+    - the sort-once build
+    - removing one shard and adding it back incrementally
+    and check the incremental result matches a full rebuild.
+    """
+    shard_ids = list(range(SHARD_COUNT))
+    print(f"{'vnodes':>8} {'legacy build':>14} {'build':>10} {'remove_shard':>14} {'add_shard':>11}")
+
+    for total in vnode_counts:
+        ring = ConsistentHashRing(replicas=total // SHARD_COUNT)
+
+        legacy_ms = elapsed_ms(lambda: legacy_build(ring, shard_ids))
+        build_ms = elapsed_ms(lambda: ring.build(shard_ids))
+        full = ring.table
+
+        remove_ms = elapsed_ms(lambda: ring.remove_shard(3))
+        add_ms = elapsed_ms(lambda: ring.add_shard(3))
+
+        if not same_table(full, ring.table):
+            raise SystemExit("Incremental add/remove diverged from a full rebuild")
+
+        print(
+            f"{total:>8,} {legacy_ms:>12.1f}ms {build_ms:>8.1f}ms "
+            f"{remove_ms:>12.2f}ms {add_ms:>9.2f}ms"
+        )
+
+    print("\nIncremental add/remove matched a full rebuild at every size")
+
+if __name__ == "__main__":
+    run_benchmark()
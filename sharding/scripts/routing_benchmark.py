@@ -0,0 +1,85 @@
+# -------------------------------------------
+# Benchmark shard routing throughput
+# -------------------------------------------
+
+import bisect
+import hashlib
+import time
+import numpy as np
+from shard_router import ConsistentHashRing
+
+SHARDS = [0, 1, 2]
+
+class LegacyRing:
+    """
+    The original MD5 + bisect ring, kept here as the reference
+    implementation for speed and placement comparisons.
+    """
+    def __init__(self, shard_ids, replicas=100):
+        self.ring = {}
+        self.sorted_keys = []
+        for shard_id in shard_ids:
+            for i in range(replicas):
+                h = self._hash(f"{shard_id}:{i}")
+                self.ring[h] = shard_id
+                bisect.insort(self.sorted_keys, h)
+
+    def _hash(self, key: str) -> int:
+        return int(hashlib.md5(key.encode()).hexdigest(), 16)
+
+    def get_shard(self, key: str) -> int:
+        idx = bisect.bisect(self.sorted_keys, self._hash(key))
+        if idx == len(self.sorted_keys):
+            idx = 0
+        return self.ring[self.sorted_keys[idx]]
+
+def timed(label, fn, n_keys, repeat=3):
+    """
+    Run fn a few times and print keys/sec for the fastest run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {n_keys / best:>14,.0f} keys/sec")
+
+def check_placement(legacy, ring, user_ids):
+    """
+    Prove the compiled ring in md5 mode routes every key exactly like
+    the legacy ring, through both the single-key and batch APIs.
+    """
+    expected = [legacy.get_shard(str(u)) for u in user_ids]
+    single = [ring.get_shard(u) for u in user_ids]
+    batch = ring.get_shards(user_ids).tolist()
+
+    mismatches = sum(1 for e, s, b in zip(expected, single, batch) if not e == s == b)
+    print(f"Placement check: {mismatches} / {len(user_ids)} keys differ from legacy")
+    if mismatches:
+        raise SystemExit("md5 mode does not match legacy placement")
+
+def run_benchmark(total_keys=200_000):
+    """
+    Compare legacy MD5/bisect routing with the compiled ring in md5 and
+    fast modes, one key at a time and in a single batch.
+    """
+    user_ids = np.arange(total_keys, dtype=np.int64)
+    id_list = user_ids.tolist()
+
+    legacy = LegacyRing(SHARDS)
+    md5_ring = ConsistentHashRing(hash_mode="md5")
+    md5_ring.build(SHARDS)
+    fast_ring = ConsistentHashRing(hash_mode="fast")
+    fast_ring.build(SHARDS)
+
+    check_placement(legacy, md5_ring, id_list)
+
+    print(f"\nRouting {total_keys:,} keys across {len(SHARDS)} shards:")
+    timed("legacy single-key", lambda: [legacy.get_shard(str(u)) for u in id_list], total_keys)
+    timed("md5 single-key", lambda: [md5_ring.get_shard(u) for u in id_list], total_keys)
+    timed("fast single-key", lambda: [fast_ring.get_shard(u) for u in id_list], total_keys)
+    timed("md5 batch (get_shards)", lambda: md5_ring.get_shards(user_ids), total_keys)
+    timed("fast batch (get_shards)", lambda: fast_ring.get_shards(user_ids), total_keys)
+
+if __name__ == "__main__":
+    run_benchmark()
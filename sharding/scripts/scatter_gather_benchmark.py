@@ -0,0 +1,102 @@
+# -------------------------------------------
+# Benchmark serial vs scatter-gather cross-shard queries
+# -------------------------------------------
+
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import scatter_gather
+from models import Base, User
+from shard_health import ShardHealthRegistry
+
+# Simulated network + query latency per shard, in seconds
+SHARD_LATENCY = {0: 0.05, 1: 0.08, 2: 0.12, 3: 0.06, 4: 0.10, 5: 0.07}
+
+def make_sqlite_shards(directory, users_per_shard=1000):
+    """
+    Create one SQLite file per shard as a stand-in for Postgres
+    and fill each with a few users.
+    """
+    engines, factories = {}, {}
+    for shard_id in SHARD_LATENCY:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, f'shard_{shard_id}.db')}")
+        Base.metadata.create_all(bind=engine)
+
+        # session.info tells slow_count which shard it is talking to
+        factory = sessionmaker(bind=engine, info={"shard_id": shard_id})
+        with factory() as db:
+            offset = shard_id * users_per_shard
+            db.add_all(
+                User(id=offset + i, name=f"user {offset + i}", email=f"user{offset + i}@example.com")
+                for i in range(users_per_shard)
+            )
+            db.commit()
+
+        engines[shard_id] = engine
+        factories[shard_id] = factory
+    return engines, factories
+
+def slow_count(db):
+    """
+    Count users after sleeping for the shard's simulated latency.
+    """
+    time.sleep(SHARD_LATENCY[db.info["shard_id"]])
+    return db.query(User).count()
+
+def serial_counts(factories):
+    """
+    The original /shards/status strategy: one shard after another.
+    """
+    result = {}
+    for shard_id, factory in factories.items():
+        with factory() as db:
+            result[shard_id] = slow_count(db)
+    return result
+
+def timed_ms(fn):
+    """
+    Run fn once and return (result, elapsed milliseconds).
+    """
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def run_benchmark():
+    """
+    Compare serial and scatter-gather shard counts, then show partial
+    results when a shard is down or slower than the timeout.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        engines, factories = make_sqlite_shards(directory)
+
+        expected, serial_ms = timed_ms(lambda: serial_counts(factories))
+        outcome, scatter_ms = timed_ms(lambda: scatter_gather(slow_count, session_factories=factories))
+        assert outcome.results == expected and not outcome.partial
+
+        print(f"Shards: {len(factories)}, simulated latencies: {SHARD_LATENCY}")
+        print(f"Serial:         {serial_ms:8.1f} ms (sum of shard latencies)")
+        print(f"Scatter-gather: {scatter_ms:8.1f} ms (slowest shard)")
+
+        # Partial results: one shard marked down, one slower than the timeout
+        health = ShardHealthRegistry(factories.keys())
+        health.mark_down(1)
+        SHARD_LATENCY[2] = 1.0
+        outcome, partial_ms = timed_ms(
+            lambda: scatter_gather(slow_count, timeout=0.3, health=health, session_factories=factories)
+        )
+        print(f"\nWith shard 1 down and shard 2 slow (timeout 300 ms): {partial_ms:.1f} ms")
+        print(f"  results: {dict(sorted(outcome.results.items()))}")
+        print(f"  errors:  {outcome.errors}")
+
+        # Let the straggler finish, then confirm every connection went back to its pool
+        time.sleep(1.0)
+        checked_out = {shard_id: e.pool.checkedout() for shard_id, e in engines.items()}
+        print(f"\nConnections still checked out per shard: {checked_out}")
+
+        for engine in engines.values():
+            engine.dispose()
+
+if __name__ == "__main__":
+    run_benchmark()
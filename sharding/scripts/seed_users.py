@@ -1,40 +1,41 @@
+import time
 from faker import Faker
-from db import get_session
-from models import User
-from shard_router import get_shard_id
+from bulk_loader import DEFAULT_BATCH_SIZE, bulk_load, print_load_report
 
 # Faker is used to generate realistic-looking test data
 fake = Faker()
 
-def seed_users(total=1000):
+def generate_users(total):
     """
-    Populate the sharded databases with fake users.
+    Yield fake user records one at a time.
 
-    This helps demonstrate how users are distributed across shards
-    based on the sharding strategy.
+    Using a generator keeps memory flat: only the batches currently
+    being written are held in memory, not the whole dataset.
     """
     for i in range(total):
         # Use a deterministic user_id so shard routing is predictable
-        user_id = i
+        yield {
+            "id": i,
+            "name": fake.name(),
+            "email": f"user{i}@example.com",
+        }
 
-        # Determine which shard this user belongs to
-        shard_id = get_shard_id(user_id)
-
-        # Open a session to the correct shard
-        db = get_session(shard_id)
+def seed_users(total=1000, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Populate the sharded databases with fake users.
 
-        # Create a fake user record
-        user = User(
-            id=user_id,
-            name=fake.name(),
-            email=f"user{i}@example.com"
-        )
+    This helps demonstrate how users are distributed across shards
+    based on the sharding strategy.
 
-        # Persist the user to the selected shard
-        db.add(user)
-        db.commit()
+    Users are routed in batches and written with multi-row INSERT
+    (or COPY on Postgres), with all shards loading in parallel,
+    instead of one session and one commit per user.
+    """
+    start = time.perf_counter()
+    stats = bulk_load(generate_users(total), batch_size=batch_size)
 
-    # Log completion summary
+    # Log per-shard throughput and completion summary
+    print_load_report(stats, time.perf_counter() - start)
     print(f"Seeded {total} users across shards")
 
 # Allow this script to be run directly from the command line
@@ -2,6 +2,8 @@
 # Simulate shard failure and recovery impact
 # -------------------------------------------
 
+import random
+from shard_health import CircuitBreaker  # Hysteresis between probe results and ring changes
 from shard_router import (
     get_shard_id,   # Function to map a user ID to its shard
     mark_shard_down, # Marks a shard as unhealthy
@@ -43,5 +45,36 @@ def simulate():
     print("Shard 1 recovers...")
     mark_shard_up(1)  # Bring shard 1 back into rotation
 
+def simulate_flapping(probes=200, failure_chance=0.3, seed=7):
+    """
+    Compares ring changes for a flapping shard with and without a
+    circuit breaker.
+
+    Without a breaker, every probe that flips between success and
+    failure would change the ring. The breaker only reacts to sustained
+    failure and sustained recovery.
+    """
+    rng = random.Random(seed)
+    results = [rng.random() >= failure_chance for _ in range(probes)]
+
+    # Naive: mark down on any failure, up on any success
+    naive_changes = sum(1 for prev, cur in zip(results, results[1:]) if prev != cur)
+
+    # Circuit breaker: one probe per second of simulated time
+    breaker = CircuitBreaker(open_seconds=5.0)
+    error_rate = 0.0
+    breaker_changes = 0
+    for second, ok in enumerate(results):
+        if not breaker.should_probe(second):
+            continue
+        error_rate = 0.8 * error_rate + 0.2 * (0.0 if ok else 1.0)
+        if breaker.record(ok, error_rate, second + 1, second):
+            breaker_changes += 1
+
+    print(f"\nFlapping shard ({failure_chance:.0%} of {probes} probes fail):")
+    print(f"Ring changes without circuit breaker: {naive_changes}")
+    print(f"Ring changes with circuit breaker:    {breaker_changes}")
+
 if __name__ == "__main__":
     simulate()  # Run the simulation
+    simulate_flapping()
@@ -3,6 +3,16 @@
 # Tracks the health status of database shards
 # -------------------------------
 
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
 class ShardHealthRegistry:
     """
     Maintains a simple in-memory registry of shard health.
@@ -57,3 +67,285 @@ class ShardHealthRegistry:
         - Ensures only healthy shards receive traffic
         """
         return [s for s, ok in self.status.items() if ok]
+
+
+# -------------------------------
+# Circuit Breaker
+# -------------------------------
+
+class CircuitBreaker:
+    """
+    Per-shard circuit breaker driven by health probes.
+
+    States:
+    - closed: shard is in rotation
+    - open: shard is out of rotation; no probes until the cooldown ends
+    - half_open: cooldown ended; probes decide whether to close or reopen
+
+    Why it matters:
+    - Hysteresis: it takes several failures to open and several clean
+      probes to close, so a flapping shard doesn't bounce in and out
+      of the ring on every probe
+    - Reopening doubles the cooldown (up to a cap), so a shard that keeps
+      failing is probed less and less often
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, error_rate_threshold=0.5, min_samples=10,
+                 recovery_successes=3, open_seconds=5.0, max_open_seconds=60.0):
+        """
+        failure_threshold: consecutive failures that open the breaker
+        error_rate_threshold: EWMA error rate that opens the breaker
+        min_samples: probes needed before the error rate is trusted
+        recovery_successes: consecutive half-open successes that close it
+        open_seconds / max_open_seconds: first and largest cooldown
+        """
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.recovery_successes = recovery_successes
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0
+
+    def should_probe(self, now: float) -> bool:
+        """
+        Whether the shard should be probed now.
+        An open breaker moves to half-open once its cooldown has passed.
+        """
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self.consecutive_successes = 0
+        return True
+
+    def record(self, ok: bool, error_rate: float, samples: int, now: float):
+        """
+        Feed one probe result into the breaker.
+
+        Returns: "down" when the shard should leave the ring,
+                 "up" when it should rejoin, otherwise None.
+        """
+        if ok:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+
+        if self.state == self.HALF_OPEN:
+            if not ok:
+                # Still failing: back off before the next trial
+                self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+                self._open(now)
+                return None
+            if self.consecutive_successes >= self.recovery_successes:
+                self.state = self.CLOSED
+                self.open_seconds = self.base_open_seconds
+                return "up"
+            return None
+
+        if self.state == self.CLOSED:
+            too_many_failures = self.consecutive_failures >= self.failure_threshold
+            error_rate_high = samples >= self.min_samples and error_rate >= self.error_rate_threshold
+            if not ok and (too_many_failures or error_rate_high):
+                self._open(now)
+                return "down"
+        return None
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+
+
+# -------------------------------
+# Active Health Checker
+# -------------------------------
+
+class ShardHealth:
+    """
+    Immutable snapshot of one shard's probe statistics.
+
+    The checker publishes a new snapshot after every probe by replacing
+    a dict entry, so request handlers can read it without any lock.
+    """
+    __slots__ = ("state", "latency_ewma_ms", "error_rate", "samples", "last_error")
+
+    def __init__(self, state, latency_ewma_ms, error_rate, samples, last_error):
+        self.state = state
+        self.latency_ewma_ms = latency_ewma_ms
+        self.error_rate = error_rate
+        self.samples = samples
+        self.last_error = last_error
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 3),
+            "error_rate": round(self.error_rate, 3),
+            "samples": self.samples,
+            "last_error": self.last_error,
+        }
+
+def create_probe_engine(engine, timeout: float):
+    """
+    Engine for health probes on the same database as `engine`, with its
+    own connections (NullPool: opened per probe, closed right after).
+
+    Why it matters:
+    - Probing through the request pool would count pool exhaustion under
+      load as a shard failure and take a healthy shard out of the ring
+    - connect_timeout / statement_timeout make a hung probe give up on the
+      server side too, instead of holding a probe thread indefinitely
+      (libpq's connect_timeout is whole seconds, at least 2)
+    """
+    connect_args = {}
+    if engine.dialect.name == "postgresql":
+        connect_args = {
+            "connect_timeout": max(math.ceil(timeout), 2),
+            "options": f"-c statement_timeout={max(int(timeout * 1000), 1)}",
+        }
+    return create_engine(engine.url, poolclass=NullPool, connect_args=connect_args)
+
+class HealthChecker:
+    """
+    Background prober that keeps ShardHealthRegistry up to date.
+
+    How it works:
+    - Every interval, each shard not in an open breaker cooldown runs a
+      cheap query (SELECT 1) with a timeout, on a dedicated connection
+      (see create_probe_engine), not one from the request pool
+    - Latency and error rate are tracked as exponentially weighted
+      moving averages (EWMA)
+    - Results feed a per-shard CircuitBreaker; only breaker transitions
+      call on_down / on_up (e.g. mark_shard_down / mark_shard_up)
+
+    Why it matters:
+    - A dead shard is taken out of the ring within a few probe intervals,
+      instead of requests blocking until connect timeout
+    - Request handlers read health lock-free from `snapshots` and the registry
+    """
+    def __init__(self, engines, on_down, on_up, interval=1.0, timeout=0.5,
+                 ewma_alpha=0.2, breaker_factory=CircuitBreaker):
+        """
+        engines: shard_id -> SQLAlchemy Engine to probe
+        on_down / on_up: called with shard_id when a breaker opens / closes
+        interval: seconds between probe rounds
+        timeout: seconds before a probe counts as failed
+        ewma_alpha: weight of the newest sample in the moving averages
+        """
+        self.engines = {shard_id: create_probe_engine(engine, timeout) for shard_id, engine in engines.items()}
+        self.on_down = on_down
+        self.on_up = on_up
+        self.interval = interval
+        self.timeout = timeout
+        self.alpha = ewma_alpha
+
+        self.breaker_factory = breaker_factory
+        self.breakers = {shard_id: breaker_factory() for shard_id in engines}
+        self.snapshots = {
+            shard_id: ShardHealth(CircuitBreaker.CLOSED, 0.0, 0.0, 0, None)
+            for shard_id in engines
+        }
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(2 * len(engines), 1),
+            thread_name_prefix="health-probe",
+        )
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_shard(self, shard_id, engine):
+        """
+        Start probing a shard registered at runtime (does nothing if known).
+
+        The dicts are replaced, not mutated, so a probe round iterating
+        the old ones is never disturbed.
+        """
+        if shard_id in self.engines:
+            return
+        self.engines = {**self.engines, shard_id: create_probe_engine(engine, self.timeout)}
+        self.snapshots = {**self.snapshots, shard_id: ShardHealth(CircuitBreaker.CLOSED, 0.0, 0.0, 0, None)}
+        self.breakers = {**self.breakers, shard_id: self.breaker_factory()}
+
+    def _probe(self, shard_id):
+        """Run the cheap health query and return its latency in ms."""
+        start = time.perf_counter()
+        with self.engines[shard_id].connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return (time.perf_counter() - start) * 1000
+
+    def probe_all(self):
+        """
+        Probe every eligible shard concurrently and apply the results.
+        Called by the background thread; also usable directly in scripts.
+        """
+        now = time.monotonic()
+        futures = {
+            shard_id: self._executor.submit(self._probe, shard_id)
+            for shard_id, breaker in self.breakers.items()
+            if breaker.should_probe(now)
+        }
+
+        deadline = time.monotonic() + self.timeout
+        for shard_id, future in futures.items():
+            try:
+                latency_ms = future.result(timeout=max(deadline - time.monotonic(), 0))
+                self._apply(shard_id, True, latency_ms, None)
+            except FutureTimeoutError:
+                self._apply(shard_id, False, self.timeout * 1000, "timeout")
+            except Exception as exc:
+                self._apply(shard_id, False, None, str(exc) or type(exc).__name__)
+
+    def _apply(self, shard_id, ok, latency_ms, error):
+        """Update the moving averages, feed the breaker and publish a snapshot."""
+        previous = self.snapshots[shard_id]
+        alpha = self.alpha
+        samples = previous.samples + 1
+
+        error_rate = (1 - alpha) * previous.error_rate + alpha * (0.0 if ok else 1.0)
+        latency_ewma = previous.latency_ewma_ms
+        if latency_ms is not None:
+            latency_ewma = latency_ms if previous.samples == 0 else (1 - alpha) * latency_ewma + alpha * latency_ms
+
+        breaker = self.breakers[shard_id]
+        transition = breaker.record(ok, error_rate, samples, time.monotonic())
+
+        self.snapshots[shard_id] = ShardHealth(breaker.state, latency_ewma, error_rate, samples, error)
+
+        callback = {"down": self.on_down, "up": self.on_up}.get(transition)
+        if callback is not None:
+            try:
+                callback(shard_id)
+            except RuntimeError as exc:
+                # e.g. refusing to take down the last healthy shard
+                logger.warning("Could not mark shard %s %s: %s", shard_id, transition, exc)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start probing in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-checker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and the probe workers."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=False)
+        for engine in self.engines.values():
+            engine.dispose()
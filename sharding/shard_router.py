@@ -1,11 +1,167 @@
 import hashlib
 import bisect
+import math
+import threading
+import numpy as np
+from id_generator import NODE_BITS, SEQUENCE_BITS, shard_of
 from shard_health import ShardHealthRegistry
 
+# -------------------------------
+# Hash Functions
+# -------------------------------
+
+MASK64 = 0xFFFFFFFFFFFFFFFF  # Keeps Python ints inside unsigned 64-bit range
+
+# CPython's built-in MD5: for short keys like user IDs it is about 3x as
+# fast as hashlib.md5 (with or without usedforsecurity=False), which sets up
+# an OpenSSL context on every call. Same digests.
+# _md5 is a private CPython implementation detail, not a public API: other
+# interpreters, future versions or FIPS builds may not ship it, so fall back
+# to hashlib (same ring, only the speed-up is lost).
+try:
+    from _md5 import md5 as _md5
+except ImportError:
+    _md5 = hashlib.md5
+
+_from_bytes = int.from_bytes
+
+def md5_hash64(key) -> int:
+    """
+    Compute a stable 64-bit hash for a key using MD5 (legacy mode).
+
+    How it works:
+    - Hash str(key) with MD5, exactly like the original ring did
+    - Keep only the top 64 bits of the digest (the first 8 bytes; no
+      hex round-trip, no 128-bit int)
+
+    Why it matters:
+    - Ordering by the top 64 bits is the same as ordering by the full
+      128-bit value, so keys land on the same shards as before
+    - 64-bit points fit in a compact uint64 array for batch lookups
+    """
+    return _from_bytes(_md5(str(key).encode()).digest()[:8], "big")
+
+def md5_hash64_many(keys) -> np.ndarray:
+    """
+    Hash many keys with md5_hash64 and return a uint64 array.
+
+    Why it matters:
+    - Joins all digests into one buffer and lets NumPy slice out the
+      top 64 bits of each, instead of converting every digest separately
+    """
+    digests = b"".join(_md5(str(k).encode()).digest() for k in keys)
+    # Each digest is 16 bytes = two big-endian uint64 words; keep the first
+    return np.frombuffer(digests, dtype=">u8")[::2].astype(np.uint64)
+
+def fmix64(x: int) -> int:
+    """
+    MurmurHash3 64-bit finalizer: a fast, well-mixed, non-cryptographic hash.
+
+    Why it matters:
+    - A few integer operations, so it is much cheaper than MD5
+    - Does not depend on PYTHONHASHSEED, so every process agrees on it
+    """
+    x = (x ^ (x >> 33)) * 0xFF51AFD7ED558CCD & MASK64
+    x = (x ^ (x >> 33)) * 0xC4CEB9FE1A85EC53 & MASK64
+    return x ^ (x >> 33)
+
+def fnv1a64(data: bytes) -> int:
+    """
+    FNV-1a 64-bit hash of a byte string.
+
+    Used to turn string keys (e.g. virtual node labels) into an integer
+    before they are mixed with fmix64.
+    """
+    h = 0xCBF29CE484222325
+    for byte in data:
+        h = ((h ^ byte) * 0x100000001B3) & MASK64
+    return h
+
+def fast_hash64(key) -> int:
+    """
+    Compute a stable 64-bit hash for a key without cryptography (fast mode).
+
+    - Integer keys (user IDs) are mixed directly with fmix64
+    - String keys are reduced with FNV-1a first, then mixed
+
+    Note: 42 and "42" are different keys in this mode.
+    """
+    if type(key) is int or isinstance(key, np.integer):
+        return fmix64(int(key) & MASK64)
+    return fmix64(fnv1a64(str(key).encode()))
+
+def fast_hash64_many(keys) -> np.ndarray:
+    """
+    Hash many keys with fast_hash64 and return a uint64 array.
+
+    Why it matters:
+    - Integer keys are hashed with a vectorized fmix64, so a batch of
+      thousands of user IDs costs a handful of NumPy operations
+    """
+    arr = np.asarray(keys)
+    if arr.dtype.kind not in "iu":
+        return np.fromiter((fast_hash64(k) for k in arr.tolist()), dtype=np.uint64, count=arr.size)
+
+    # uint64 arithmetic wraps modulo 2**64, matching the & MASK64 above
+    shift = np.uint64(33)
+    x = arr.astype(np.uint64)
+    x = (x ^ (x >> shift)) * np.uint64(0xFF51AFD7ED558CCD)
+    x = (x ^ (x >> shift)) * np.uint64(0xC4CEB9FE1A85EC53)
+    return x ^ (x >> shift)
+
+# hash_mode -> (single-key hash, batch hash)
+HASH_FUNCTIONS = {
+    "md5": (md5_hash64, md5_hash64_many),
+    "fast": (fast_hash64, fast_hash64_many),
+}
+
 # -------------------------------
 # Consistent Hashing Implementation
 # -------------------------------
 
+class RingTable:
+    """
+    Compiled, read-only form of a hash ring.
+
+    Holds the sorted virtual node points and a parallel array with the
+    shard that owns each point, both as NumPy arrays (for batch
+    searchsorted) and as Python lists (for single-key bisect).
+
+    Tables are never modified after creation: ring changes build a new
+    table and swap it in, so readers always see one consistent ring.
+    """
+    __slots__ = ("np_points", "np_shards", "points", "shards", "shard_ids", "_fingerprint")
+
+    def __init__(self, np_points, np_shards):
+        """
+        np_points: sorted uint64 array of vnode hashes
+        np_shards: shard ID owning each point (same length and order)
+        """
+        self.np_points = np_points
+        self.np_shards = np_shards
+        self.points = np_points.tolist()
+        self.shards = np_shards.tolist()
+        self.shard_ids = frozenset(self.shards)
+        self._fingerprint = None
+
+    @classmethod
+    def empty(cls):
+        """Return a table with no shards."""
+        return cls(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64))
+
+    def fingerprint(self) -> str:
+        """
+        Short content hash of the ring layout.
+
+        Two tables with the same fingerprint route every key the same way,
+        so it identifies a ring version (e.g. in rebalance checkpoints).
+        It depends only on the layout, so every process agrees on it.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1(self.np_points.tobytes() + self.np_shards.tobytes())
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
 class ConsistentHashRing:
     """
     Implements a consistent hashing ring for sharding.
@@ -15,64 +171,262 @@ class ConsistentHashRing:
     - Minimal key remapping when shards are added or removed
     - High availability and scalability in distributed systems
     """
-    def __init__(self, replicas=100):
+    def __init__(self, replicas=100, hash_mode="md5", weights=None, load_factor=None):
         """
         Initialize a hash ring with virtual nodes for smoother distribution.
 
         replicas: Number of virtual nodes per shard. More replicas = fewer hotspots.
+        hash_mode: "md5" places keys exactly like the original ring,
+                   "fast" uses a non-cryptographic 64-bit hash instead.
+        weights: Optional shard_id -> weight. A shard gets round(replicas * weight)
+                 virtual nodes, so bigger machines own more of the ring (default 1.0).
+        load_factor: Capacity factor for bounded-load routing with assign(),
+                     e.g. 1.25 lets a shard carry at most 25% more than its fair share.
         """
+        if hash_mode not in HASH_FUNCTIONS:
+            raise ValueError(f"Unknown hash_mode: {hash_mode!r}")
+        if load_factor is not None and load_factor <= 1:
+            raise ValueError("load_factor must be greater than 1")
+
         self.replicas = replicas
-        self.ring = {}          # Maps each hash value to a shard ID
-        self.sorted_keys = []   # Sorted list of hashes for efficient O(log n) lookup
+        self.hash_mode = hash_mode
+        self._hash, self._hash_many = HASH_FUNCTIONS[hash_mode]
+        self.weights = dict(weights or {})
+        self.table = RingTable.empty()  # Compiled ring used by lookups
+
+        # Serializes writers only; readers never take this lock
+        self._write_lock = threading.Lock()
+
+        # Bounded-load state: shard_id -> number of keys currently assigned
+        self.load_factor = load_factor
+        self.loads = {}
+        self._load_lock = threading.Lock()
+
+    def replica_count(self, shard_id) -> int:
+        """
+        Number of virtual nodes a shard gets based on its weight.
 
-    def _hash(self, key: str) -> int:
+        Vnode labels are numbered 0..count-1, so raising a weight only adds
+        vnodes and leaves the shard's existing positions where they were.
         """
-        Compute a stable hash for a string key using MD5.
+        return max(1, round(self.replicas * self.weights.get(shard_id, 1.0)))
 
-        Why it matters: 
-        - Ensures deterministic routing of keys to shards
-        - Supports consistent hashing across multiple app instances
+    def _vnode_points(self, shard_id) -> np.ndarray:
+        """
+        Hash every virtual node label of one shard into a uint64 array.
         """
-        return int(hashlib.md5(key.encode()).hexdigest(), 16)
+        return self._hash_many([f"{shard_id}:{i}" for i in range(self.replica_count(shard_id))])
 
     def build(self, shard_ids):
         """
         Construct the consistent hash ring using the provided shard IDs.
 
+        How it works:
+        - Hash all virtual nodes in one batch
+        - Sort them once with argsort (O(n log n) instead of one insort per vnode)
+        - Swap the compiled table in with a single assignment
+
         Why it matters:
         - Assigns virtual nodes to each shard to prevent uneven key distribution
         - Clears and rebuilds the ring based on current healthy shards
         """
-        self.ring.clear()
-        self.sorted_keys.clear()
+        shard_ids = list(shard_ids)
+        with self._write_lock:
+            if not shard_ids:
+                self.table = RingTable.empty()
+                return
+
+            points = np.concatenate([self._vnode_points(s) for s in shard_ids])
+            shards = np.repeat(
+                np.array(shard_ids, dtype=np.int64),
+                [self.replica_count(s) for s in shard_ids],
+            )
+
+            order = np.argsort(points, kind="stable")
+            self.table = RingTable(points[order], shards[order])
+
+    def _spliced(self, table, shard_id, include: bool) -> RingTable:
+        """
+        Return a copy of table with shard_id's vnodes removed and,
+        if include is True, re-inserted from its current weight.
+
+        How it works:
+        - Drop the shard's existing points with a boolean mask
+        - Hash and sort only this shard's vnodes
+        - Find where they belong with searchsorted and insert them
+        """
+        keep = table.np_shards != shard_id
+        points, shards = table.np_points[keep], table.np_shards[keep]
+
+        if include:
+            new_points = np.sort(self._vnode_points(shard_id))
+            positions = np.searchsorted(points, new_points, side="right")
+            points = np.insert(points, positions, new_points)
+            shards = np.insert(shards, positions, shard_id)
+
+        return RingTable(points, shards)
+
+    def add_shard(self, shard_id: int, weight=None):
+        """
+        Splice one shard's virtual nodes into the ring.
+
+        Why it matters:
+        - Adding a shard costs O(n + r log n) instead of a full rebuild
+        - The new table is published copy-on-write; in-flight lookups keep
+          using the table they already read
+        - Adding a shard that is already on the ring does nothing
+        """
+        with self._write_lock:
+            if weight is not None:
+                self.weights[shard_id] = weight
+
+            table = self.table
+            if shard_id in table.shard_ids:
+                return
+
+            self.table = self._spliced(table, shard_id, include=True)
+
+    def remove_shard(self, shard_id: int):
+        """
+        Splice one shard's virtual nodes out of the ring.
+
+        Why it matters:
+        - Only keys owned by this shard move; every other vnode stays put
+        - Readers switch to the new table atomically, without locking
+        - Removing a shard that is not on the ring does nothing
+        """
+        with self._write_lock:
+            table = self.table
+            if shard_id not in table.shard_ids:
+                return
+
+            self.table = self._spliced(table, shard_id, include=False)
+
+    def set_weight(self, shard_id: int, weight: float):
+        """
+        Change a shard's weight and resize its vnode set in one swap.
+
+        Why it matters:
+        - Lets a shard take more (or less) of the ring after a hardware
+          upgrade without a moment where it is missing from the ring
+        """
+        with self._write_lock:
+            self.weights[shard_id] = weight
 
-        for shard_id in shard_ids:
-            for i in range(self.replicas):
-                vnode = f"{shard_id}:{i}"           # Create a virtual node label
-                h = self._hash(vnode)               # Hash the virtual node
-                self.ring[h] = shard_id             # Map hash -> shard
-                bisect.insort(self.sorted_keys, h)  # Keep the keys sorted for fast lookups
+            table = self.table
+            if shard_id in table.shard_ids:
+                self.table = self._spliced(table, shard_id, include=True)
 
-    def get_shard(self, key: str) -> int:
+    def get_shard(self, key) -> int:
         """
         Determine which shard is responsible for a given key.
 
         How it works:
         - Hash the key
-        - Use bisect to find the first hash in the ring >= key hash
-        - Wrap around to the first shard if key exceeds all hashes
+        - Use bisect to find the first point in the ring > key hash
+        - Wrap around to the first shard if key exceeds all points
 
         Why it matters:
         - Ensures even distribution of data
         - Minimal key movement when shards change
         """
-        h = self._hash(key)
-        idx = bisect.bisect(self.sorted_keys, h)
+        table = self.table  # Read once so a concurrent rebuild can't mix two rings
+        idx = bisect.bisect(table.points, self._hash(key))
 
-        if idx == len(self.sorted_keys):  # Wrap around the ring
+        if idx == len(table.points):  # Wrap around the ring
             idx = 0
 
-        return self.ring[self.sorted_keys[idx]]
+        try:
+            return table.shards[idx]
+        except IndexError:  # Only an empty ring has no index 0
+            raise ValueError("no shards") from None
+
+    def get_shards(self, keys) -> np.ndarray:
+        """
+        Determine the shard for many keys in one call.
+
+        How it works:
+        - Hash all keys into a uint64 array
+        - np.searchsorted finds every key's ring position at once
+        - Positions past the last point wrap around to 0
+
+        Why it matters:
+        - Avoids per-key Python overhead when routing thousands of keys
+        - Returns the same shards as calling get_shard() for each key
+        """
+        table = self.table
+        if not len(table.np_points):
+            raise ValueError("no shards")
+        idx = np.searchsorted(table.np_points, self._hash_many(keys), side="right")
+        idx[idx == len(table.np_points)] = 0  # Wrap around the ring
+        return table.np_shards[idx]
+
+    # -------------------------------
+    # Bounded-Load Routing
+    # -------------------------------
+
+    def assign(self, key) -> int:
+        """
+        Route a unit of load (e.g. a request) with bounded loads.
+
+        How it works:
+        - Capacity for a shard = ceil(load_factor * (current load + 1) * weight share)
+        - Start at the key's normal ring position
+        - Walk clockwise to the next vnode until a shard under capacity is found
+        - Record the new load on that shard
+
+        Why it matters:
+        - A hot key can no longer push its shard far past the mean load;
+          the overflow spills to the next shards on the ring
+        - Keys still stick to their home shard whenever it has room
+
+        Note: this is for routing load (requests, cache reads, replicas),
+        not data placement; use get_shard() to find where a row lives.
+        Call release() when the unit of load finishes.
+        """
+        if self.load_factor is None:
+            raise RuntimeError("Bounded-load routing needs a load_factor")
+
+        h = self._hash(key)
+        with self._load_lock:
+            table = self.table
+            n = len(table.points)
+            if n == 0:
+                raise ValueError("no shards")
+            loads = self.loads
+
+            total_load = sum(loads.get(s, 0) for s in table.shard_ids) + 1
+            total_weight = sum(self.weights.get(s, 1.0) for s in table.shard_ids)
+
+            idx = bisect.bisect(table.points, h)
+            for step in range(n):
+                shard_id = table.shards[(idx + step) % n]
+                share = self.weights.get(shard_id, 1.0) / total_weight
+                if loads.get(shard_id, 0) < math.ceil(self.load_factor * total_load * share):
+                    break
+
+            loads[shard_id] = loads.get(shard_id, 0) + 1
+            return shard_id
+
+    def release(self, shard_id: int):
+        """
+        Remove one unit of load from a shard after it completes.
+        """
+        with self._load_lock:
+            if self.loads.get(shard_id, 0) > 0:
+                self.loads[shard_id] -= 1
+
+    def load_ratio(self) -> float:
+        """
+        Return max load / mean load across shards on the ring.
+
+        1.0 means perfectly even; bounded-load routing keeps this at or
+        below load_factor.
+        """
+        table = self.table
+        counts = [self.loads.get(s, 0) for s in table.shard_ids]
+        mean = sum(counts) / len(counts) if counts else 0
+        return max(counts) / mean if mean else 0.0
 
 
 # -------------------------------
@@ -80,8 +434,26 @@ class ConsistentHashRing:
 # -------------------------------
 
 ALL_SHARDS = [0, 1, 2]                         # Initial set of shard IDs
+HASH_MODE = "md5"                              # Switching to "fast" remaps existing users
+SHARD_WEIGHTS = {0: 1.0, 1: 1.0, 2: 1.0}       # Bigger boxes get > 1.0 (more vnodes)
 health_registry = ShardHealthRegistry(ALL_SHARDS)  # Tracks which shards are healthy
-hash_ring = ConsistentHashRing()               # Global consistent hash ring instance
+hash_ring = ConsistentHashRing(hash_mode=HASH_MODE, weights=SHARD_WEIGHTS)  # Global ring instance
+migration_ring = None                          # Target ring while an online rebalance is running
+
+# Embedded-shard IDs: when > 0, new user IDs carry their shard in this many
+# bits (see id_generator.py) and routing reads them instead of hashing.
+# Only for fresh deployments: embedded shards are fixed, so such users
+# are never moved by ring changes or rebalancing.
+ID_SHARD_BITS = 0
+
+def build_ring(shard_ids) -> ConsistentHashRing:
+    """
+    A new ring over shard_ids with the same settings as the live router
+    (e.g. the target layout of a rebalance).
+    """
+    ring = ConsistentHashRing(hash_mode=HASH_MODE, weights=SHARD_WEIGHTS)
+    ring.build(shard_ids)
+    return ring
 
 def rebuild_ring():
     """
@@ -103,11 +475,127 @@ def get_shard_id(user_id: int) -> int:
     """
     Determine the shard for a given user ID.
 
+    During an online rebalance this is the user's new owner, so new
+    writes land where the data is moving to.
+
     Why it matters:
     - Centralizes routing logic
     - Guarantees deterministic routing for distributed storage
     """
-    return hash_ring.get_shard(str(user_id))
+    if ID_SHARD_BITS:
+        return shard_of(user_id, ID_SHARD_BITS)
+
+    target = migration_ring  # Read the global once
+    if target is not None:
+        return target.get_shard(user_id)
+    return hash_ring.get_shard(user_id)
+
+def get_shard_ids(user_ids) -> np.ndarray:
+    """
+    Determine the shard for many user IDs in one call.
+
+    Why it matters:
+    - Bulk jobs (seeding, rebalancing, analytics) can route thousands
+      of users without paying per-call overhead
+    """
+    if ID_SHARD_BITS:
+        shift = np.uint64(SEQUENCE_BITS + NODE_BITS - ID_SHARD_BITS)
+        ids = np.asarray(user_ids, dtype=np.uint64)
+        return ((ids >> shift) & np.uint64((1 << ID_SHARD_BITS) - 1)).astype(np.int64)
+
+    target = migration_ring
+    if target is not None:
+        return target.get_shards(user_ids)
+    return hash_ring.get_shards(user_ids)
+
+def get_read_shard_ids(user_id: int) -> list:
+    """
+    Shards to try, in order, when reading a user.
+
+    Normally this is just the owner. While a rebalance is moving data,
+    a user may still be on its old shard or already on its new one, so
+    reads are double-routed: new owner first, then the old owner.
+    """
+    if ID_SHARD_BITS:
+        return [shard_of(user_id, ID_SHARD_BITS)]
+
+    owner = hash_ring.get_shard(user_id)
+    target = migration_ring
+    if target is None:
+        return [owner]
+
+    new_owner = target.get_shard(user_id)
+    return [new_owner] if new_owner == owner else [new_owner, owner]
+
+def ring_version() -> str:
+    """
+    Identify the routing layout currently in effect.
+
+    Changes whenever the live ring changes or a migration starts or
+    ends, so anything derived from routing (e.g. cached lookups) can
+    tell it may be out of date.
+    """
+    version = hash_ring.table.fingerprint()
+    target = migration_ring
+    if target is not None:
+        version += "+" + target.table.fingerprint()
+    return version
+
+
+# -------------------------------
+# Online Rebalance Routing
+# -------------------------------
+
+def begin_migration(new_ring: ConsistentHashRing):
+    """
+    Start double-routing towards new_ring while data is moved.
+
+    Why it matters:
+    - Writes go to the new owner immediately
+    - Reads check the new owner, then fall back to the old one,
+      so traffic keeps flowing while rows are in flight
+    """
+    global migration_ring
+    if ID_SHARD_BITS:
+        # Routing reads the shard from the ID and would ignore new_ring
+        raise RuntimeError("Migrations are not supported with embedded-shard IDs (ID_SHARD_BITS > 0)")
+    if migration_ring is not None:
+        raise RuntimeError("A migration is already in progress")
+    if new_ring.hash_mode != hash_ring.hash_mode:
+        raise ValueError("The new ring must use the same hash_mode")
+    migration_ring = new_ring
+
+def finish_migration():
+    """
+    Make the migration target the live ring and stop double-routing.
+
+    New shards are registered as healthy so health-driven ring changes
+    keep working for them.
+    """
+    global migration_ring
+    target = migration_ring
+    if target is None:
+        raise RuntimeError("No migration in progress")
+
+    for shard_id in target.table.shard_ids:
+        health_registry.mark_up(shard_id)
+
+    with hash_ring._write_lock:
+        hash_ring.replicas = target.replicas
+        hash_ring.weights = dict(target.weights)
+        hash_ring.table = target.table  # Tables are immutable, so sharing is safe
+
+    migration_ring = None
+
+def abort_migration():
+    """
+    Stop double-routing and keep the current live ring.
+
+    Rows already moved stay on their new shards; re-run the rebalance
+    (it resumes from its checkpoint) before aborting for good.
+    """
+    global migration_ring
+    migration_ring = None
 
 
 # -------------------------------
@@ -116,22 +604,26 @@ def get_shard_id(user_id: int) -> int:
 
 def mark_shard_down(shard_id: int):
     """
-    Mark a shard as unhealthy and rebuild the ring without it.
+    Mark a shard as unhealthy and splice it out of the ring.
 
     Why it matters:
     - Automatically avoids routing traffic to failing shards
     - Supports graceful degradation without downtime
+    - Only the failed shard's vnodes are removed; no full rebuild
     """
     health_registry.mark_down(shard_id)
-    rebuild_ring()
+    if not health_registry.healthy_shards():
+        raise RuntimeError("No healthy shards available")
+    hash_ring.remove_shard(shard_id)
 
 def mark_shard_up(shard_id: int):
     """
-    Mark a shard as healthy and rebuild the ring including it.
+    Mark a shard as healthy and splice it back into the ring.
 
     Why it matters:
     - Returns shard to rotation after recovery
     - Ensures consistent key routing resumes for that shard
+    - Lands on exactly the same vnode positions as a full rebuild
     """
     health_registry.mark_up(shard_id)
-    rebuild_ring()
+    hash_ring.add_shard(shard_id)
@@ -0,0 +1,214 @@
+# user_cache.py
+# -------------------------------
+# Read-through cache for sharded user lookups
+# -------------------------------
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# -------------------------------
+# Cache Backends
+# -------------------------------
+
+class InProcessBackend:
+    """
+    Bounded LRU cache with a TTL, local to this process.
+
+    Why it matters:
+    - Serves repeat reads from memory with no network hop at all
+    - max_entries bounds memory; the least recently used entry is evicted
+    """
+    def __init__(self, max_entries=100_000, ttl_seconds=60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, entry)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SharedBackend:
+    """
+    Cache stored in a shared key-value store (e.g. Redis), so every app
+    process sees the same entries and the same invalidations.
+
+    client: any object with get(key), set(key, value, ex=seconds) and
+            delete(key), such as redis.Redis
+    """
+    def __init__(self, client, ttl_seconds=60.0, prefix="user:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(f"{self.prefix}{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, entry):
+        self.client.set(f"{self.prefix}{key}", json.dumps(entry), ex=max(int(self.ttl_seconds), 1))
+
+    def delete(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+
+# -------------------------------
+# Single-Flight Coalescing
+# -------------------------------
+
+class SingleFlight:
+    """
+    Makes concurrent calls for the same key share one execution.
+
+    Why it matters:
+    - When a popular entry expires, a burst of requests would otherwise
+      all miss at once and send the same query to the shard (a stampede)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the in-flight call
+
+    def do(self, key, fn):
+        """
+        Run fn() for key, or wait for the call already in flight.
+
+        Returns: (result, shared) where shared is True if another
+                 caller did the work
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+
+# -------------------------------
+# Read-Through User Cache
+# -------------------------------
+
+class UserCache:
+    """
+    Read-through cache for user lookups, aware of shard routing.
+
+    Each entry remembers the shard it was read from and the ring
+    version at that time.
+
+    How it works:
+    - Hit with the current ring version: return it
+    - Hit from an older ring version: keep it only if its shard is still
+      one of the user's read shards (the user didn't move), otherwise
+      drop it and reload
+    - Miss: load through SingleFlight so concurrent misses make one query
+    - Writes call invalidate()
+
+    Why it matters:
+    - Repeat profile reads never touch the shard
+    - A ring change only invalidates users whose ownership changed
+    """
+    def __init__(self, backend, version_fn, read_shards_fn):
+        """
+        backend: InProcessBackend or SharedBackend
+        version_fn: returns the current ring version (shard_router.ring_version)
+        read_shards_fn: user_id -> shards to read from (shard_router.get_read_shard_ids)
+        """
+        self.backend = backend
+        self.version_fn = version_fn
+        self.read_shards_fn = read_shards_fn
+        self.single_flight = SingleFlight()
+
+        # Counters; += on ints is good enough for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0       # Entries dropped because the user's shard changed
+        self.loads = 0       # Queries actually sent to a shard
+        self.coalesced = 0   # Misses that waited for another request's query
+
+    def get_or_load(self, user_id: int, loader):
+        """
+        Return the cached user, or call loader(user_id) and cache it.
+
+        loader returns the user as a dict including its "shard",
+        or None if the user doesn't exist (not cached).
+        """
+        version = self.version_fn()
+        entry = self.backend.get(user_id)
+
+        if entry is not None:
+            if entry["version"] == version:
+                self.hits += 1
+                return entry["value"]
+            if entry["value"]["shard"] in self.read_shards_fn(user_id):
+                # Ring changed but this user didn't move: re-tag and serve
+                self.backend.set(user_id, {"value": entry["value"], "version": version})
+                self.hits += 1
+                return entry["value"]
+            self.stale += 1
+            self.backend.delete(user_id)
+
+        self.misses += 1
+        value, shared = self.single_flight.do(user_id, lambda: self._load(user_id, loader, version))
+        if shared:
+            self.coalesced += 1
+        return value
+
+    def _load(self, user_id, loader, version):
+        self.loads += 1
+        value = loader(user_id)
+        if value is not None:
+            self.backend.set(user_id, {"value": value, "version": version})
+        return value
+
+    def invalidate(self, user_id: int):
+        """Drop a user's entry after a write."""
+        self.backend.delete(user_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale_invalidations": self.stale,
+            "db_loads": self.loads,
+            "coalesced_misses": self.coalesced,
+            "evictions": getattr(self.backend, "evictions", None),
+        }